@@ -1,6 +1,22 @@
+import time
+
+# Start of the startup-time breakdown logged once the app is ready
+_phase_started = time.perf_counter()
+startup_timings = {}
+
+
+def startup_phase(name):
+    """Record how long a startup phase took (since the previous one ended)"""
+    global _phase_started
+    now = time.perf_counter()
+    startup_timings[name] = round((now - _phase_started) * 1000, 1)
+    _phase_started = now
+
+
 from flask import Flask, request, Response, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+import hashlib
 import json
 import os
 import sys
@@ -9,12 +25,30 @@ import sys
 load_dotenv()
 
 # Import provider factory
-from llm_providers import get_provider
+from llm_providers import get_provider, tracing
+from llm_providers.cancellation import cancellation_stats
+from llm_providers.client_cache import watch_key_file
+from llm_providers.metrics import (
+    REQUESTS,
+    model_label,
+    registry as metrics_registry,
+    set_model_filter,
+)
+from llm_providers.sse import coalesce, content_event, event
+from chunking import LONG_INPUT_CONCURRENCY, is_long_input, previous_context, split_text
+from batch import BATCH_CONCURRENCY, BATCH_MAX_ITEMS, BatchRunner, parse_jsonl
 from config_manager import ConfigManager
+from config_store import ConfigStore
+from streaming import DONE_EVENT, merge_streams, ordered_streams, tag_event, with_preview
+from response_cache import ResponseCache
+
+startup_phase("imports")
 
 app = Flask(__name__)
 CORS(app)
 
+tracing.configure_logging()
+
 # Load configuration based on mode
 llm_mode = os.getenv("LLM_MODE", "direct").lower()
 config_file = (
@@ -23,58 +57,36 @@ config_file = (
     else "config.json"
 )
 
-try:
-    with open(config_file, "r") as f:
-        config = json.load(f)
-    print(f"[INFO] Loaded configuration from: {config_file}")
-except FileNotFoundError:
-    print(
-        f"[ERROR] {config_file} not found. Please create it with your API configuration."
-    )
-    sys.exit(1)
-except json.JSONDecodeError as e:
-    print(f"[ERROR] Invalid JSON in {config_file}: {e}")
+# Prompts and model config are reloaded from disk when they change; every
+# style x channel prompt is compiled once per version of prompts.json
+config_store = ConfigStore("prompts.json", config_file)
+if config_store.snapshot() is None:
+    for error in config_store.errors:
+        print(f"[ERROR] {error}")
+    print("[ERROR] Please create config.json and prompts.json (with 'styles' and 'templates.compose')")
     sys.exit(1)
+print(f"[INFO] Loaded configuration from: {config_file}")
+startup_phase("config")
 
-# Load prompts with error handling
-try:
-    with open("prompts.json", "r") as f:
-        prompts_data = json.load(f)
-        # Create a lookup dict for easy access: {style_id: full_style_object}
-        prompts = {style["id"]: style for style in prompts_data["styles"]}
-except FileNotFoundError:
-    print("[ERROR] prompts.json not found. Please create it with style definitions.")
-    sys.exit(1)
-except (json.JSONDecodeError, KeyError) as e:
-    print(f"[ERROR] Invalid JSON or missing 'styles' key in prompts.json: {e}")
-    sys.exit(1)
 
-# Configuration
-DEFAULT_MODEL = config["default_model"]
-
-# Channel-specific tone instructions injected into system prompts
-CHANNEL_TONES = {
-    "outlook": (
-        "Channel: Outlook Email. "
-        "Write in a professional, polished, and modern tone. "
-        "Use proper email structure (greeting, body, closing). "
-        "Be clear and concise while maintaining formality. "
-        "Avoid slang, emojis, and overly casual language."
-    ),
-    "teams": (
-        "Channel: Microsoft Teams Chat. "
-        "Write in a business casual, modern, and concise tone. "
-        "Keep it brief and scannable — short paragraphs or bullet points where appropriate. "
-        "Friendly but professional. Minimal use of emojis is acceptable."
-    ),
-    "whatsapp": (
-        "Channel: WhatsApp. "
-        "Write in a personal, casual, and fun tone. "
-        "Keep it conversational and warm. "
-        "Use emojis naturally to add personality. "
-        "Short sentences and informal language are encouraged."
-    ),
-}
+# Models outside the model config are labelled "other" in the metrics
+set_model_filter(config_store.models.is_known)
+
+
+def default_model():
+    """Model used when a request does not name one"""
+    return config_store.snapshot().default_model
+
+
+# Run multi-style requests concurrently unless the request says otherwise
+PARALLEL_STYLES = os.getenv("PARALLEL_STYLES", "false").lower() == "true"
+
+# Maximum style generations running at once in parallel mode (0 = all)
+PARALLEL_STYLES_MAX = int(os.getenv("PARALLEL_STYLES_MAX", "0"))
+
+# Merge SSE events arriving within this window into one write (0 = off)
+SSE_COALESCE_WINDOW = float(os.getenv("SSE_COALESCE_MS", "0")) / 1000
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "4096"))
 
 # Initialize LLM provider based on environment configuration
 try:
@@ -83,14 +95,91 @@ except Exception as e:
     print(f"[ERROR] Failed to initialize LLM provider: {e}")
     print("[ERROR] Please check your environment configuration (.env file)")
     sys.exit(1)
+startup_phase("provider")
 
 # Initialize config manager
 config_manager = ConfigManager()
 
+# API keys saved in Settings reach every worker, not only the one that saved them
+watch_key_file(config_manager.env_file)
+
+# Optional cache of completed responses for repeated identical requests
+response_cache = None
+if os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true":
+    response_cache = ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "600")),
+    )
+    print(
+        f"[INFO] Response cache enabled (max {response_cache.max_entries} entries, "
+        f"ttl {response_cache.ttl:g}s)"
+    )
+
+startup_phase("app")
+print(
+    f"[INFO] Startup took {sum(startup_timings.values()):.0f} ms ("
+    + ", ".join(f"{name} {ms:.0f} ms" for name, ms in startup_timings.items())
+    + ")"
+)
+
+
+def stream_llm(model, system_prompt, user_text):
+    """Stream a completion, served from the response cache when enabled"""
+    if response_cache is None:
+        return llm_provider.stream_response(model, system_prompt, user_text)
+
+    return response_cache.stream(
+        model,
+        system_prompt,
+        user_text,
+        lambda: llm_provider.stream_response(model, system_prompt, user_text),
+    )
+
+
+@app.before_request
+def start_request():
+    """Bind a request ID (from X-Request-ID or a new one) to log records"""
+    tracing.start_request(request.headers.get("X-Request-ID"))
+
+
+@app.after_request
+def add_request_id(response):
+    response.headers["X-Request-ID"] = tracing.request_id_var.get()
+    return response
+
+
+# Serialized GET payloads: name -> (version, body, etag)
+_payload_cache = {}
+
+
+def cached_json(name, version, build):
+    """
+    JSON response memoized per version of its source, with a strong ETag.
+
+    build() only runs when version changes. Clients revalidate on every
+    load (no-cache) and get an empty 304 while the payload is unchanged.
+    """
+    cached = _payload_cache.get(name)
+    if cached is None or cached[0] != version:
+        body = app.json.dumps(build())
+        cached = (version, body, hashlib.sha256(body.encode("utf-8")).hexdigest()[:32])
+        _payload_cache[name] = cached
+
+    response = Response(cached[1], mimetype="application/json")
+    response.set_etag(cached[2])
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
 
 @app.route("/api/models", methods=["GET"])
 def get_models():
     """Return available models list with default selected"""
+    snapshot = config_store.snapshot()
+    return cached_json("models", snapshot.version, lambda: build_models(snapshot))
+
+
+def build_models(snapshot):
+    """Payload of /api/models"""
     available_models = llm_provider.get_available_models()
 
     # Combine all available models
@@ -104,22 +193,26 @@ def get_models():
     if not all_models:
         all_models = ["claude-3-5-sonnet-20241022", "gpt-4-turbo", "gemini-1.5-pro"]
 
-    return jsonify(
-        {
-            "models": all_models,
-            "default": DEFAULT_MODEL,
-            "model_categories": available_models,
-        }
-    )
+    return {
+        "models": all_models,
+        "default": snapshot.default_model,
+        "model_categories": available_models,
+    }
 
 
 @app.route("/api/styles", methods=["GET"])
 def get_styles():
     """Return available styles with their metadata"""
+    snapshot = config_store.snapshot()
+    return cached_json("styles", snapshot.version, lambda: build_styles(snapshot.templates))
+
+
+def build_styles(templates):
+    """Payload of /api/styles"""
     # Return the styles array from prompts.json
     # Exclude the 'prompt' field from the response to keep it lightweight
     styles = []
-    for style_id, style_data in prompts.items():
+    for style_id, style_data in templates.styles.items():
         styles.append(
             {
                 "id": style_data["id"],
@@ -128,18 +221,21 @@ def get_styles():
                 "description": style_data["description"],
             }
         )
-    return jsonify({"styles": styles})
+    return {"styles": styles}
 
 
-@app.route("/api/rephrase", methods=["POST"])
-def rephrase():
-    """Streaming endpoint for text rephrasing - supports single or multiple styles"""
-    data = request.json
-    text = data.get("text", "")
-    model = data.get("model", DEFAULT_MODEL)
-    additional_instructions = data.get("additional_instructions", "").strip()
-    channel = data.get("channel", "").strip().lower()
+# Response headers shared by the streaming endpoints
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
+def parse_batch_item(data, snapshot=None):
+    """
+    Normalize the text, model, styles and prompt options of a request body.
+
+    Batch items only need these; /api/rephrase adds long-input parts and
+    the preview model on top (see parse_rephrase_request).
+    """
+    snapshot = snapshot or config_store.snapshot()
     # Support both single style and multiple styles
     style = data.get("style")
     styles = data.get("styles", [])
@@ -150,39 +246,231 @@ def rephrase():
     elif not styles:
         styles = ["default"]
 
+    return {
+        "text": data.get("text", ""),
+        "model": data.get("model", snapshot.default_model),
+        "additional_instructions": data.get("additional_instructions", "").strip(),
+        "channel": data.get("channel", "").strip().lower(),
+        "styles": styles,
+        "templates": snapshot.templates,
+    }
+
+
+def parse_rephrase_request(data):
+    """
+    Normalize a /api/rephrase request body.
+
+    The request is pinned to the current config snapshot, so a reload
+    while it streams does not change the prompts of its later styles.
+    """
+    snapshot = config_store.snapshot()
+    req = parse_batch_item(data, snapshot)
+
+    # Long inputs are rephrased in parts unless the request says otherwise
+    text = req["text"]
+    long_input = data.get("long_input")
+    if long_input is None:
+        long_input = is_long_input(text)
+    chunks = split_text(text) if long_input else []
+    chunks = chunks if len(chunks) > 1 else []
+
+    # A fast model streams a draft while the requested one starts up; not
+    # used for chunked inputs, whose first part already streams early
+    preview_model = snapshot.config.get("preview_model") if data.get("preview", True) else None
+    if preview_model == req["model"] or chunks:
+        preview_model = None
+
+    req.update({
+        "preview_model": preview_model,
+        "parallel": bool(data.get("parallel", PARALLEL_STYLES)),
+        # (separator, text) parts of a long input; empty for a single request
+        "chunks": chunks,
+    })
+    return req
+
+
+def build_rephrase_prompt(style_id, channel, additional_instructions, templates=None):
+    """Return (style_data, system_prompt) for one requested style"""
+    templates = templates or config_store.snapshot().templates
+    with tracing.span("prompt_build", route="rephrase", style=style_id) as span:
+        style_data, system_prompt = templates.rephrase(
+            style_id, channel, additional_instructions
+        )
+        span.annotate(template=system_prompt.prefix_hash)
+    return style_data, system_prompt
+
+
+def chunk_prompts(req, system_prompt):
+    """Return (system_prompt, text) for each part of a chunked request"""
+    chunks = req["chunks"]
+    prompts = []
+    for part, (_, text) in enumerate(chunks, 1):
+        previous = previous_context(chunks[part - 2][1]) if part > 1 else ""
+        prompt = req["templates"].rephrase_chunk(system_prompt, part, len(chunks), previous)
+        prompts.append((prompt, text))
+    return prompts
+
+
+def chunk_event(req, index, chunk):
+    """
+    Map one (index, chunk) event of an in-order chunk stream to its output.
+
+    Per-part [DONE] markers are dropped; the separator between two parts is
+    sent once the first of them has ended.
+    """
+    if chunk is None:
+        if index + 1 < len(req["chunks"]):
+            return content_event(req["chunks"][index + 1][0])
+        return None
+    return None if chunk == DONE_EVENT else chunk
+
+
+def stream_rephrase(req, system_prompt):
+    """
+    Stream one style's rephrase of the request text.
+
+    Long inputs are split into parts that are rephrased concurrently and
+    streamed back in order, so the time to the full result grows with the
+    size of one part rather than the whole document. With a preview model,
+    its draft is streamed as preview events until the requested model
+    starts answering.
+    """
+    if not req["chunks"]:
+        stream = stream_llm(req["model"], system_prompt, req["text"])
+        if req["preview_model"]:
+            preview = stream_llm(req["preview_model"], system_prompt, req["text"])
+            return with_preview(stream, preview)
+        return stream
+
     def generate():
-        # Process each selected style
-        for idx, current_style in enumerate(styles):
-            # Get system prompt for the selected style
-            style_data = prompts.get(current_style, prompts["default"])
-            system_prompt = style_data["prompt"]
-
-            # Append channel tone if specified
-            if channel and channel in CHANNEL_TONES:
-                system_prompt += f"\n\n{CHANNEL_TONES[channel]}"
-
-            # Append additional instructions if provided
-            if additional_instructions:
-                system_prompt += (
-                    f"\n\nAdditional Instructions: {additional_instructions}"
-                )
+        streams = [
+            stream_llm(req["model"], prompt, text)
+            for prompt, text in chunk_prompts(req, system_prompt)
+        ]
+        for index, chunk in ordered_streams(
+            streams,
+            max_workers=LONG_INPUT_CONCURRENCY or None,
+            on_skipped=lambda index: cancellation_stats.record_skipped(req["chunks"][index][1]),
+        ):
+            output = chunk_event(req, index, chunk)
+            if output:
+                yield output
+        yield DONE_EVENT
+
+    return generate()
+
+
+def record_request(route, model, channel, styles=("",)):
+    """Count a generation request (one per style) in the metrics registry"""
+    # Unknown channels, styles and models are folded together to bound label values
+    templates = config_store.snapshot().templates
+    channel = channel if channel in templates.channels else ("other" if channel else "none")
+    model = model_label(model)
+    for style_id in styles:
+        if style_id and style_id not in templates.styles:
+            style_id = "other"
+        REQUESTS.inc(route=route, style=style_id, channel=channel, model=model)
 
-            # Send style marker if multiple styles
-            if len(styles) > 1:
-                style_label = style_data.get("label", current_style)
-                yield f"data: {json.dumps({'style_start': current_style, 'style_label': style_label, 'style_index': idx})}\n\n"
 
-            # Stream the response for this style
-            yield from llm_provider.stream_response(model, system_prompt, text)
+def style_start_event(idx, style_id, style_data):
+    style_label = style_data.get("label", style_id)
+    return event({"style_start": style_id, "style_label": style_label, "style_index": idx})
 
-            # Send style end marker if multiple styles
-            if len(styles) > 1:
-                yield f"data: {json.dumps({'style_end': current_style, 'style_index': idx})}\n\n"
+
+def style_end_event(idx, style_id):
+    return event({"style_end": style_id, "style_index": idx})
+
+
+def sse_response(events):
+    """Wrap an SSE generator in a streaming response"""
+    if SSE_COALESCE_WINDOW > 0:
+        events = coalesce(events, SSE_COALESCE_WINDOW, SSE_COALESCE_BYTES)
 
     return Response(
-        stream_with_context(generate()),
+        stream_with_context(events),
         mimetype="text/event-stream",
-        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        headers=SSE_HEADERS,
+    )
+
+
+def build_compose_prompt(original_message, my_draft, instructions, channel):
+    """Return (system_prompt, user_text) for /api/compose"""
+    with tracing.span("prompt_build", route="compose") as span:
+        system_prompt, user_text = config_store.snapshot().templates.render(
+            "compose",
+            channel,
+            original_message=original_message,
+            my_draft=my_draft,
+            instructions=instructions,
+        )
+        span.annotate(template=system_prompt.prefix_hash)
+    return system_prompt, user_text
+
+
+@app.route("/api/rephrase", methods=["POST"])
+def rephrase():
+    """Streaming endpoint for text rephrasing - supports single or multiple styles"""
+    req = parse_rephrase_request(request.json)
+    text = req["text"]
+    model = req["model"]
+    styles = req["styles"]
+    record_request("rephrase", model, req["channel"], styles)
+
+    def generate():
+        started = 0
+        try:
+            # Process each selected style
+            for idx, current_style in enumerate(styles):
+                started = idx + 1
+                style_data, system_prompt = build_rephrase_prompt(
+                    current_style, req["channel"], req["additional_instructions"],
+                    req["templates"],
+                )
+
+                # Send style marker if multiple styles
+                if len(styles) > 1:
+                    yield style_start_event(idx, current_style, style_data)
+
+                # Stream the response for this style
+                yield from stream_rephrase(req, system_prompt)
+
+                # Send style end marker if multiple styles
+                if len(styles) > 1:
+                    yield style_end_event(idx, current_style)
+        finally:
+            # Styles not reached before the client disconnected are never launched
+            for _ in styles[started:]:
+                cancellation_stats.record_skipped(text)
+
+    def generate_parallel():
+        # Announce every style up front, then interleave their chunks
+        streams = []
+        for idx, current_style in enumerate(styles):
+            style_data, system_prompt = build_rephrase_prompt(
+                current_style, req["channel"], req["additional_instructions"],
+                req["templates"],
+            )
+            yield style_start_event(idx, current_style, style_data)
+            streams.append(stream_rephrase(req, system_prompt))
+
+        for idx, chunk in merge_streams(
+            streams,
+            max_workers=PARALLEL_STYLES_MAX or None,
+            on_skipped=lambda idx: cancellation_stats.record_skipped(text),
+        ):
+            if chunk is None:
+                yield style_end_event(idx, styles[idx])
+                continue
+
+            # Per-style [DONE] markers are dropped; a single one closes the stream
+            tagged = tag_event(chunk, style_index=idx)
+            if tagged:
+                yield tagged
+
+        yield DONE_EVENT
+
+    return sse_response(
+        generate_parallel() if req["parallel"] and len(styles) > 1 else generate()
     )
 
 
@@ -201,56 +489,104 @@ def compose():
     my_draft = data.get("my_draft", "").strip()
     instructions = data.get("instructions", "").strip()
     channel = data.get("channel", "").strip().lower()
-    model = data.get("model", DEFAULT_MODEL)
+    model = data.get("model", default_model())
 
     if not original_message:
         return jsonify({"error": "original_message is required"}), 400
 
-    system_prompt = (
-        "You are a professional communication assistant. "
-        "Your job is to compose or refine a response to a message the user received. "
-        "Use the provided context sections below — each section is clearly labelled. "
-        "Produce only the final response text, with no preamble or meta-commentary."
+    system_prompt, user_text = build_compose_prompt(
+        original_message, my_draft, instructions, channel
     )
+    record_request("compose", model, channel)
 
-    # Inject channel-specific tone
-    if channel and channel in CHANNEL_TONES:
-        system_prompt += f" {CHANNEL_TONES[channel]}"
+    def generate():
+        yield from stream_llm(model, system_prompt, user_text)
 
-    parts = [f"[Original Message]\n{original_message}"]
+    return sse_response(generate())
 
-    if my_draft:
-        parts.append(f"[My Draft Response]\n{my_draft}")
 
-    if instructions:
-        parts.append(f"[Instructions]\n{instructions}")
+def batch_rephrase_prompts(item):
+    """
+    Return (model, text, [(style_id, system_prompt), ...]) for one batch item.
 
-    if my_draft and instructions:
-        parts.append(
-            "Task: Refine my draft response following the instructions above, keeping the intent intact."
-        )
-    elif my_draft:
-        parts.append(
-            "Task: Refine and improve my draft response to make it clear and professional."
-        )
-    elif instructions:
-        parts.append(
-            "Task: Compose a response to the original message following the instructions above."
+    Items are rephrased whole: the batch runs many of them side by side
+    already, and offloaded jobs take one request per style.
+    """
+    req = parse_batch_item(item)
+    if not req["text"].strip():
+        raise ValueError("text is required")
+    record_request("batch", req["model"], req["channel"], req["styles"])
+
+    style_prompts = []
+    for style_id in req["styles"]:
+        _, system_prompt = build_rephrase_prompt(
+            style_id, req["channel"], req["additional_instructions"], req["templates"]
         )
+        style_prompts.append((style_id, system_prompt))
+    return req["model"], req["text"], style_prompts
+
+
+def batch_rephrase_streams(item):
+    """Yield (style_id, stream) for each style requested by one batch item"""
+    model, text, style_prompts = batch_rephrase_prompts(item)
+    for style_id, system_prompt in style_prompts:
+        yield style_id, stream_llm(model, system_prompt, text)
+
+
+@app.route("/api/batch", methods=["POST"])
+def batch():
+    """Rephrase many items at once, streaming NDJSON results as they finish.
+
+    Accepts a JSONL body (one {text, styles, channel, model} item per line),
+    a JSON list of items, or {"items": [...], "skip_ids": [...]} where
+    skip_ids lists items completed by an earlier, interrupted run.
+    """
+    skip_ids = []
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        items = list(parse_jsonl(request.get_data(as_text=True).splitlines()))
     else:
-        parts.append(
-            "Task: Compose a clear and appropriate response to the original message."
-        )
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            skip_ids = data.get("skip_ids", [])
+            data = data.get("items")
+        if not isinstance(data, list):
+            return jsonify({"error": "Expected a list of items or a JSONL body"}), 400
+        items = data
 
-    user_text = "\n\n".join(parts)
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+
+    runner = BatchRunner(batch_rephrase_streams, BATCH_CONCURRENCY)
 
     def generate():
-        yield from llm_provider.stream_response(model, system_prompt, user_text)
+        for result in runner.run(items, skip_ids):
+            yield json.dumps(result) + "\n"
 
     return Response(
         stream_with_context(generate()),
-        mimetype="text/event-stream",
-        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        mimetype="application/x-ndjson",
+        headers=SSE_HEADERS,
+    )
+
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    """Return runtime statistics (connection pools, caches, queues)"""
+    stats = {
+        "provider": llm_provider.get_stats(),
+        "cancellation": cancellation_stats.stats(),
+        "startup_ms": startup_timings,
+    }
+    if response_cache is not None:
+        stats["response_cache"] = response_cache.stats()
+    return jsonify(stats)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics: request counts, stream latency and throughput, errors"""
+    return Response(
+        metrics_registry.render(), mimetype="text/plain; version=0.0.4"
     )
 
 
@@ -258,8 +594,9 @@ def compose():
 def get_config():
     """Get current configuration with masked keys"""
     try:
-        config_data = config_manager.get_config()
-        return jsonify(config_data)
+        return cached_json(
+            "config", config_manager.config_version(), config_manager.get_config
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -299,5 +636,7 @@ def test_api_key():
 
 
 if __name__ == "__main__":
+    # Development server only; production runs: gunicorn -c gunicorn.conf.py app:app
     port = int(os.getenv("PORT", 5002))
-    app.run(debug=True, host="0.0.0.0", port=port, threaded=True)
+    debug = os.getenv("FLASK_DEBUG", "true").lower() == "true"
+    app.run(debug=debug, host="0.0.0.0", port=port, threaded=True)
@@ -0,0 +1,192 @@
+"""
+ASGI entry point for RePhraseAI
+Serves /api/rephrase and /api/compose with the providers' native async
+streams, so an open stream costs a coroutine instead of a thread. Every
+other route is delegated to the Flask app.
+
+Run with:
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app import (
+    PARALLEL_STYLES_MAX,
+    SSE_COALESCE_BYTES,
+    SSE_COALESCE_WINDOW,
+    SSE_HEADERS,
+    app as flask_app,
+    build_compose_prompt,
+    build_rephrase_prompt,
+    chunk_event,
+    chunk_prompts,
+    default_model,
+    llm_provider,
+    parse_rephrase_request,
+    record_request,
+    response_cache,
+    style_end_event,
+    style_start_event,
+)
+from llm_providers import tracing
+from llm_providers.cancellation import cancellation_stats
+from llm_providers.sse import acoalesce
+from chunking import LONG_INPUT_CONCURRENCY
+from streaming import DONE_EVENT, amerge_streams, aordered_streams, awith_preview, tag_event
+
+
+def astream_llm(model, system_prompt, user_text):
+    """Async stream of a completion, served from the response cache when enabled"""
+    if response_cache is None:
+        return llm_provider.astream_response(model, system_prompt, user_text)
+
+    return response_cache.astream(
+        model,
+        system_prompt,
+        user_text,
+        lambda: llm_provider.astream_response(model, system_prompt, user_text),
+    )
+
+
+async def astream_rephrase(req, system_prompt):
+    """Async counterpart of app.stream_rephrase()"""
+    if not req["chunks"]:
+        stream = astream_llm(req["model"], system_prompt, req["text"])
+        if req["preview_model"]:
+            preview = astream_llm(req["preview_model"], system_prompt, req["text"])
+            stream = awith_preview(stream, preview)
+        async for chunk in stream:
+            yield chunk
+        return
+
+    streams = [
+        astream_llm(req["model"], prompt, text)
+        for prompt, text in chunk_prompts(req, system_prompt)
+    ]
+    async for index, chunk in aordered_streams(
+        streams,
+        max_workers=LONG_INPUT_CONCURRENCY or None,
+        on_skipped=lambda index: cancellation_stats.record_skipped(req["chunks"][index][1]),
+    ):
+        output = chunk_event(req, index, chunk)
+        if output:
+            yield output
+    yield DONE_EVENT
+
+
+def sse_response(events):
+    """Wrap an async SSE generator in a streaming response"""
+    if SSE_COALESCE_WINDOW > 0:
+        events = acoalesce(events, SSE_COALESCE_WINDOW, SSE_COALESCE_BYTES)
+
+    headers = dict(SSE_HEADERS, **{"X-Request-ID": tracing.request_id_var.get()})
+    return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+
+async def rephrase(request):
+    """Async streaming endpoint for text rephrasing"""
+    tracing.start_request(request.headers.get("x-request-id"))
+    req = parse_rephrase_request(await request.json())
+    text = req["text"]
+    model = req["model"]
+    styles = req["styles"]
+    record_request("rephrase", model, req["channel"], styles)
+
+    async def generate():
+        started = 0
+        try:
+            for idx, current_style in enumerate(styles):
+                started = idx + 1
+                style_data, system_prompt = build_rephrase_prompt(
+                    current_style, req["channel"], req["additional_instructions"],
+                    req["templates"],
+                )
+
+                if len(styles) > 1:
+                    yield style_start_event(idx, current_style, style_data)
+
+                async for chunk in astream_rephrase(req, system_prompt):
+                    yield chunk
+
+                if len(styles) > 1:
+                    yield style_end_event(idx, current_style)
+        finally:
+            for _ in styles[started:]:
+                cancellation_stats.record_skipped(text)
+
+    async def generate_parallel():
+        streams = []
+        for idx, current_style in enumerate(styles):
+            style_data, system_prompt = build_rephrase_prompt(
+                current_style, req["channel"], req["additional_instructions"],
+                req["templates"],
+            )
+            yield style_start_event(idx, current_style, style_data)
+            streams.append(astream_rephrase(req, system_prompt))
+
+        async for idx, chunk in amerge_streams(
+            streams,
+            max_workers=PARALLEL_STYLES_MAX or None,
+            on_skipped=lambda idx: cancellation_stats.record_skipped(text),
+        ):
+            if chunk is None:
+                yield style_end_event(idx, styles[idx])
+                continue
+
+            tagged = tag_event(chunk, style_index=idx)
+            if tagged:
+                yield tagged
+
+        yield DONE_EVENT
+
+    return sse_response(
+        generate_parallel() if req["parallel"] and len(styles) > 1 else generate()
+    )
+
+
+async def compose(request):
+    """Async streaming endpoint for composing a response to an original message"""
+    tracing.start_request(request.headers.get("x-request-id"))
+    data = await request.json()
+    original_message = data.get("original_message", "").strip()
+    my_draft = data.get("my_draft", "").strip()
+    instructions = data.get("instructions", "").strip()
+    channel = data.get("channel", "").strip().lower()
+    model = data.get("model", default_model())
+
+    if not original_message:
+        return JSONResponse({"error": "original_message is required"}, status_code=400)
+
+    system_prompt, user_text = build_compose_prompt(
+        original_message, my_draft, instructions, channel
+    )
+    record_request("compose", model, channel)
+
+    return sse_response(astream_llm(model, system_prompt, user_text))
+
+
+async_app = Starlette(
+    routes=[
+        Route("/api/rephrase", rephrase, methods=["POST"]),
+        Route("/api/compose", compose, methods=["POST"]),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+)
+wsgi_app = WSGIMiddleware(flask_app)
+
+ASYNC_PATHS = {"/api/rephrase", "/api/compose"}
+
+
+async def app(scope, receive, send):
+    """Route streaming endpoints to the async app and the rest to Flask"""
+    if scope["type"] != "http" or scope["path"] in ASYNC_PATHS:
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
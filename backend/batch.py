@@ -0,0 +1,457 @@
+"""
+Batch rephrasing for RePhraseAI
+Runs many rephrase items ({text, styles, channel, model}) through the
+provider layer with bounded concurrency and reports one NDJSON result per
+item in completion order. A failing item is reported and the run goes on.
+
+Used by the /api/batch endpoint, and from the command line:
+    python batch.py items.jsonl -o results.ndjson
+    python batch.py items.jsonl -o results.ndjson --resume   # skip items already done
+
+In direct mode, --offload submits the items to the OpenAI/Anthropic batch
+APIs instead (cheaper, results within 24h) and waits for the jobs:
+    python batch.py items.jsonl -o results.ndjson --offload
+    python batch.py -o results.ndjson --resume --jobs <job id>   # after an interruption
+"""
+
+import argparse
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_providers.admission import QUEUED_EVENT_PREFIX
+from llm_providers.batch_jobs import MAX_REQUESTS_PER_JOB, TERMINAL_STATUSES
+from llm_providers.sse import CONTENT_EVENT_PREFIX, DONE_EVENT
+
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Seconds between status checks of upstream batch jobs (--offload)
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+
+
+def item_id(index, item):
+    """An item's id: its "id" field, else its position in the input"""
+    return item.get("id", index) if isinstance(item, dict) else index
+
+
+class BatchCancelled(Exception):
+    """Raised inside a worker when the batch consumer has gone away"""
+
+
+def parse_jsonl(lines):
+    """
+    Parse JSONL items, skipping blank lines.
+
+    Lines that are not a JSON object are yielded as ValueError instances,
+    so they are reported as failed items instead of aborting the run.
+
+    Args:
+        lines (iterable): Lines of text or bytes
+
+    Yields:
+        dict | ValueError: One item per non-blank line
+    """
+    for lineno, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"Invalid JSON on line {lineno}: {e.msg}")
+            continue
+        if not isinstance(item, dict):
+            yield ValueError(f"Line {lineno} is not a JSON object")
+            continue
+        yield item
+
+
+def collect_text(stream, stop=None):
+    """
+    Read a provider stream to the end and return its text.
+
+    Args:
+        stream (iterator): SSE formatted strings from stream_response()
+        stop (threading.Event): Closes the stream early when set
+
+    Returns:
+        tuple: (text, error) where error is the error payload or None
+    """
+    parts = []
+    try:
+        for chunk in stream:
+            if stop is not None and stop.is_set():
+                raise BatchCancelled()
+            if chunk == DONE_EVENT or chunk.startswith(QUEUED_EVENT_PREFIX):
+                continue
+            if chunk.startswith(CONTENT_EVENT_PREFIX):
+                parts.append(json.loads(chunk[6:])["content"])
+                continue
+            try:
+                payload = json.loads(chunk[6:])
+            except json.JSONDecodeError:
+                continue
+            if "error" in payload:
+                return "".join(parts), {
+                    "error": payload["error"],
+                    "error_code": payload.get("error_code", "UNKNOWN_ERROR"),
+                }
+    finally:
+        stream.close()
+    return "".join(parts), None
+
+
+class BatchRunner:
+    """
+    Runs batch items concurrently and yields their results as they finish.
+
+    Items are pulled from the input lazily, so at most `concurrency` items
+    are in flight. Given a lazy iterator (the command line's JSONL reader),
+    inputs of any size run in constant memory; /api/batch parses the whole
+    request body first and is bounded by BATCH_MAX_ITEMS instead.
+    """
+
+    def __init__(self, rephrase_streams, concurrency=BATCH_CONCURRENCY):
+        """
+        Args:
+            rephrase_streams (callable): Takes an item and yields a
+                (style_id, stream) pair per requested style
+            concurrency (int): Maximum number of items processed at once
+        """
+        self.rephrase_streams = rephrase_streams
+        self.concurrency = max(1, concurrency)
+
+    def process(self, current_id, item, stop):
+        """Run one item; every failure is captured in the result"""
+        started = time.monotonic()
+        result = {"id": current_id, "status": "ok", "results": {}}
+        try:
+            if isinstance(item, Exception):
+                raise item
+            errors = {}
+            for style_id, stream in self.rephrase_streams(item):
+                text, error = collect_text(stream, stop)
+                result["results"][style_id] = text
+                if error:
+                    errors[style_id] = error
+            if errors:
+                result["status"] = "error"
+                result["errors"] = errors
+        except BatchCancelled:
+            raise
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+        result["elapsed"] = round(time.monotonic() - started, 3)
+        return result
+
+    def run(self, items, skip_ids=()):
+        """
+        Process items with bounded concurrency.
+
+        Args:
+            items (iterable): Item dicts; an item's id defaults to its
+                position in the input
+            skip_ids (iterable): Ids of items already done (for resuming)
+
+        Yields:
+            dict: One result per processed item, in completion order, then
+                  a final {"summary": {...}} line
+        """
+        skip = {str(skipped) for skipped in skip_ids}
+        summary = {"ok": 0, "failed": 0, "skipped": 0}
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch")
+        pending = set()
+        items = iter(enumerate(items))
+
+        def submit_next():
+            for index, item in items:
+                current_id = item_id(index, item)
+                if str(current_id) in skip:
+                    summary["skipped"] += 1
+                    continue
+                # Workers inherit the request context (request ID, tracing)
+                context = contextvars.copy_context()
+                pending.add(pool.submit(context.run, self.process, current_id, item, stop))
+                return True
+            return False
+
+        try:
+            while len(pending) < self.concurrency and submit_next():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    result = future.result()
+                    summary["ok" if result["status"] == "ok" else "failed"] += 1
+                    yield result
+                    submit_next()
+            yield {"summary": summary}
+        finally:
+            # The consumer stopped early: let running items close their streams
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _offload_failure(current_id, error):
+    return {"id": current_id, "status": "error", "results": {}, "error": error}
+
+
+def submit_offload(provider, items, rephrase_prompts, skip_ids=()):
+    """
+    Submit items to the upstream batch APIs, one job per model.
+
+    All styles of an item go into the same job, so each item's results
+    arrive together.
+
+    Args:
+        provider: Provider with submit_batch() (DirectProvider)
+        items (iterable): Item dicts
+        rephrase_prompts (callable): Takes an item and returns
+            (model, text, [(style_id, system_prompt), ...])
+        skip_ids (iterable): Ids of items already done (for resuming)
+
+    Returns:
+        tuple: (jobs, failed) where failed holds the results of items that
+               could not be prepared or submitted
+    """
+    skip = {str(skipped) for skipped in skip_ids}
+    groups_by_model = {}
+    failed = []
+    for index, item in enumerate(items):
+        current_id = item_id(index, item)
+        if str(current_id) in skip:
+            continue
+        try:
+            if isinstance(item, Exception):
+                raise item
+            model, text, style_prompts = rephrase_prompts(item)
+        except Exception as e:
+            failed.append(_offload_failure(current_id, str(e)))
+            continue
+        groups_by_model.setdefault(model, []).append([
+            ([current_id, style_id], system_prompt, text)
+            for style_id, system_prompt in style_prompts
+        ])
+
+    jobs = []
+    for model, groups in groups_by_model.items():
+        # Split oversized batches between items, never within one
+        job_groups = [[]]
+        for group in groups:
+            size = sum(len(pending) for pending in job_groups[-1])
+            if job_groups[-1] and size + len(group) > MAX_REQUESTS_PER_JOB:
+                job_groups.append([])
+            job_groups[-1].append(group)
+
+        for pending in job_groups:
+            requests = [request for group in pending for request in group]
+            try:
+                jobs.append(provider.submit_batch(model, requests))
+            except Exception as e:
+                failed.extend(
+                    _offload_failure(group[0][0][0], f"Batch submission failed: {e}")
+                    for group in pending
+                )
+    return jobs, failed
+
+
+def job_results(job):
+    """Group the per-request results of an ended job into per-item results"""
+    results = {}
+    for custom_id, (current_id, style_id) in job["requests"].items():
+        result = results.setdefault(
+            str(current_id), {"id": current_id, "status": "ok", "results": {}}
+        )
+        outcome = (job["results"] or {}).get(custom_id) or {
+            "error": job["error"] or f"No result returned (job {job['status']})",
+            "error_code": f"BATCH_{job['status'].upper()}",
+        }
+        if "text" in outcome:
+            result["results"][style_id] = outcome["text"]
+        else:
+            result["status"] = "error"
+            result.setdefault("errors", {})[style_id] = outcome
+    return list(results.values())
+
+
+def offload(provider, items, rephrase_prompts, skip_ids=(), poll_interval=BATCH_POLL_INTERVAL,
+            jobs=None):
+    """
+    Run items through the upstream batch APIs and wait for the results.
+
+    Jobs are recorded in the provider's job store as they are submitted;
+    pass them back as `jobs` to collect results after an interruption.
+
+    Yields:
+        dict: Per-item results as their jobs end, then a summary line
+    """
+    summary = {"ok": 0, "failed": 0, "skipped": 0}
+    skip = {str(skipped) for skipped in skip_ids}
+    if jobs is None:
+        jobs, failed = submit_offload(provider, items, rephrase_prompts, skip_ids)
+        for job in jobs:
+            print(
+                f"[INFO] Submitted batch job {job['id']} ({len(job['requests'])} requests, "
+                f"{job['model']}); collect later with --jobs {job['id']}",
+                file=sys.stderr,
+            )
+        for result in failed:
+            summary["failed"] += 1
+            yield result
+
+    pending = list(jobs)
+    while pending:
+        for job in list(pending):
+            try:
+                provider.poll_batch(job)
+            except Exception as e:
+                print(f"[WARN] Failed to poll batch job {job['id']}: {e}", file=sys.stderr)
+                continue
+            if job["status"] not in TERMINAL_STATUSES:
+                continue
+            pending.remove(job)
+            print(f"[INFO] Batch job {job['id']} {job['status']}", file=sys.stderr)
+            for result in job_results(job):
+                if str(result["id"]) in skip:
+                    summary["skipped"] += 1
+                    continue
+                summary["ok" if result["status"] == "ok" else "failed"] += 1
+                yield result
+        if pending:
+            counts = ", ".join(
+                f"{job['id']}: {job['request_counts'] or job['status']}" for job in pending
+            )
+            print(f"[INFO] Waiting for batch jobs ({counts})", file=sys.stderr)
+            time.sleep(poll_interval)
+
+    yield {"summary": summary}
+
+
+def read_done_ids(path):
+    """Return the ids of successful items in an existing results file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut off by an interrupted run
+            if result.get("status") == "ok":
+                done.add(str(result["id"]))
+    return done
+
+
+def read_items(path):
+    """
+    Yield items from a JSONL file, a JSON list file, or stdin ("-").
+
+    JSONL is read line by line as items are consumed, so the input is never
+    held in memory as a whole; a JSON list has to be parsed in one go.
+    """
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        # The first non-blank line tells a JSON list from JSONL
+        lines = iter(f)
+        head = []
+        for line in lines:
+            head.append(line)
+            if line.strip():
+                break
+        if "".join(head).lstrip().startswith("["):
+            yield from json.loads("".join(head) + f.read())
+        else:
+            yield from parse_jsonl(itertools.chain(head, lines))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rephrase a JSONL file of items in bulk")
+    parser.add_argument("input", nargs="?", help="JSONL (or JSON list) file of items, or - for stdin")
+    parser.add_argument("-o", "--output", help="NDJSON results file (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Items processed at once")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip items already completed in the output file and append")
+    parser.add_argument("--offload", action="store_true",
+                        help="Submit to the provider batch APIs instead of streaming (direct mode)")
+    parser.add_argument("--jobs", nargs="+", metavar="JOB_ID",
+                        help="Collect the results of previously submitted offload jobs")
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL,
+                        help="Seconds between offload job status checks")
+    args = parser.parse_args()
+    if not args.input and not args.jobs:
+        parser.error("an input file is required unless --jobs is given")
+
+    items = read_items(args.input) if args.input else []
+    skip_ids = read_done_ids(args.output) if args.resume and args.output else set()
+
+    # Imported here so the provider is only set up when actually running;
+    # startup messages go to stderr to keep stdout clean NDJSON
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import batch_rephrase_prompts, batch_rephrase_streams, llm_provider
+
+    if args.offload or args.jobs:
+        if not hasattr(llm_provider, "submit_batch"):
+            print("[ERROR] Batch offload needs direct mode (LLM_MODE=direct)", file=sys.stderr)
+            return 2
+        if args.jobs:
+            jobs = [llm_provider.batch_jobs.load(job_id) for job_id in args.jobs]
+            if None in jobs:
+                missing = [job_id for job_id, job in zip(args.jobs, jobs) if job is None]
+                print(f"[ERROR] Unknown batch job(s): {', '.join(missing)}", file=sys.stderr)
+                return 2
+        else:
+            jobs = None
+        results = offload(
+            llm_provider, items, batch_rephrase_prompts, skip_ids, args.poll_interval, jobs
+        )
+        show_progress = False
+    else:
+        results = BatchRunner(batch_rephrase_streams, args.concurrency).run(items, skip_ids)
+        # Items are read as they run, so progress is a running count
+        show_progress = True
+
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    finished = 0
+    try:
+        for result in results:
+            if "summary" in result:
+                summary = result["summary"]
+                print(
+                    f"[INFO] Batch finished: {summary['ok']} ok, {summary['failed']} failed, "
+                    f"{summary['skipped']} skipped",
+                    file=sys.stderr,
+                )
+                break
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            finished += 1
+            if result["status"] != "ok":
+                print(f"[WARN] Item {result['id']} failed", file=sys.stderr)
+            if show_progress:
+                print(f"[INFO] {finished} done", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0 if result.get("summary", {}).get("failed") == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
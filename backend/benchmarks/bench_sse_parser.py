@@ -0,0 +1,160 @@
+"""
+Gateway SSE parser micro-benchmark
+Compares the previous line-based parsing (requests iter_lines + json.loads
+on every data line) with the incremental SSEParser and per-stream decoders.
+
+Usage (from backend/):
+    python benchmarks/bench_sse_parser.py
+    python benchmarks/bench_sse_parser.py --file stream.txt --format anthropic
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from llm_providers.sse import DONE_EVENT, content_event  # noqa: E402
+from llm_providers.sse_parser import DECODERS, SSEParser  # noqa: E402
+
+
+# Typical read size for a chunked SSE body arriving over the network
+READ_SIZE = 1400
+
+WORDS = "The quick brown fox jumps over the lazy dog, and then it \"rests\". ".split(" ")
+
+
+def record_anthropic(tokens):
+    """Build a stream shaped like the Anthropic Messages API"""
+    parts = [
+        'event: message_start\ndata: {"type": "message_start", "message": {"id": "msg_1", '
+        '"type": "message", "role": "assistant", "content": [], "model": "claude", '
+        '"usage": {"input_tokens": 120, "output_tokens": 1}}}\n\n',
+        'event: content_block_start\ndata: {"type": "content_block_start", "index": 0, '
+        '"content_block": {"type": "text", "text": ""}}\n\n',
+        "event: ping\ndata: {\"type\": \"ping\"}\n\n",
+    ]
+    for i in range(tokens):
+        delta = {"type": "content_block_delta", "index": 0,
+                 "delta": {"type": "text_delta", "text": WORDS[i % len(WORDS)] + " "}}
+        parts.append(f"event: content_block_delta\ndata: {json.dumps(delta)}\n\n")
+    parts.append('event: content_block_stop\ndata: {"type": "content_block_stop", "index": 0}\n\n')
+    parts.append('event: message_delta\ndata: {"type": "message_delta", "delta": '
+                 '{"stop_reason": "end_turn"}, "usage": {"output_tokens": %d}}\n\n' % tokens)
+    parts.append('event: message_stop\ndata: {"type": "message_stop"}\n\n')
+    return "".join(parts).encode("utf-8")
+
+
+def record_openai(tokens):
+    """Build a stream shaped like the OpenAI chat completions API"""
+    parts = []
+    for i in range(tokens):
+        chunk = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 1,
+                 "model": "gpt-4o", "choices": [{"index": 0, "delta": {
+                     "content": WORDS[i % len(WORDS)] + " "}, "finish_reason": None}]}
+        parts.append(f"data: {json.dumps(chunk)}\n\n")
+    final = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 1,
+             "model": "gpt-4o", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    parts.append(f"data: {json.dumps(final)}\n\n")
+    parts.append("data: [DONE]\n\n")
+    return "".join(parts).encode("utf-8")
+
+
+def make_response(body):
+    """Wrap a recorded body in a requests Response, as a streamed read would see it"""
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def legacy_parse(body):
+    """The previous parsing loop: iter_lines, then json.loads per data line"""
+    events = []
+    for line in make_response(body).iter_lines():
+        if not line:
+            continue
+        line_text = line.decode("utf-8")
+        if not line_text.startswith("data: "):
+            continue
+        data_str = line_text[6:]
+        if data_str.strip() == "[DONE]":
+            events.append(DONE_EVENT)
+            break
+        try:
+            chunk = json.loads(data_str)
+        except json.JSONDecodeError:
+            continue
+        if "type" in chunk:
+            if chunk["type"] == "content_block_delta":
+                content = chunk.get("delta", {}).get("text", "")
+                if content:
+                    events.append(content_event(content))
+            elif chunk["type"] == "message_stop":
+                events.append(DONE_EVENT)
+                break
+        elif "choices" in chunk and len(chunk["choices"]) > 0:
+            content = chunk["choices"][0].get("delta", {}).get("content", "")
+            if content:
+                events.append(content_event(content))
+            if chunk["choices"][0].get("finish_reason"):
+                events.append(DONE_EVENT)
+                break
+    return events
+
+
+def incremental_parse(body, model_type):
+    """The current loop: SSEParser over raw reads plus a per-stream decoder"""
+    parser = SSEParser()
+    decode = DECODERS[model_type]
+    events = []
+    for start in range(0, len(body), READ_SIZE):
+        for event_name, data in parser.feed(body[start:start + READ_SIZE]):
+            content, ended = decode(event_name, data)
+            if content:
+                events.append(content_event(content))
+            if ended:
+                events.append(DONE_EVENT)
+                return events
+    return events
+
+
+def bench(label, body, model_type, number):
+    legacy = legacy_parse(body)
+    incremental = incremental_parse(body, model_type)
+    if legacy != incremental:
+        raise SystemExit(f"[ERROR] {label}: parsers disagree")
+
+    old = min(timeit.repeat(lambda: legacy_parse(body), number=number, repeat=5))
+    new = min(timeit.repeat(lambda: incremental_parse(body, model_type), number=number, repeat=5))
+    per_stream = lambda t: t / number * 1e6
+    print(f"{label:<12} {len(body):>9} bytes  {len(legacy):>6} events  "
+          f"legacy {per_stream(old):9.1f} us  incremental {per_stream(new):9.1f} us  "
+          f"speedup {old / new:4.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=800, help="Tokens per synthetic stream")
+    parser.add_argument("--number", type=int, default=50, help="Streams parsed per timing run")
+    parser.add_argument("--file", help="Recorded gateway response body to benchmark")
+    parser.add_argument("--format", choices=sorted(DECODERS), default="anthropic",
+                        help="Model type of the recorded stream")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            bench(os.path.basename(args.file), f.read(), args.format, args.number)
+        return
+
+    bench("anthropic", record_anthropic(args.tokens), "anthropic", args.number)
+    bench("openai", record_openai(args.tokens), "openai", args.number)
+
+
+if __name__ == "__main__":
+    main()
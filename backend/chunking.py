@@ -0,0 +1,112 @@
+"""
+Long-input chunking for RePhraseAI
+Splits long texts into chunks of bounded token size on paragraph, then
+sentence, then word boundaries, so each chunk can be rephrased on its own
+and in parallel with the others.
+"""
+
+import os
+import re
+
+from llm_providers.token_estimator import estimate_tokens
+
+
+# Texts above this many estimated tokens are chunked (0 = only on request)
+LONG_INPUT_THRESHOLD_TOKENS = int(os.getenv("LONG_INPUT_THRESHOLD_TOKENS", "3000"))
+
+# Target size of each chunk
+LONG_INPUT_CHUNK_TOKENS = int(os.getenv("LONG_INPUT_CHUNK_TOKENS", "1000"))
+
+# Chunks rephrased at once per style
+LONG_INPUT_CONCURRENCY = int(os.getenv("LONG_INPUT_CONCURRENCY", "4"))
+
+# Characters from the end of the previous chunk shown with each chunk, so
+# the parts agree on tone and terms (0 = none)
+LONG_INPUT_CONTEXT_CHARS = int(os.getenv("LONG_INPUT_CONTEXT_CHARS", "300"))
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+PARAGRAPH_SEPARATOR = "\n\n"
+SENTENCE_SEPARATOR = " "
+
+
+def is_long_input(text):
+    """Whether a text is long enough to be chunked automatically"""
+    return bool(LONG_INPUT_THRESHOLD_TOKENS) and estimate_tokens(text) > LONG_INPUT_THRESHOLD_TOKENS
+
+
+def _split_words(text, max_tokens):
+    """Split a single overlong sentence into runs of whole words"""
+    pieces, current, current_tokens = [], [], 0
+    for word in text.split():
+        tokens = estimate_tokens(word) + 1
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _units(text, max_tokens):
+    """Yield (separator, text, tokens) for the smallest pieces that fit a chunk"""
+    for paragraph in PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = estimate_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield PARAGRAPH_SEPARATOR, paragraph, tokens
+            continue
+
+        separator = PARAGRAPH_SEPARATOR
+        for sentence in SENTENCE_END.split(paragraph):
+            tokens = estimate_tokens(sentence)
+            pieces = [sentence] if tokens <= max_tokens else _split_words(sentence, max_tokens)
+            for piece in pieces:
+                yield separator, piece, estimate_tokens(piece)
+                separator = SENTENCE_SEPARATOR
+
+
+def split_text(text, max_tokens=LONG_INPUT_CHUNK_TOKENS):
+    """
+    Split a text into chunks of at most about max_tokens tokens.
+
+    Whole paragraphs are packed together where they fit; longer paragraphs
+    are split between sentences, and overlong sentences between words.
+
+    Args:
+        text (str): Text to split
+        max_tokens (int): Target chunk size in estimated tokens
+
+    Returns:
+        list: (separator, chunk) tuples in document order, where separator
+              is the whitespace that joined the chunk to the previous one
+              ("" for the first chunk)
+    """
+    chunks = []
+    separator, parts, chunk_tokens = "", [], 0
+    for unit_separator, unit, tokens in _units(text, max_tokens):
+        if parts and chunk_tokens + tokens > max_tokens:
+            chunks.append((separator, "".join(parts)))
+            separator, parts, chunk_tokens = unit_separator, [], 0
+        if parts:
+            parts.append(unit_separator)
+        parts.append(unit)
+        chunk_tokens += tokens
+    if parts:
+        chunks.append((separator, "".join(parts)))
+    return chunks
+
+
+def previous_context(text, max_chars=LONG_INPUT_CONTEXT_CHARS):
+    """Last max_chars characters of a chunk, starting at a word boundary"""
+    if max_chars <= 0:
+        return ""
+    if len(text) <= max_chars:
+        return text
+    tail = text[-max_chars:]
+    return tail.split(None, 1)[-1] if " " in tail else tail
@@ -4,11 +4,66 @@ Handles reading, writing, and managing configuration files safely.
 """
 
 import os
+import re
 import json
 import shutil
-from datetime import datetime
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
+from llm_providers import client_cache, model_registry
+
+# File locks are POSIX only; elsewhere saves are serialized per process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Backups kept per config file, and the age after which they are pruned
+# (the newest backup of each file is always kept)
+BACKUP_KEEP = int(os.getenv('CONFIG_BACKUP_KEEP', '10'))
+BACKUP_MAX_AGE_DAYS = float(os.getenv('CONFIG_BACKUP_MAX_AGE_DAYS', '30'))
+
+BACKUP_TIMESTAMP = '%Y%m%d_%H%M%S_%f'
+
+# <file>.backup_<timestamp>[_<content hash>]; older backups have no
+# microseconds or hash
+BACKUP_NAME = re.compile(r'^(?P<file>.+)\.backup_(?P<time>\d{8}_\d{6}(?:_\d{6})?)(?:_(?P<hash>[0-9a-f]+))?$')
+
+_save_lock = threading.Lock()
+
+
+def content_hash(path: str) -> str:
+    """Short sha256 of a file's contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def atomic_write(path: str, text: str):
+    """
+    Replace a file's contents without ever exposing a partial write.
+
+    The new contents go to a temporary file in the same directory, which is
+    renamed over the original; the original's permissions are kept.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 
 class ConfigManager:
     def __init__(self, base_dir: str = None):
@@ -17,6 +72,8 @@ class ConfigManager:
         self.config_file = os.path.join(self.base_dir, 'config.json')
         self.gateway_config_file = os.path.join(self.base_dir, 'config.gateway.json')
         self.prompts_file = os.path.join(self.base_dir, 'prompts.json')
+        self.backup_dir = os.path.join(self.base_dir, 'backups')
+        self.lock_file = os.path.join(self.backup_dir, '.lock')
 
     def mask_key(self, key: str) -> str:
         """Mask API key for security, showing only last 4 characters"""
@@ -28,6 +85,27 @@ class ConfigManager:
         """Check if a key is already masked"""
         return key.startswith('*') or key == '****'
 
+    def _models_config_file(self) -> str:
+        """Model config file for the current LLM_MODE"""
+        llm_mode = os.getenv('LLM_MODE', 'gateway')
+        return self.gateway_config_file if llm_mode == 'gateway' else self.config_file
+
+    def config_version(self) -> tuple:
+        """
+        Cheap fingerprint of every file get_config() reads.
+
+        Changes whenever one of them is written (saves replace the file, so
+        the inode changes even within one mtime tick).
+        """
+        version = []
+        for path in (self.env_file, self._models_config_file(), self.prompts_file):
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
     def get_config(self) -> Dict[str, Any]:
         """Get current configuration with masked keys"""
         config = {
@@ -120,46 +198,115 @@ class ConfigManager:
                     ]
         return []
 
+    @contextmanager
+    def _locked(self):
+        """Hold the config lock, shared by threads and worker processes"""
+        with _save_lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.backup_dir, exist_ok=True)
+            with open(self.lock_file, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
     def save_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """Save configuration changes"""
         try:
-            # Backup current configuration
-            self._create_backup()
-
-            # Save LLM config to .env
-            if 'llm' in config:
-                self._save_llm_config(config['llm'])
-
-            # Save models config
-            if 'models' in config:
-                self._save_models_config(config['models'])
-
-            # Save styles config
-            if 'styles' in config:
-                self._save_styles_config(config['styles'])
-
+            with self._locked():
+                self._save_config(config)
             return {'success': True, 'message': 'Configuration saved successfully'}
 
         except Exception as e:
             return {'success': False, 'message': f'Failed to save configuration: {str(e)}'}
 
-    def _create_backup(self):
-        """Create backup of current configuration files"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_dir = os.path.join(self.base_dir, 'backups')
-        os.makedirs(backup_dir, exist_ok=True)
+    def _save_config(self, config: Dict[str, Any]):
+        """Back up and write every section present in config (lock held)"""
+        # Backup current configuration
+        self._create_backup()
 
-        if os.path.exists(self.env_file):
-            shutil.copy2(self.env_file, os.path.join(backup_dir, f'.env.backup_{timestamp}'))
+        # Save LLM config to .env; the running providers switch to new keys
+        if 'llm' in config and self._save_llm_config(config['llm']):
+            client_cache.rotate_keys()
+
+        # Save models config
+        if 'models' in config:
+            self._save_models_config(config['models'])
 
-        if os.path.exists(self.config_file):
-            shutil.copy2(self.config_file, os.path.join(backup_dir, f'config.json.backup_{timestamp}'))
+        # Save styles config
+        if 'styles' in config:
+            self._save_styles_config(config['styles'])
 
-        if os.path.exists(self.gateway_config_file):
-            shutil.copy2(self.gateway_config_file, os.path.join(backup_dir, f'config.gateway.json.backup_{timestamp}'))
+        # Make the running providers pick up model changes right away
+        model_registry.invalidate()
 
-    def _save_llm_config(self, llm_config: Dict[str, Any]):
-        """Save LLM configuration to .env file"""
+    def _create_backup(self):
+        """Back up config files that changed since their last backup, then prune"""
+        timestamp = datetime.now().strftime(BACKUP_TIMESTAMP)
+        os.makedirs(self.backup_dir, exist_ok=True)
+        backups = self._list_backups()
+
+        for path in (self.env_file, self.config_file, self.gateway_config_file, self.prompts_file):
+            if not os.path.exists(path):
+                continue
+            name = os.path.basename(path)
+            digest = content_hash(path)
+
+            # Unchanged since the newest backup: nothing to keep
+            existing = backups.get(name, [])
+            if existing and existing[-1][2] == digest:
+                continue
+
+            backup_name = f'{name}.backup_{timestamp}_{digest}'
+            shutil.copy2(path, os.path.join(self.backup_dir, backup_name))
+            existing.append((timestamp, backup_name, digest))
+            backups[name] = existing
+
+        self._prune_backups(backups)
+
+    def _list_backups(self) -> Dict[str, list]:
+        """Return {file name: [(timestamp, backup name, hash), ...]}, oldest first"""
+        backups = {}
+        for backup_name in os.listdir(self.backup_dir):
+            match = BACKUP_NAME.match(backup_name)
+            if match:
+                backups.setdefault(match['file'], []).append(
+                    (match['time'], backup_name, match['hash'])
+                )
+        for entries in backups.values():
+            entries.sort()
+        return backups
+
+    def _prune_backups(self, backups: Dict[str, list]):
+        """Apply the CONFIG_BACKUP_KEEP / CONFIG_BACKUP_MAX_AGE_DAYS retention policy"""
+        cutoff = None
+        if BACKUP_MAX_AGE_DAYS > 0:
+            cutoff = (datetime.now() - timedelta(days=BACKUP_MAX_AGE_DAYS)).strftime(BACKUP_TIMESTAMP)
+
+        for entries in backups.values():
+            # The newest backup of each file is always kept
+            for index, (timestamp, backup_name, _) in enumerate(entries[:-1]):
+                too_many = BACKUP_KEEP > 0 and index < len(entries) - BACKUP_KEEP
+                too_old = cutoff is not None and timestamp < cutoff
+                if not (too_many or too_old):
+                    continue
+                try:
+                    os.remove(os.path.join(self.backup_dir, backup_name))
+                except FileNotFoundError:
+                    pass
+
+    def _save_llm_config(self, llm_config: Dict[str, Any]) -> bool:
+        """
+        Save LLM configuration to .env file.
+
+        API keys are also applied to this process's environment.
+
+        Returns:
+            bool: True if any API key changed
+        """
         env_lines = []
 
         # Read existing .env file
@@ -206,13 +353,20 @@ class ConfigManager:
             env_lines.append(f"GATEWAY_API_KEY={llm_config['gateway_api_key']}\n")
 
         # Write back to .env file
-        with open(self.env_file, 'w') as f:
-            f.writelines(env_lines)
+        atomic_write(self.env_file, ''.join(env_lines))
+
+        # Apply changed keys to the running process (LLM_MODE needs a restart)
+        rotated = False
+        for line in env_lines:
+            key, _, value = line.strip().partition('=')
+            if key.endswith('_API_KEY') and value and os.environ.get(key) != value:
+                os.environ[key] = value
+                rotated = True
+        return rotated
 
     def _save_models_config(self, models_config: Dict[str, Any]):
         """Save models configuration"""
-        llm_mode = os.getenv('LLM_MODE', 'gateway')
-        config_file = self.gateway_config_file if llm_mode == 'gateway' else self.config_file
+        config_file = self._models_config_file()
 
         if os.path.exists(config_file):
             with open(config_file, 'r') as f:
@@ -226,8 +380,7 @@ class ConfigManager:
         if 'available' in models_config:
             config_data['available_models'] = models_config['available']
 
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f, indent=2)
+        atomic_write(config_file, json.dumps(config_data, indent=2))
 
     def _save_styles_config(self, styles: list):
         """Save custom styles to prompts.json"""
@@ -240,8 +393,7 @@ class ConfigManager:
         # Save styles as array format (matching current prompts.json structure)
         prompts_data['styles'] = styles
 
-        with open(self.prompts_file, 'w') as f:
-            json.dump(prompts_data, f, indent=2)
+        atomic_write(self.prompts_file, json.dumps(prompts_data, indent=2))
 
     def test_api_key(self, provider: str, api_key: str) -> Dict[str, Any]:
         """Test if an API key is valid"""
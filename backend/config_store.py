@@ -0,0 +1,67 @@
+"""
+Hot-reloadable configuration for RePhraseAI
+Combines prompts.json and the model config file into one versioned
+snapshot. Both files are re-read when they change on disk, so edits take
+effect without a restart; a request keeps the snapshot it started with.
+"""
+
+import threading
+
+from llm_providers.model_registry import get_registry
+from prompt_templates import PromptFile
+
+
+class ConfigSnapshot:
+    """Consistent view of prompts and model config at one version of each"""
+
+    def __init__(self, prompts, models):
+        self.parts = (prompts, models)
+        self.templates = prompts.templates
+        self.config = models.config
+        self.default_model = models.config.get("default_model")
+        # Changes whenever either file is reloaded (usable as an ETag)
+        self.version = f"{prompts.version}.{models.version}"
+
+
+class ConfigStore:
+    """Current ConfigSnapshot, rebuilt only when one of its files changes"""
+
+    def __init__(self, prompts_path="prompts.json", config_path="config.json",
+                 required_templates=("compose",)):
+        """
+        Args:
+            prompts_path (str): Path to prompts.json
+            config_path (str): Model config file (config.json or config.gateway.json)
+            required_templates (tuple): Templates prompts.json must define
+        """
+        self.prompts = PromptFile(prompts_path, required_templates)
+        self.models = get_registry(config_path)
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def errors(self):
+        """Why the files could not be (re)loaded; empty if both are current"""
+        return [error for error in (self.prompts.error, self.models.error) if error]
+
+    def snapshot(self):
+        """
+        Return the current snapshot.
+
+        Returns:
+            ConfigSnapshot: The snapshot, or None if either file has never
+            loaded successfully
+        """
+        prompts = self.prompts.snapshot()
+        models = self.models.snapshot()
+        if prompts.templates is None or not models.version:
+            return None
+
+        cached = self._snapshot
+        if cached is not None and cached.parts == (prompts, models):
+            return cached
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.parts != (prompts, models):
+                self._snapshot = ConfigSnapshot(prompts, models)
+            return self._snapshot
@@ -0,0 +1,52 @@
+"""
+Gunicorn configuration for RePhraseAI
+Production entry point: gunicorn -c gunicorn.conf.py app:app
+
+SSE responses stay open for the whole LLM completion, so the default
+worker class is gevent: each open stream is a cheap greenlet instead of an
+OS thread, and one worker can hold many concurrent streams.
+All settings can be overridden through environment variables.
+"""
+
+import os
+import sys
+
+
+# Network
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+
+# Worker model
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+# Maximum simultaneous clients (open SSE streams) per gevent worker
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# Async workers heartbeat independently of request length, so this only
+# kills workers that are truly stuck, not long-running streams
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Seconds in-flight streams get to finish after SIGTERM before being cut
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+
+# Idle keep-alive for client connections between requests
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers periodically (0 disables)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# Logging
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def worker_exit(server, worker):
+    """Close pooled upstream connections when a worker shuts down"""
+    app_module = sys.modules.get("app")
+    provider = getattr(app_module, "llm_provider", None)
+    http_pool = getattr(provider, "http_pool", None)
+    if http_pool is not None:
+        http_pool.close()
@@ -4,11 +4,25 @@ Supports both direct API access and gateway-based access
 """
 
 from .base import BaseLLMProvider
-from .direct_provider import DirectProvider
-from .gateway_provider import GatewayProvider
+import importlib
 import os
 
 
+# Provider modules are imported on first use, so a process only pays for
+# the mode (and the SDKs) it actually runs
+_PROVIDER_MODULES = {
+    'DirectProvider': '.direct_provider',
+    'GatewayProvider': '.gateway_provider',
+}
+
+
+def __getattr__(name):
+    module = _PROVIDER_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
+
+
 def get_provider():
     """
     Factory function to get the appropriate LLM provider based on environment configuration.
@@ -20,9 +34,11 @@ def get_provider():
 
     if llm_mode == 'gateway':
         print("[INFO] Using Gateway Provider mode")
+        from .gateway_provider import GatewayProvider
         return GatewayProvider()
     else:
         print("[INFO] Using Direct Provider mode")
+        from .direct_provider import DirectProvider
         return DirectProvider()
 
 
@@ -0,0 +1,347 @@
+"""
+Admission control for upstream LLM calls
+Caps concurrent requests per model and per gateway host. Requests over the
+limit wait in a bounded FIFO queue and are told their position, instead of
+all hitting the upstream at once and coming back as rate-limit errors.
+Limits are per worker process: with several workers (WEB_CONCURRENCY) the
+effective cap is the configured limit times the number of workers.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+from .sse import error_event, event
+from . import tracing
+
+log = tracing.get_logger(__name__)
+
+
+DEFAULT_ADMISSION_CONFIG = {
+    "max_concurrent_per_model": 0,
+    "max_concurrent_per_gateway": 0,
+    "max_queue": 50,
+    "queue_timeout": 30,
+    "models": {},
+    "gateways": {},
+}
+
+# How often a waiting request re-checks its queue position
+POSITION_POLL_INTERVAL = 0.5
+
+QUEUED_EVENT_PREFIX = 'data: {"queued": '
+
+# Gate shared by every model outside the model config, so arbitrary model
+# names cannot each get their own quota or grow the gate table
+OTHER_MODELS = "other"
+
+
+def queued_event(position):
+    """Encode a queue position update as an SSE event"""
+    return event({"queued": True, "position": position})
+
+
+class _Ticket:
+    """A request waiting for a slot"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.wakeup = asyncio.Event() if loop else threading.Event()
+        self.admitted = False
+        self.enqueued_at = time.monotonic()
+
+    def notify(self):
+        if self.loop is None:
+            self.wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+
+class AdmissionGate:
+    """
+    Counting semaphore with a bounded FIFO wait queue.
+
+    Slots are handed to waiters in arrival order when released, so a burst
+    is served first-come first-served rather than by whoever polls first.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue=50, queue_timeout=30):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._active = 0
+        self._stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+    def enter(self, ticket):
+        """
+        Take a slot or join the queue.
+
+        Returns:
+            int: 0 if admitted immediately, otherwise the queue position,
+                 or None if the queue is full
+        """
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queue:
+                self._admit(ticket)
+                return 0
+            if len(self._queue) >= self.max_queue:
+                self._stats["rejected"] += 1
+                return None
+            self._queue.append(ticket)
+            self._stats["queued"] += 1
+            return len(self._queue)
+
+    def position(self, ticket):
+        """Current 1-based queue position, or 0 once admitted"""
+        with self._lock:
+            if ticket.admitted:
+                return 0
+            try:
+                return self._queue.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def leave(self, ticket, timed_out=False):
+        """Give up a queued ticket, or release the slot of an admitted one"""
+        with self._lock:
+            if ticket.admitted:
+                self._active -= 1
+            else:
+                try:
+                    self._queue.remove(ticket)
+                except ValueError:
+                    pass
+                if timed_out:
+                    self._stats["timeouts"] += 1
+            self._admit_waiting()
+
+    def _admit(self, ticket):
+        wait = time.monotonic() - ticket.enqueued_at
+        self._active += 1
+        self._stats["admitted"] += 1
+        self._stats["total_wait"] += wait
+        self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+        ticket.admitted = True
+
+    def _admit_waiting(self):
+        while self._queue and self._active < self.max_concurrent:
+            ticket = self._queue.popleft()
+            self._admit(ticket)
+            ticket.notify()
+
+    def stats(self):
+        """Return slot usage, queue depth and wait time counters"""
+        with self._lock:
+            admitted = self._stats["admitted"]
+            return dict(
+                self._stats,
+                active=self._active,
+                max_concurrent=self.max_concurrent,
+                queue_depth=len(self._queue),
+                max_queue=self.max_queue,
+                avg_wait=self._stats["total_wait"] / admitted if admitted else 0.0,
+            )
+
+
+class Admission:
+    """
+    One request's passage through one or more gates.
+
+    Gates are entered in a fixed order (model before gateway), so requests
+    holding one slot while queueing for the next cannot deadlock. Providers
+    take the model gate once per request and the gateway gate once per
+    upstream attempt, keeping the same order.
+    """
+
+    def __init__(self, gates):
+        self.gates = gates
+        self.tickets = []
+        self.admitted = False
+
+    def _rejected(self, gate):
+        log.warning("Admission queue full for %s", gate.name)
+        return error_event("Server is busy. Please try again shortly.", "QUEUE_FULL")
+
+    def _timed_out(self, gate):
+        log.warning("Timed out waiting for a slot on %s", gate.name)
+        return error_event("Timed out waiting in the request queue.", "QUEUE_TIMEOUT")
+
+    def acquire(self):
+        """
+        Wait for a slot on every gate.
+
+        Yields:
+            str: queued events while waiting, or an error event if the
+                 request is rejected (admitted stays False)
+        """
+        for gate in self.gates:
+            ticket = _Ticket()
+            position = gate.enter(ticket)
+            if position is None:
+                yield self._rejected(gate)
+                return
+            self.tickets.append((gate, ticket))
+
+            deadline = ticket.enqueued_at + gate.queue_timeout
+            while not ticket.admitted:
+                yield queued_event(position)
+
+                # Sleep until admitted, moved up the queue, or out of time
+                new_position = position
+                while new_position == position and not ticket.admitted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    ticket.wakeup.wait(min(remaining, POSITION_POLL_INTERVAL))
+                    new_position = gate.position(ticket)
+
+                if not ticket.admitted and time.monotonic() >= deadline:
+                    self.tickets.pop()
+                    gate.leave(ticket, timed_out=True)
+                    yield self._timed_out(gate)
+                    return
+                position = new_position
+
+        self.admitted = True
+
+    async def aacquire(self):
+        """Async counterpart of acquire()"""
+        loop = asyncio.get_running_loop()
+        for gate in self.gates:
+            ticket = _Ticket(loop)
+            position = gate.enter(ticket)
+            if position is None:
+                yield self._rejected(gate)
+                return
+            self.tickets.append((gate, ticket))
+
+            deadline = ticket.enqueued_at + gate.queue_timeout
+            while not ticket.admitted:
+                yield queued_event(position)
+
+                new_position = position
+                while new_position == position and not ticket.admitted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(
+                            ticket.wakeup.wait(), min(remaining, POSITION_POLL_INTERVAL)
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    new_position = gate.position(ticket)
+
+                if not ticket.admitted and time.monotonic() >= deadline:
+                    self.tickets.pop()
+                    gate.leave(ticket, timed_out=True)
+                    yield self._timed_out(gate)
+                    return
+                position = new_position
+
+        self.admitted = True
+
+    def release(self):
+        """Release held slots and leave any queue still joined"""
+        while self.tickets:
+            gate, ticket = self.tickets.pop()
+            gate.leave(ticket)
+
+
+class AdmissionController:
+    """
+    Creates one gate per limited model or gateway host.
+
+    Keys without a configured limit (and with a default of 0) are not
+    gated at all, so an unconfigured deployment behaves as before. Models
+    that are neither known nor listed in `models` share the "other" gate.
+    """
+
+    def __init__(self, max_concurrent_per_model=0, max_concurrent_per_gateway=0,
+                 max_queue=50, queue_timeout=30, models=None, gateways=None,
+                 is_known=None):
+        # Whether a model name is in the model config (ModelRegistry.is_known);
+        # without it every model name gets its own gate
+        self.is_known = is_known
+        self.max_concurrent_per_model = max_concurrent_per_model
+        self.max_concurrent_per_gateway = max_concurrent_per_gateway
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.model_limits = models or {}
+        self.gateway_limits = gateways or {}
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, is_known=None):
+        """Build a controller from the "admission" section of the model config"""
+        settings = dict(DEFAULT_ADMISSION_CONFIG)
+        settings.update(config or {})
+        return cls(
+            max_concurrent_per_model=int(settings["max_concurrent_per_model"]),
+            max_concurrent_per_gateway=int(settings["max_concurrent_per_gateway"]),
+            max_queue=int(settings["max_queue"]),
+            queue_timeout=float(settings["queue_timeout"]),
+            models=settings["models"],
+            gateways=settings["gateways"],
+            is_known=is_known,
+        )
+
+    def _gate(self, kind, name):
+        if (kind == "model" and self.is_known is not None
+                and name not in self.model_limits and not self.is_known(name)):
+            name = OTHER_MODELS
+        key = f"{kind}:{name}"
+        gate = self._gates.get(key)
+        if gate is not None:
+            return gate
+
+        if kind == "model":
+            limit = self.model_limits.get(name, self.max_concurrent_per_model)
+        else:
+            limit = self.gateway_limits.get(name, self.max_concurrent_per_gateway)
+        if not limit:
+            return None
+
+        with self._lock:
+            gate = self._gates.get(key)
+            if gate is None:
+                gate = AdmissionGate(key, int(limit), self.max_queue, self.queue_timeout)
+                self._gates[key] = gate
+            return gate
+
+    def admission(self, model=None, gateway=None):
+        """
+        Prepare the gates a request has to pass.
+
+        Args:
+            model (str): Requested model, if its limit applies
+            gateway (str): Gateway host (scheme://netloc), if its limit applies
+
+        Returns:
+            Admission: Pending admission, or None when nothing is limited
+        """
+        gates = []
+        if model:
+            gates.append(self._gate("model", model))
+        if gateway:
+            gates.append(self._gate("gateway", gateway))
+        gates = [gate for gate in gates if gate is not None]
+        return Admission(gates) if gates else None
+
+    def stats(self):
+        """Return per-gate statistics keyed by gate name"""
+        with self._lock:
+            gates = dict(self._gates)
+        return {key: gate.stats() for key, gate in gates.items()}
@@ -2,20 +2,278 @@
 Abstract Base Provider for LLM Interactions
 """
 
+import asyncio
 from abc import ABC, abstractmethod
 
+from . import tracing
+from .cancellation import CloseScope, cancellation_stats, cancelled
+from .metrics import StreamObserver, record_budget
+from .sse import CONTENT_EVENT_OVERHEAD, CONTENT_EVENT_PREFIX
+from .token_estimator import OutputBudget
+
+
+def _content_chars(chunk):
+    """Approximate the text length carried by one SSE chunk"""
+    if chunk.startswith(CONTENT_EVENT_PREFIX):
+        return len(chunk) - CONTENT_EVENT_OVERHEAD
+    return 0
+
 
 class BaseLLMProvider(ABC):
     """
     Abstract base class for LLM providers.
-    All providers must implement the stream_response method.
+    All providers must implement the _stream_response method.
     """
 
-    @abstractmethod
+    # Retry/failover/hedging policy; None streams every request directly
+    routing = None
+
+    # Per-model/per-gateway concurrency limits; None admits everything
+    admission = None
+
+    # Sizes max_tokens from the input; providers load it from their config
+    output_budget = OutputBudget()
+
+    def max_tokens_for(self, model, system_prompt, user_text):
+        """
+        Output token budget for one request, recorded in the metrics.
+
+        Returns:
+            int: max_tokens to send upstream
+        """
+        max_tokens, estimated_tokens = self.output_budget.plan(model, system_prompt, user_text)
+        record_budget(model, estimated_tokens, max_tokens)
+        return max_tokens
+
     def stream_response(self, model, system_prompt, user_text):
         """
         Stream a response from the LLM.
 
+        If the consumer stops early (e.g. the browser disconnected), the
+        provider stream is closed immediately so the upstream request is
+        aborted instead of running to completion.
+
+        When the model or gateway is at its concurrency limit, "queued"
+        events with the queue position are sent until a slot frees up.
+        Time to first token, duration and throughput are recorded in the
+        metrics registry for every provider alike, and sampled requests log
+        a span with the admitted/connect/first_byte/last_byte phases.
+
+        Args:
+            model (str): Model identifier
+            system_prompt (str): System instruction/prompt
+            user_text (str): User input text
+
+        Yields:
+            str: Server-Sent Events formatted data strings
+        """
+        observer = StreamObserver(model)
+        stream_span = tracing.start_stream_span(model=model, provider=type(self).__name__)
+        admission = self._admission_for(model)
+        stream = None
+        streamed_chars = 0
+        finished = False
+        try:
+            if admission is not None:
+                for queued in admission.acquire():
+                    observer.observe(queued, 0)
+                    yield queued
+                if not admission.admitted:
+                    finished = True
+                    return
+                stream_span.mark("admitted")
+
+            stream = self._routed_stream(model, system_prompt, user_text)
+            for chunk in stream:
+                if not observer.chunks:
+                    stream_span.mark("first_byte")
+                chars = _content_chars(chunk)
+                streamed_chars += chars
+                observer.observe(chunk, chars)
+                yield chunk
+            # A stream whose consumer aborted the upstream ends early, quietly
+            finished = not cancelled()
+        finally:
+            if not finished and stream is not None:
+                stream.close()
+                cancellation_stats.record_cancelled(user_text, streamed_chars)
+            if admission is not None:
+                admission.release()
+            observer.finish(finished)
+            stream_span.mark("last_byte")
+            tracing.end_stream_span(
+                stream_span,
+                outcome="completed" if finished else "cancelled",
+                chunks=observer.chunks,
+                chars=observer.chars,
+                error_code=observer.error_code,
+            )
+
+    async def astream_response(self, model, system_prompt, user_text):
+        """
+        Stream a response from the LLM as an async generator.
+
+        Like stream_response(), the provider stream is closed as soon as
+        the consumer goes away.
+
+        Yields:
+            str: Server-Sent Events formatted data strings
+        """
+        observer = StreamObserver(model)
+        stream_span = tracing.start_stream_span(model=model, provider=type(self).__name__)
+        admission = self._admission_for(model)
+        stream = None
+        streamed_chars = 0
+        finished = False
+        try:
+            if admission is not None:
+                async for queued in admission.aacquire():
+                    observer.observe(queued, 0)
+                    yield queued
+                if not admission.admitted:
+                    finished = True
+                    return
+                stream_span.mark("admitted")
+
+            stream = self._routed_astream(model, system_prompt, user_text)
+            async for chunk in stream:
+                if not observer.chunks:
+                    stream_span.mark("first_byte")
+                chars = _content_chars(chunk)
+                streamed_chars += chars
+                observer.observe(chunk, chars)
+                yield chunk
+            finished = True
+        finally:
+            if not finished and stream is not None:
+                await stream.aclose()
+                cancellation_stats.record_cancelled(user_text, streamed_chars)
+            if admission is not None:
+                admission.release()
+            observer.finish(finished)
+            stream_span.mark("last_byte")
+            tracing.end_stream_span(
+                stream_span,
+                outcome="completed" if finished else "cancelled",
+                chunks=observer.chunks,
+                chars=observer.chars,
+                error_code=observer.error_code,
+            )
+
+    def _admission_for(self, model):
+        """Return the pending model admission for a request, or None if unlimited"""
+        if self.admission is None:
+            return None
+        return self.admission.admission(model)
+
+    def _admission_gateway(self, target):
+        """Gateway host a routing target is served through, for per-gateway limits"""
+        return None
+
+    def _gateway_admission_for(self, target):
+        """Return the pending gateway admission for one attempt, or None if unlimited"""
+        if self.admission is None:
+            return None
+        gateway = self._admission_gateway(target)
+        return self.admission.admission(gateway=gateway) if gateway else None
+
+    def _gated_stream(self, target, open_stream):
+        """
+        Open one upstream attempt, first taking a slot on its gateway.
+
+        The gateway limit is applied per attempt rather than per request, so
+        retries and failovers count against the gateway they actually call.
+        """
+        admission = self._gateway_admission_for(target)
+        if admission is None:
+            return open_stream(target)
+
+        def generate():
+            try:
+                for queued in admission.acquire():
+                    yield queued
+                if admission.admitted:
+                    yield from open_stream(target)
+            finally:
+                admission.release()
+
+        return generate()
+
+    def _agated_stream(self, target, open_stream):
+        """Async counterpart of _gated_stream()"""
+        admission = self._gateway_admission_for(target)
+        if admission is None:
+            return open_stream(target)
+
+        async def generate():
+            stream = None
+            try:
+                async for queued in admission.aacquire():
+                    yield queued
+                if admission.admitted:
+                    stream = open_stream(target)
+                    async for chunk in stream:
+                        yield chunk
+            finally:
+                if stream is not None:
+                    await stream.aclose()
+                admission.release()
+
+        return generate()
+
+    def _routed_stream(self, model, system_prompt, user_text):
+        """Open the provider stream through the routing policy, if any"""
+        if self.routing is None:
+            return self._gated_stream(
+                model, lambda target: self._stream_response(target, system_prompt, user_text)
+            )
+
+        return self.routing.stream(
+            self._route_targets(model),
+            lambda target: self._gated_stream(
+                target, lambda target: self._stream_target(target, system_prompt, user_text)
+            ),
+        )
+
+    def _routed_astream(self, model, system_prompt, user_text):
+        """Async counterpart of _routed_stream()"""
+        if self.routing is None:
+            return self._agated_stream(
+                model, lambda target: self._astream_response(target, system_prompt, user_text)
+            )
+
+        return self.routing.astream(
+            self._route_targets(model),
+            lambda target: self._agated_stream(
+                target, lambda target: self._astream_target(target, system_prompt, user_text)
+            ),
+        )
+
+    def _route_targets(self, model):
+        """
+        List the upstream targets a request may be served by, in order.
+
+        Returns:
+            list: The requested model followed by its fallback models
+        """
+        return [model] + self.routing.fallbacks_for(model)
+
+    def _stream_target(self, target, system_prompt, user_text):
+        """Stream from one routing target (a model name by default)"""
+        return self._stream_response(target, system_prompt, user_text)
+
+    def _astream_target(self, target, system_prompt, user_text):
+        """Async counterpart of _stream_target()"""
+        return self._astream_response(target, system_prompt, user_text)
+
+    @abstractmethod
+    def _stream_response(self, model, system_prompt, user_text):
+        """
+        Provider-specific streaming implementation.
+
+        Implementations must release their upstream connection or SDK
+        stream when closed (GeneratorExit) before completion.
+
         Args:
             model (str): Model identifier
             system_prompt (str): System instruction/prompt
@@ -26,6 +284,41 @@ class BaseLLMProvider(ABC):
         """
         pass
 
+    async def _astream_response(self, model, system_prompt, user_text):
+        """
+        Provider-specific async streaming implementation.
+
+        The default implementation drives _stream_response() from a worker
+        thread; providers with native async clients override it so no
+        thread is held while waiting on the network.
+
+        Yields:
+            str: Server-Sent Events formatted data strings
+        """
+        async for chunk in self._astream_in_thread(
+            self._stream_response(model, system_prompt, user_text)
+        ):
+            yield chunk
+
+    async def _astream_in_thread(self, stream):
+        """Drive a synchronous SSE generator from a worker thread"""
+        done = object()
+        scope = CloseScope()
+        try:
+            while True:
+                chunk = await asyncio.to_thread(scope.run, next, stream, done)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            # Abort the upstream now if the worker thread is blocked reading it
+            scope.close()
+            try:
+                stream.close()
+            except ValueError:
+                # Still running in the worker thread, which the abort wakes
+                pass
+
     @abstractmethod
     def get_available_models(self):
         """
@@ -45,3 +338,17 @@ class BaseLLMProvider(ABC):
             ValueError: If configuration is invalid
         """
         pass
+
+    def get_stats(self):
+        """
+        Get runtime statistics for this provider (connection pools, etc.).
+
+        Returns:
+            dict: Provider-specific statistics
+        """
+        stats = {}
+        if self.routing is not None:
+            stats["routing"] = self.routing.stats()
+        if self.admission is not None:
+            stats["admission"] = self.admission.stats()
+        return stats
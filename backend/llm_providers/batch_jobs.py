@@ -0,0 +1,148 @@
+"""
+Upstream batch job store
+Jobs submitted to the OpenAI and Anthropic batch APIs are recorded on local
+disk, one JSON file per job, so results can still be collected after a
+restart. Each job maps upstream custom_ids back to batch item ids.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+
+BATCH_JOB_DIR = os.getenv("BATCH_JOB_DIR", "batch_jobs")
+
+# Upstream job states, normalized across providers
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+FAILED = "failed"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+
+TERMINAL_STATUSES = {COMPLETED, FAILED, EXPIRED, CANCELLED}
+
+# Each OpenAI batch file is limited to 50,000 requests; Anthropic to 100,000
+MAX_REQUESTS_PER_JOB = 50000
+
+
+def new_job(provider, model, requests):
+    """
+    Create a job record for a batch about to be submitted.
+
+    Args:
+        provider (str): "openai" or "anthropic"
+        model (str): Model every request in the job uses
+        requests (list): (key, system_prompt, user_text) tuples; key is
+            any JSON value identifying the request to the caller
+
+    Returns:
+        dict: The job, with a custom_id assigned to every request
+    """
+    return {
+        "id": uuid.uuid4().hex[:12],
+        "provider": provider,
+        "model": model,
+        "upstream_id": None,
+        "status": IN_PROGRESS,
+        "created": time.time(),
+        "updated": time.time(),
+        # custom_id -> caller key; upstream custom_ids only allow [A-Za-z0-9_-]
+        "requests": {f"req-{i}": key for i, (key, _, _) in enumerate(requests)},
+        "request_counts": {},
+        "results": None,
+        "error": None,
+    }
+
+
+class BatchJobStore:
+    """Directory of job records, written atomically"""
+
+    def __init__(self, directory=BATCH_JOB_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, job):
+        """Write a job record, replacing any previous version"""
+        job["updated"] = time.time()
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(job, f)
+                os.replace(tmp_path, self._path(job["id"]))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def load(self, job_id):
+        """Return a job record, or None if there is no such job"""
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_jobs(self):
+        """Return every stored job, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                job = self.load(name[:-5])
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job["created"])
+
+
+def parse_openai_results(text):
+    """
+    Map the lines of an OpenAI batch output or error file to results.
+
+    Returns:
+        dict: custom_id -> {"text": str} or {"error": str, "error_code": str}
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        response = entry.get("response") or {}
+        body = response.get("body") or {}
+        if entry.get("error") or response.get("status_code") != 200:
+            error = entry.get("error") or body.get("error") or {}
+            results[entry["custom_id"]] = {
+                "error": error.get("message", "Batch request failed"),
+                "error_code": "API_ERROR",
+            }
+            continue
+        results[entry["custom_id"]] = {
+            "text": body["choices"][0]["message"]["content"] or ""
+        }
+    return results
+
+
+def parse_anthropic_result(entry):
+    """
+    Map one Anthropic batch result entry to a result.
+
+    Returns:
+        dict: {"text": str} or {"error": str, "error_code": str}
+    """
+    result = entry.result
+    if result.type == "succeeded":
+        return {
+            "text": "".join(
+                block.text for block in result.message.content if block.type == "text"
+            )
+        }
+    if result.type == "errored":
+        return {"error": f"Anthropic API error: {result.error}", "error_code": "API_ERROR"}
+    return {"error": f"Batch request {result.type}", "error_code": result.type.upper()}
@@ -0,0 +1,168 @@
+"""
+Cancellation of abandoned streams
+Close scopes let the consumer of a stream abort the upstream connections
+it opened, from the consumer's own thread, and CancellationStats counts
+abandoned streams and estimates the output tokens saved by closing them.
+"""
+
+import contextvars
+import socket
+import threading
+
+from .token_estimator import estimate_tokens
+
+
+_scope_var = contextvars.ContextVar("close_scope", default=None)
+
+
+def _noop():
+    pass
+
+
+class CloseScope:
+    """
+    Upstream connections opened on behalf of one stream consumer.
+
+    Streams are often read in worker threads (parallel styles, long-input
+    parts, previews, async-to-thread bridges), where a stop flag is only
+    seen once the next chunk arrives; a model that is still thinking would
+    keep its connection and gateway slot until then. Providers register a
+    hook that aborts their upstream response with on_close(), and the
+    consumer calls close() when it stops, which runs the hooks at once.
+
+    Scopes nest: a scope created while another is current is closed with it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.closed = False
+        parent = _scope_var.get()
+        if parent is not None:
+            parent.add(self.close)
+
+    def add(self, hook):
+        """
+        Run hook when the scope is closed (at once if it already is).
+
+        Returns:
+            callable: Unregisters the hook
+        """
+        with self._lock:
+            if not self.closed:
+                self._hooks.append(hook)
+                return lambda: self._remove(hook)
+        hook()
+        return _noop
+
+    def _remove(self, hook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def close(self):
+        """Run every registered hook; safe to call from any thread, and twice"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            hooks, self._hooks = self._hooks, []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:
+                # Best effort: the reader still stops at its next chunk
+                pass
+
+    def enter(self):
+        """Make this the current scope of the running context"""
+        _scope_var.set(self)
+
+    def run(self, fn, *args):
+        """Call fn inside this scope; use in a copied context (worker thread)"""
+        self.enter()
+        return fn(*args)
+
+
+def on_close(hook):
+    """
+    Run hook if the consumer of the current stream stops before it ends.
+
+    Returns:
+        callable: Unregisters the hook; call it once the upstream is done
+    """
+    scope = _scope_var.get()
+    if scope is None:
+        return _noop
+    return scope.add(hook)
+
+
+def cancelled():
+    """Whether the consumer of the current stream has stopped"""
+    scope = _scope_var.get()
+    return scope is not None and scope.closed
+
+
+def abort_response(response):
+    """
+    Abort a streaming HTTP response that another thread may be reading.
+
+    Closing a response does not wake a thread blocked on its socket, but
+    shutting the socket down does. Handles requests responses and the
+    httpx responses behind the OpenAI and Anthropic SDK streams.
+    """
+    sock = None
+    connection = getattr(getattr(response, "raw", None), "connection", None)
+    if connection is not None:
+        sock = getattr(connection, "sock", None)
+    else:
+        network_stream = (getattr(response, "extensions", None) or {}).get("network_stream")
+        if network_stream is not None:
+            sock = network_stream.get_extra_info("socket")
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class CancellationStats:
+    """
+    Thread-safe counters for cancelled and skipped generations.
+
+    A rephrase is expected to produce roughly as much output as its input,
+    so the saving for a cancelled stream is the share of the expected
+    output not yet streamed, and a skipped style saves the whole amount.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "cancelled_streams": 0,
+            "skipped_generations": 0,
+            "streamed_chars_before_cancel": 0,
+            "estimated_tokens_saved": 0,
+        }
+
+    def record_cancelled(self, user_text, streamed_chars):
+        """Record a stream closed before the upstream finished"""
+        remaining = max(len(user_text) - streamed_chars, 0) / max(len(user_text), 1)
+        saved = round(estimate_tokens(user_text) * remaining)
+        with self._lock:
+            self._stats["cancelled_streams"] += 1
+            self._stats["streamed_chars_before_cancel"] += streamed_chars
+            self._stats["estimated_tokens_saved"] += saved
+
+    def record_skipped(self, user_text):
+        """Record a generation that was never started"""
+        with self._lock:
+            self._stats["skipped_generations"] += 1
+            self._stats["estimated_tokens_saved"] += estimate_tokens(user_text)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+cancellation_stats = CancellationStats()
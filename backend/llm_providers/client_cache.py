@@ -0,0 +1,197 @@
+"""
+SDK client cache
+Keeps configured SDK clients and model objects (OpenAI/Anthropic clients
+per API key and base URL, Gemini models per generation config) so requests
+reuse them instead of rebuilding them. Cleared when API keys rotate,
+either through Settings or when another worker rewrote the watched .env.
+"""
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from dotenv import dotenv_values
+
+from .model_registry import CHECK_INTERVAL, WatchedFile
+
+
+DEFAULT_CLIENT_CACHE_CONFIG = {
+    "max_entries": int(os.getenv("CLIENT_CACHE_MAX_ENTRIES", "32")),
+}
+
+# Every cache, for rotate_keys()
+_caches = weakref.WeakSet()
+_caches_lock = threading.Lock()
+
+# Bumped by rotate_keys(); providers re-read their keys when it changes
+_key_generation = 0
+
+# .env file whose API keys are applied when it changes, and the version
+# of it already applied to os.environ
+_key_file = None
+_key_file_version = 0
+_key_file_lock = threading.Lock()
+
+
+class ClientCache:
+    """
+    Thread-safe LRU cache of objects built by a factory.
+
+    Keys should include everything the object was configured with (API
+    key, base URL, generation parameters), so a changed setting simply
+    misses and builds a new object.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "clears": 0}
+        with _caches_lock:
+            _caches.add(self)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a cache from a "client_cache" config section (may be None)"""
+        options = dict(DEFAULT_CLIENT_CACHE_CONFIG, **(config or {}))
+        return cls(max_entries=int(options["max_entries"]))
+
+    def get(self, key, factory):
+        """
+        Return the object cached under key, building it on a miss.
+
+        Args:
+            key (tuple): Hashable description of the object's configuration
+            factory (callable): Builds the object. It runs without the lock
+                (SDK imports and client setup can be slow), so lookups of
+                other keys are not held up; if concurrent misses on one key
+                both build it, the first one stored is kept
+
+        Returns:
+            The cached or newly built object
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry
+            self._stats["misses"] += 1
+
+        built = factory()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            self._entries[key] = built
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            return built
+
+    def clear(self):
+        """Drop every cached object"""
+        with self._lock:
+            self._entries.clear()
+            self._stats["clears"] += 1
+
+    def stats(self):
+        """Return hit/miss/eviction counts and current size"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                **self._stats,
+            }
+
+
+class KeySnapshot:
+    """API keys of one version of the .env file"""
+
+    def __init__(self, version, keys, mtime):
+        self.version = version
+        self.keys = keys
+        self.mtime = mtime
+
+
+class KeyFile(WatchedFile):
+    """.env, re-read for its *_API_KEY values whenever it changes on disk"""
+
+    kind = "API keys"
+
+    def _empty(self):
+        return KeySnapshot(0, {}, None)
+
+    def _parse(self, f, version, stamp):
+        keys = {
+            key: value for key, value in dotenv_values(stream=f).items()
+            if key.endswith("_API_KEY") and value
+        }
+        return KeySnapshot(version, keys, stamp)
+
+
+def watch_key_file(path, check_interval=CHECK_INTERVAL):
+    """
+    Apply API keys saved to a .env file in this process, e.g. by Settings
+    in another worker.
+
+    The version read now is taken as already applied (by load_dotenv), so
+    keys set in the real environment keep precedence until the file changes.
+    """
+    global _key_file, _key_file_version
+    key_file = KeyFile(path, check_interval)
+    with _key_file_lock:
+        _key_file = key_file
+        _key_file_version = key_file.snapshot().version
+
+
+def refresh_keys():
+    """
+    Apply API keys that changed in the watched .env file since last time.
+
+    Costs at most one os.stat() per CHECK_INTERVAL; rotates keys if any
+    key in the file differs from the environment.
+    """
+    global _key_file_version
+    key_file = _key_file
+    if key_file is None:
+        return
+    snapshot = key_file.snapshot()
+    if snapshot.version == _key_file_version:
+        return
+
+    with _key_file_lock:
+        # Another thread may already have applied this or a newer version
+        if snapshot.version <= _key_file_version:
+            return
+        _key_file_version = snapshot.version
+        changed = [key for key, value in snapshot.keys.items() if os.environ.get(key) != value]
+        for key in changed:
+            os.environ[key] = snapshot.keys[key]
+    if changed:
+        rotate_keys()
+
+
+def key_generation():
+    """Counter that changes every time API keys are rotated"""
+    refresh_keys()
+    return _key_generation
+
+
+def rotate_keys():
+    """
+    Drop every cached client after API keys changed (e.g. saved in Settings).
+
+    Providers notice the new key generation and re-read their keys from
+    the environment before building the next client.
+    """
+    global _key_generation
+    with _caches_lock:
+        _key_generation += 1
+        caches = list(_caches)
+
+    for cache in caches:
+        cache.clear()
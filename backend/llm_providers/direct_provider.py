@@ -2,33 +2,104 @@
 Direct LLM Provider - Direct API access to OpenAI, Anthropic, and Google
 """
 
+import importlib.util
 import json
 import os
+import time
 from .base import BaseLLMProvider
-
-# Conditional imports - only import if libraries are available
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+from .batch_jobs import (
+    CANCELLED, COMPLETED, EXPIRED, FAILED, TERMINAL_STATUSES,
+    BatchJobStore, new_job, parse_anthropic_result, parse_openai_results,
+)
+from .sse import DONE_EVENT, content_event, error_event, event
+from .model_registry import get_registry
+from .metrics import record_usage
+from .prompt_cache import anthropic_system, anthropic_usage, openai_messages, openai_usage
+from .routing import RoutingPolicy
+from .admission import AdmissionController
+from .cancellation import abort_response, cancelled, on_close
+from .client_cache import ClientCache, key_generation
+from .token_estimator import OutputBudget, is_reasoning_model
+from . import tracing
+
+log = tracing.get_logger(__name__)
+
+
+
+def _sdk_available(module_name):
+    """Whether an SDK is installed, checked without importing it"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except ModuleNotFoundError:
+        # Parent package (e.g. "google") is missing
+        return False
+
+
+# SDKs are only imported when a backend is first used: each one takes
+# hundreds of milliseconds to import, and most deployments use one
+OPENAI_AVAILABLE = _sdk_available('openai')
+if not OPENAI_AVAILABLE:
     print("[WARN] OpenAI SDK not installed. OpenAI models will not be available.")
 
-try:
-    from anthropic import Anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+ANTHROPIC_AVAILABLE = _sdk_available('anthropic')
+if not ANTHROPIC_AVAILABLE:
     print("[WARN] Anthropic SDK not installed. Anthropic models will not be available.")
 
-try:
-    import google.generativeai as genai
-    GOOGLE_AVAILABLE = True
-except ImportError:
-    GOOGLE_AVAILABLE = False
+GOOGLE_AVAILABLE = _sdk_available('google.generativeai')
+if not GOOGLE_AVAILABLE:
     print("[WARN] Google Generative AI SDK not installed. Gemini models will not be available.")
 
 
+# SDK exception classes (OpenAI, Anthropic, google.api_core) by the error
+# code the routing policy retries on; matched by name so no SDK is imported
+SDK_TIMEOUT_ERRORS = {"APITimeoutError", "DeadlineExceeded"}
+SDK_CONNECTION_ERRORS = {"APIConnectionError"}
+SDK_RATE_LIMIT_ERRORS = {"RateLimitError", "ResourceExhausted", "TooManyRequests"}
+SDK_SERVER_ERRORS = {"InternalServerError", "OverloadedError", "ServiceUnavailable", "BadGateway"}
+
+
+def sdk_error_code(error):
+    """
+    Map an SDK exception to the error code used in SSE error events.
+
+    Uses the same codes as the gateway provider, so retries and fallback
+    models apply in direct mode too.
+
+    Args:
+        error (Exception): Exception raised by an OpenAI, Anthropic or Gemini call
+
+    Returns:
+        str: TIMEOUT, CONNECTION_ERROR, RATE_LIMIT, SERVICE_UNAVAILABLE or API_ERROR
+    """
+    name = type(error).__name__
+    # OpenAI/Anthropic errors carry status_code, google.api_core errors code
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    status = status if isinstance(status, int) else None
+
+    if name in SDK_TIMEOUT_ERRORS or isinstance(error, TimeoutError) or status in (408, 504):
+        return "TIMEOUT"
+    if name in SDK_RATE_LIMIT_ERRORS or status == 429:
+        return "RATE_LIMIT"
+    if name in SDK_SERVER_ERRORS or (status is not None and status >= 500):
+        return "SERVICE_UNAVAILABLE"
+    if name in SDK_CONNECTION_ERRORS or isinstance(error, ConnectionError):
+        return "CONNECTION_ERROR"
+    return "API_ERROR"
+
+
+def openai_completion_params(model, max_tokens):
+    """
+    Output length and sampling parameters for an OpenAI chat completion.
+
+    O-series and GPT-5 models reject max_tokens and any temperature other
+    than the default; their max_completion_tokens budget includes the
+    reasoning tokens.
+    """
+    if is_reasoning_model(model):
+        return {"max_completion_tokens": max_tokens}
+    return {"max_tokens": max_tokens, "temperature": 0.7}
+
+
 class DirectProvider(BaseLLMProvider):
     """
     Direct API provider for OpenAI, Anthropic, and Google models.
@@ -36,16 +107,30 @@ class DirectProvider(BaseLLMProvider):
     """
 
     def __init__(self):
-        """Initialize API clients based on available API keys"""
-        self.openai_client = None
-        self.anthropic_client = None
-        self.gemini_configured = False
+        """Find the configured backends; their clients are created on first use"""
+        # Parsed once, reloaded only when config.json changes
+        self.model_registry = get_registry('config.json')
+        self.routing = RoutingPolicy.from_config(self.model_registry.config.get('routing'))
+        self.admission = AdmissionController.from_config(
+            self.model_registry.config.get('admission'), is_known=self.model_registry.is_known
+        )
+        self.clients = ClientCache.from_config(self.model_registry.config.get('client_cache'))
+        self.output_budget = OutputBudget.from_config(self.model_registry.config.get('output_budget'))
+        self.batch_jobs = BatchJobStore()
+
+        self._load_api_keys()
+        if 'openai' in self._api_keys:
+            print("[INFO] OpenAI client enabled")
+        if 'anthropic' in self._api_keys:
+            print("[INFO] Anthropic client enabled")
+        if 'google' in self._api_keys:
+            print("[INFO] Google Gemini enabled")
 
-        # Load API keys
-        openai_api_key = os.getenv('OPENAI_API_KEY', '')
-        anthropic_api_key = os.getenv('ANTHROPIC_API_KEY', '')
-        google_api_key = os.getenv('GOOGLE_API_KEY', '')
+        # Validate configuration
+        self.validate_configuration()
 
+    def _load_api_keys(self):
+        """Read the API keys of backends that have both a key and an SDK"""
         # Helper function to check if API key is valid (not empty or placeholder)
         def is_valid_key(key):
             if not key:
@@ -54,66 +139,154 @@ class DirectProvider(BaseLLMProvider):
             placeholders = ['your-', 'placeholder', 'example', 'xxx', 'yyy', 'zzz']
             return not any(placeholder in key.lower() for placeholder in placeholders)
 
-        # Initialize clients
-        if OPENAI_AVAILABLE and is_valid_key(openai_api_key):
-            self.openai_client = OpenAI(api_key=openai_api_key)
-            print("[INFO] OpenAI client initialized")
+        # Backend -> API key
+        api_keys = {}
+        for backend, available, env_var in (
+            ('openai', OPENAI_AVAILABLE, 'OPENAI_API_KEY'),
+            ('anthropic', ANTHROPIC_AVAILABLE, 'ANTHROPIC_API_KEY'),
+            ('google', GOOGLE_AVAILABLE, 'GOOGLE_API_KEY'),
+        ):
+            api_key = os.getenv(env_var, '')
+            if available and is_valid_key(api_key):
+                api_keys[backend] = api_key
+
+        self._keys_generation = key_generation()
+        self._api_keys = api_keys
+
+    def _current_api_keys(self):
+        """Backend -> API key, re-read after keys were rotated"""
+        if self._keys_generation != key_generation():
+            self._load_api_keys()
+        return self._api_keys
+
+    @staticmethod
+    def _create_client(name, api_key, base_url):
+        """
+        Import a backend's SDK and build one of its clients.
+
+        SDK-level retries are off: the routing policy retries and fails
+        over instead, so attempts are not multiplied.
+        """
+        if name == 'openai':
+            from openai import OpenAI
+            return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        if name == 'async_openai':
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        if name == 'anthropic':
+            from anthropic import Anthropic
+            return Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
+        if name == 'async_anthropic':
+            from anthropic import AsyncAnthropic
+            return AsyncAnthropic(api_key=api_key, base_url=base_url, max_retries=0)
+
+        # Gemini is configured module-wide
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai
+
+    def _client(self, name):
+        """
+        Return a cached client, creating it (and importing its SDK) on first use.
+
+        Clients are cached per API key and base URL, so a rotated key or a
+        changed OPENAI_BASE_URL / ANTHROPIC_BASE_URL gets a new client.
+
+        Args:
+            name (str): "openai", "async_openai", "anthropic",
+                "async_anthropic" or "google"
+
+        Returns:
+            The client, or None if its backend has no API key
+        """
+        backend = name.replace('async_', '')
+        api_key = self._current_api_keys().get(backend)
+        if api_key is None:
+            return None
+        base_url = os.getenv(f'{backend.upper()}_BASE_URL') if backend != 'google' else None
+
+        def create():
+            started = time.perf_counter()
+            client = self._create_client(name, api_key, base_url)
+            log.info("Created %s client", name, extra={
+                "ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+            return client
+
+        return self.clients.get((name, api_key, base_url), create)
+
+    def _gemini_model(self, model, temperature=0.7):
+        """
+        Return a cached Gemini model object for one generation config.
+
+        max_output_tokens varies per request, so it is passed to each
+        generate_content() call instead of being part of the cached model.
+        """
+        api_key = self._current_api_keys().get('google')
+        genai = self._client('google')
+        if genai is None:
+            return None
+        return self.clients.get(
+            ('gemini_model', api_key, model, temperature),
+            lambda: genai.GenerativeModel(
+                model_name=model,
+                generation_config={"temperature": temperature},
+            ),
+        )
 
-        if ANTHROPIC_AVAILABLE and is_valid_key(anthropic_api_key):
-            self.anthropic_client = Anthropic(api_key=anthropic_api_key)
-            print("[INFO] Anthropic client initialized")
+    @property
+    def openai_client(self):
+        return self._client('openai')
 
-        if GOOGLE_AVAILABLE and is_valid_key(google_api_key):
-            genai.configure(api_key=google_api_key)
-            self.gemini_configured = True
-            print("[INFO] Google Gemini configured")
+    @property
+    def async_openai_client(self):
+        return self._client('async_openai')
 
-        # Validate configuration
-        self.validate_configuration()
+    @property
+    def anthropic_client(self):
+        return self._client('anthropic')
+
+    @property
+    def async_anthropic_client(self):
+        return self._client('async_anthropic')
+
+    @property
+    def gemini_configured(self):
+        return 'google' in self._current_api_keys()
 
     def validate_configuration(self):
         """Validate that at least one API client is configured"""
-        if not any([self.openai_client, self.anthropic_client, self.gemini_configured]):
+        if not self._current_api_keys():
             raise ValueError(
                 "At least one API key must be set (OPENAI_API_KEY, ANTHROPIC_API_KEY, or GOOGLE_API_KEY)"
             )
 
+    def get_stats(self):
+        """Return routing, admission and client cache statistics"""
+        stats = super().get_stats()
+        stats["clients"] = self.clients.stats()
+        return stats
+
     def get_available_models(self):
         """Return available models based on configured clients"""
-        # Load from config.json
-        import json
-        try:
-            with open('config.json', 'r') as f:
-                config = json.load(f)
-                all_models = config.get('available_models', {})
-
-                # Filter models based on which API keys are configured
-                filtered_models = {}
+        all_models = self.model_registry.available_models()
 
-                if self.openai_client:
-                    filtered_models['openai'] = all_models.get('openai', [])
+        # Filter models based on which API keys are configured
+        filtered_models = {}
 
-                if self.anthropic_client:
-                    filtered_models['anthropic'] = all_models.get('anthropic', [])
+        api_keys = self._current_api_keys()
+        for backend in ('openai', 'anthropic', 'google'):
+            if backend in api_keys:
+                filtered_models[backend] = all_models.get(backend, [])
 
-                if self.gemini_configured:
-                    filtered_models['google'] = all_models.get('google', [])
-
-                return filtered_models
-        except:
-            return {}
+        return filtered_models
 
     def get_model_type(self, model_name):
         """Determine if model is Anthropic, OpenAI, or Google based"""
-        available_models = self.get_available_models()
-
         # Check in available models
-        if model_name in available_models.get('anthropic', []):
-            return 'anthropic'
-        elif model_name in available_models.get('openai', []):
-            return 'openai'
-        elif model_name in available_models.get('google', []):
-            return 'google'
+        model_type = self.model_registry.get_model_type(model_name)
+        if model_type in ('anthropic', 'openai', 'google'):
+            return model_type
 
         # Fallback to name-based detection
         if model_name.startswith('claude'):
@@ -123,10 +296,10 @@ class DirectProvider(BaseLLMProvider):
         else:
             return 'openai'
 
-    def stream_response(self, model, system_prompt, user_text):
+    def _stream_response(self, model, system_prompt, user_text):
         """Stream response from the appropriate API"""
         model_type = self.get_model_type(model)
-        print(f"[DEBUG] Using model: {model} (type: {model_type})")
+        log.debug("Using model", extra={"model": model, "model_type": model_type})
 
         if model_type == 'anthropic':
             yield from self._stream_anthropic(model, system_prompt, user_text)
@@ -135,90 +308,373 @@ class DirectProvider(BaseLLMProvider):
         else:
             yield from self._stream_openai(model, system_prompt, user_text)
 
+    async def _astream_response(self, model, system_prompt, user_text):
+        """Stream response from the appropriate API using the async SDK clients"""
+        model_type = self.get_model_type(model)
+        log.debug("Using model", extra={"model": model, "model_type": model_type})
+
+        if model_type == 'anthropic':
+            stream = self._astream_anthropic(model, system_prompt, user_text)
+        elif model_type == 'google':
+            stream = self._astream_gemini(model, system_prompt, user_text)
+        else:
+            stream = self._astream_openai(model, system_prompt, user_text)
+
+        async for chunk in stream:
+            yield chunk
+
     def _stream_openai(self, model, system_prompt, text):
         """Stream response from OpenAI API"""
         try:
             if not self.openai_client:
-                yield f"data: {json.dumps({'error': 'OpenAI API key not configured', 'error_code': 'CONFIG_ERROR'})}\n\n"
+                yield error_event('OpenAI API key not configured', 'CONFIG_ERROR')
                 return
 
             stream = self.openai_client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text}
-                ],
+                messages=openai_messages(system_prompt, text),
                 stream=True,
-                temperature=0.7,
-                max_tokens=4096
+                stream_options={"include_usage": True},
+                **openai_completion_params(model, self.max_tokens_for(model, system_prompt, text))
             )
-
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'content': content})}\n\n"
-
-            yield f"data: [DONE]\n\n"
+            tracing.mark("connect")
+
+            closing = on_close(lambda: abort_response(stream.response))
+            try:
+                for chunk in stream:
+                    # The final chunk has no choices, only the usage
+                    if chunk.usage:
+                        record_usage(model, openai_usage(chunk.usage.model_dump()))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        yield content_event(content)
+            finally:
+                closing()
+                # Abort the HTTP stream if the client went away mid-response
+                stream.close()
+
+            yield DONE_EVENT
 
         except Exception as e:
-            error_data = {'error': f'OpenAI API error: {str(e)}', 'error_code': 'API_ERROR'}
-            print(f"[ERROR] OpenAI API error: {e}")
-            yield f"data: {json.dumps(error_data)}\n\n"
+            if cancelled():
+                return
+            error_data = {'error': f'OpenAI API error: {str(e)}', 'error_code': sdk_error_code(e)}
+            log.error("OpenAI API error: %s", e, extra={"model": model})
+            yield event(error_data)
 
     def _stream_anthropic(self, model, system_prompt, text):
         """Stream response from Anthropic API"""
         try:
             if not self.anthropic_client:
-                yield f"data: {json.dumps({'error': 'Anthropic API key not configured', 'error_code': 'CONFIG_ERROR'})}\n\n"
+                yield error_event('Anthropic API key not configured', 'CONFIG_ERROR')
                 return
 
+            # Style prompt as a cacheable system block, user text on its own
             with self.anthropic_client.messages.stream(
                 model=model,
-                max_tokens=4096,
+                max_tokens=self.max_tokens_for(model, system_prompt, text),
                 temperature=0.7,
+                system=anthropic_system(system_prompt),
                 messages=[
-                    {"role": "user", "content": f"{system_prompt}\n\n{text}"}
+                    {"role": "user", "content": text}
                 ]
             ) as stream:
-                for text_chunk in stream.text_stream:
-                    yield f"data: {json.dumps({'content': text_chunk})}\n\n"
+                tracing.mark("connect")
+                closing = on_close(lambda: abort_response(stream.response))
+                try:
+                    for text_chunk in stream.text_stream:
+                        yield content_event(text_chunk)
+                finally:
+                    closing()
+                record_usage(model, anthropic_usage(stream.get_final_message().usage.model_dump()))
 
-            yield f"data: [DONE]\n\n"
+            yield DONE_EVENT
 
         except Exception as e:
-            error_data = {'error': f'Anthropic API error: {str(e)}', 'error_code': 'API_ERROR'}
-            print(f"[ERROR] Anthropic API error: {e}")
-            yield f"data: {json.dumps(error_data)}\n\n"
+            if cancelled():
+                return
+            error_data = {'error': f'Anthropic API error: {str(e)}', 'error_code': sdk_error_code(e)}
+            log.error("Anthropic API error: %s", e, extra={"model": model})
+            yield event(error_data)
 
     def _stream_gemini(self, model, system_prompt, text):
         """Stream response from Google Gemini API"""
         try:
             if not self.gemini_configured:
-                yield f"data: {json.dumps({'error': 'Google API key not configured', 'error_code': 'CONFIG_ERROR'})}\n\n"
+                yield error_event('Google API key not configured', 'CONFIG_ERROR')
                 return
 
-            # Initialize the model
-            gemini_model = genai.GenerativeModel(
-                model_name=model,
-                generation_config={
-                    "temperature": 0.7,
-                    "max_output_tokens": 4096,
-                }
-            )
+            # Configured model objects are reused across requests
+            gemini_model = self._gemini_model(model)
 
             # Combine system prompt and user text
             prompt = f"{system_prompt}\n\n{text}"
 
             # Generate streaming response
-            response = gemini_model.generate_content(prompt, stream=True)
+            response = gemini_model.generate_content(
+                prompt,
+                stream=True,
+                generation_config={
+                    "max_output_tokens": self.max_tokens_for(model, system_prompt, text),
+                },
+            )
+            tracing.mark("connect")
 
             for chunk in response:
                 if chunk.text:
-                    yield f"data: {json.dumps({'content': chunk.text})}\n\n"
+                    yield content_event(chunk.text)
+
+            yield DONE_EVENT
+
+        except Exception as e:
+            error_data = {'error': f'Gemini API error: {str(e)}', 'error_code': sdk_error_code(e)}
+            log.error("Gemini API error: %s", e, extra={"model": model})
+            yield event(error_data)
+
+    def submit_batch(self, model, requests):
+        """
+        Submit prompts to the upstream batch API as one job.
+
+        Batch jobs finish within 24 hours at a lower price than streamed
+        requests, for offline jobs where nobody waits on the output.
+
+        Args:
+            model (str): OpenAI or Anthropic model identifier
+            requests (list): (key, system_prompt, user_text) tuples; key
+                identifies each request in the job's results
+
+        Returns:
+            dict: The job record, also saved in the job store
+        """
+        model_type = self.get_model_type(model)
+        if model_type == 'openai':
+            submit = self._submit_openai_batch
+        elif model_type == 'anthropic':
+            submit = self._submit_anthropic_batch
+        else:
+            raise ValueError(f'Batch API not available for {model_type} models')
+
+        job = new_job(model_type, model, requests)
+        job['upstream_id'] = submit(model, job, requests)
+        self.batch_jobs.save(job)
+        log.info("Submitted batch job", extra={
+            "job_id": job['id'], "upstream_id": job['upstream_id'], "model": model,
+            "requests": len(requests),
+        })
+        return job
+
+    def poll_batch(self, job):
+        """
+        Refresh a job's upstream status and collect its results once it ended.
+
+        Args:
+            job (dict): Job record from submit_batch() or the job store
+
+        Returns:
+            dict: The updated job; "results" maps custom_id to {"text": ...}
+                  or {"error": ..., "error_code": ...} once it has ended
+        """
+        if job['status'] in TERMINAL_STATUSES:
+            return job
+
+        if job['provider'] == 'openai':
+            if not self.openai_client:
+                raise ValueError('OpenAI API key not configured')
+            self._poll_openai_batch(job)
+        else:
+            if not self.anthropic_client:
+                raise ValueError('Anthropic API key not configured')
+            self._poll_anthropic_batch(job)
+        self.batch_jobs.save(job)
+        return job
+
+    def _submit_openai_batch(self, model, job, requests):
+        """Upload a JSONL request file and start an OpenAI batch"""
+        if not self.openai_client:
+            raise ValueError('OpenAI API key not configured')
+
+        lines = []
+        for custom_id, (_, system_prompt, text) in zip(job['requests'], requests):
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": openai_messages(system_prompt, text),
+                    **openai_completion_params(
+                        model, self.output_budget.plan(model, system_prompt, text)[0]
+                    )
+                }
+            }))
+
+        batch_file = self.openai_client.files.create(
+            file=(f"rephraseai-{job['id']}.jsonl", "\n".join(lines).encode('utf-8')),
+            purpose="batch"
+        )
+        batch = self.openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"rephraseai_job": job['id']}
+        )
+        return batch.id
+
+    def _poll_openai_batch(self, job):
+        """Update a job from its OpenAI batch, downloading results when done"""
+        batch = self.openai_client.batches.retrieve(job['upstream_id'])
+        if batch.request_counts:
+            job['request_counts'] = {
+                'total': batch.request_counts.total,
+                'completed': batch.request_counts.completed,
+                'failed': batch.request_counts.failed,
+            }
+
+        statuses = {'completed': COMPLETED, 'failed': FAILED, 'expired': EXPIRED, 'cancelled': CANCELLED}
+        if batch.status not in statuses:
+            return
+
+        # Expired and cancelled batches still return what finished in time
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                results.update(parse_openai_results(self.openai_client.files.content(file_id).text))
+        if batch.status == 'failed' and batch.errors and batch.errors.data:
+            job['error'] = '; '.join(error.message for error in batch.errors.data)
+        job['results'] = results
+        job['status'] = statuses[batch.status]
+
+    def _submit_anthropic_batch(self, model, job, requests):
+        """Start an Anthropic message batch"""
+        if not self.anthropic_client:
+            raise ValueError('Anthropic API key not configured')
+
+        batch = self.anthropic_client.messages.batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": model,
+                    "max_tokens": self.output_budget.plan(model, system_prompt, text)[0],
+                    "temperature": 0.7,
+                    "system": anthropic_system(system_prompt),
+                    "messages": [
+                        {"role": "user", "content": text}
+                    ]
+                }
+            }
+            for custom_id, (_, system_prompt, text) in zip(job['requests'], requests)
+        ])
+        return batch.id
+
+    def _poll_anthropic_batch(self, job):
+        """Update a job from its Anthropic batch, reading results when ended"""
+        batches = self.anthropic_client.messages.batches
+        batch = batches.retrieve(job['upstream_id'])
+        counts = batch.request_counts
+        job['request_counts'] = {
+            'processing': counts.processing,
+            'succeeded': counts.succeeded,
+            'errored': counts.errored,
+            'canceled': counts.canceled,
+            'expired': counts.expired,
+        }
+        if batch.processing_status != 'ended':
+            return
+
+        job['results'] = {
+            entry.custom_id: parse_anthropic_result(entry)
+            for entry in batches.results(job['upstream_id'])
+        }
+        job['status'] = COMPLETED
+
+    async def _astream_openai(self, model, system_prompt, text):
+        """Stream response from OpenAI API (async client)"""
+        try:
+            if not self.async_openai_client:
+                yield error_event('OpenAI API key not configured', 'CONFIG_ERROR')
+                return
+
+            stream = await self.async_openai_client.chat.completions.create(
+                model=model,
+                messages=openai_messages(system_prompt, text),
+                stream=True,
+                stream_options={"include_usage": True},
+                **openai_completion_params(model, self.max_tokens_for(model, system_prompt, text))
+            )
+            tracing.mark("connect")
+
+            try:
+                async for chunk in stream:
+                    if chunk.usage:
+                        record_usage(model, openai_usage(chunk.usage.model_dump()))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        yield content_event(content)
+            finally:
+                await stream.close()
+
+            yield DONE_EVENT
+
+        except Exception as e:
+            error_data = {'error': f'OpenAI API error: {str(e)}', 'error_code': sdk_error_code(e)}
+            log.error("OpenAI API error: %s", e, extra={"model": model})
+            yield event(error_data)
+
+    async def _astream_anthropic(self, model, system_prompt, text):
+        """Stream response from Anthropic API (async client)"""
+        try:
+            if not self.async_anthropic_client:
+                yield error_event('Anthropic API key not configured', 'CONFIG_ERROR')
+                return
+
+            async with self.async_anthropic_client.messages.stream(
+                model=model,
+                max_tokens=self.max_tokens_for(model, system_prompt, text),
+                temperature=0.7,
+                system=anthropic_system(system_prompt),
+                messages=[
+                    {"role": "user", "content": text}
+                ]
+            ) as stream:
+                tracing.mark("connect")
+                async for text_chunk in stream.text_stream:
+                    yield content_event(text_chunk)
+                final_message = await stream.get_final_message()
+                record_usage(model, anthropic_usage(final_message.usage.model_dump()))
+
+            yield DONE_EVENT
+
+        except Exception as e:
+            error_data = {'error': f'Anthropic API error: {str(e)}', 'error_code': sdk_error_code(e)}
+            log.error("Anthropic API error: %s", e, extra={"model": model})
+            yield event(error_data)
+
+    async def _astream_gemini(self, model, system_prompt, text):
+        """Stream response from Google Gemini API (async)"""
+        try:
+            if not self.gemini_configured:
+                yield error_event('Google API key not configured', 'CONFIG_ERROR')
+                return
+
+            gemini_model = self._gemini_model(model)
+
+            prompt = f"{system_prompt}\n\n{text}"
+            response = await gemini_model.generate_content_async(
+                prompt,
+                stream=True,
+                generation_config={
+                    "max_output_tokens": self.max_tokens_for(model, system_prompt, text),
+                },
+            )
+            tracing.mark("connect")
+
+            async for chunk in response:
+                if chunk.text:
+                    yield content_event(chunk.text)
 
-            yield f"data: [DONE]\n\n"
+            yield DONE_EVENT
 
         except Exception as e:
-            error_data = {'error': f'Gemini API error: {str(e)}', 'error_code': 'API_ERROR'}
-            print(f"[ERROR] Gemini API error: {e}")
-            yield f"data: {json.dumps(error_data)}\n\n"
+            error_data = {'error': f'Gemini API error: {str(e)}', 'error_code': sdk_error_code(e)}
+            log.error("Gemini API error: %s", e, extra={"model": model})
+            yield event(error_data)
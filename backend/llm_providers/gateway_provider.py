@@ -3,10 +3,29 @@ Gateway LLM Provider - Access LLMs through custom API Gateway
 This is for restricted environments where direct API access is not allowed.
 """
 
-import json
+import importlib.util
 import os
 import requests
+from urllib.parse import urlsplit
 from .base import BaseLLMProvider
+from .sse import DONE_EVENT, content_event, event
+from .sse_parser import DECODERS, USAGE_READERS, SSEParser
+from .prompt_cache import anthropic_system, openai_messages
+from .metrics import record_usage
+from .token_estimator import OutputBudget, is_reasoning_model
+from .http_pool import HTTPSessionPool
+from .model_registry import get_registry
+from .routing import RoutingPolicy
+from .admission import AdmissionController
+from .cancellation import abort_response, cancelled, on_close
+from .client_cache import refresh_keys
+from . import tracing
+
+log = tracing.get_logger(__name__)
+
+# Async HTTP client is optional - only needed for the async streaming path,
+# so it is imported when the first async stream starts
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
 
 
 class GatewayProvider(BaseLLMProvider):
@@ -20,19 +39,31 @@ class GatewayProvider(BaseLLMProvider):
         # Load gateway-specific configuration
         self.gateway_config = self._load_gateway_config()
 
-        # Get API key
-        self.api_key = os.getenv("GATEWAY_API_KEY")
+        # API key (read per request, so keys rotated in Settings apply at once)
         if not self.api_key:
             raise ValueError("GATEWAY_API_KEY environment variable not set")
 
-        # Gateway URLs
-        self.anthropic_gateway_url = self.gateway_config.get(
-            "llm_gateway_url", os.getenv("GATEWAY_ANTHROPIC_URL", "")
+        # Persistent keep-alive connections shared by all requests
+        self.http_pool = HTTPSessionPool.from_config(
+            self.gateway_config.get("http_pool")
         )
-        self.openai_gateway_url = self.gateway_config.get(
-            "openai_gateway_url", os.getenv("GATEWAY_OPENAI_URL", "")
+        self._async_client = None
+
+        # Retries, failover and hedging for gateway errors before the first token
+        self.routing = RoutingPolicy.from_config(self.gateway_config.get("routing"))
+
+        # Concurrency limits per model and per gateway host
+        self.admission = AdmissionController.from_config(
+            self.gateway_config.get("admission"), is_known=self.model_registry.is_known
         )
 
+        # max_tokens sized per request from the input length and style
+        self.output_budget = OutputBudget.from_config(self.gateway_config.get("output_budget"))
+
+        # Ask OpenAI deployments for a final usage chunk (cached tokens);
+        # off by default as older Azure API versions reject stream_options
+        self.openai_stream_usage = bool(self.gateway_config.get("openai_stream_usage", False))
+
         print(f"[INFO] Gateway Provider initialized")
         print(f"[INFO] Anthropic Gateway: {self.anthropic_gateway_url}")
         print(f"[INFO] OpenAI Gateway: {self.openai_gateway_url}")
@@ -41,21 +72,37 @@ class GatewayProvider(BaseLLMProvider):
 
     def _load_gateway_config(self):
         """Load gateway-specific configuration"""
-        # Try to load config.gateway.json first (local, gitignored)
-        if os.path.exists("config.gateway.json"):
-            try:
-                with open("config.gateway.json", "r") as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"[WARN] Failed to load config.gateway.json: {e}")
-
-        # Fall back to config.json
-        try:
-            with open("config.json", "r") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"[WARN] Failed to load config.json: {e}")
-            return {}
+        # Try to load config.gateway.json first (local, gitignored),
+        # falling back to config.json
+        config_file = (
+            "config.gateway.json"
+            if os.path.exists("config.gateway.json")
+            else "config.json"
+        )
+        self.model_registry = get_registry(config_file)
+
+        config = self.model_registry.config
+        if not config:
+            print(f"[WARN] Failed to load {config_file}")
+        return config
+
+    @property
+    def api_key(self):
+        refresh_keys()
+        return os.getenv("GATEWAY_API_KEY")
+
+    # Gateway URLs follow the config file as it is reloaded
+    @property
+    def anthropic_gateway_url(self):
+        return self.model_registry.config.get(
+            "llm_gateway_url", os.getenv("GATEWAY_ANTHROPIC_URL", "")
+        )
+
+    @property
+    def openai_gateway_url(self):
+        return self.model_registry.config.get(
+            "openai_gateway_url", os.getenv("GATEWAY_OPENAI_URL", "")
+        )
 
     def validate_configuration(self):
         """Validate gateway configuration"""
@@ -67,197 +114,378 @@ class GatewayProvider(BaseLLMProvider):
 
     def get_available_models(self):
         """Return available models from gateway configuration"""
-        return self.gateway_config.get("available_models", {})
+        return self.model_registry.available_models()
+
+    def get_stats(self):
+        """Return HTTP connection pool and routing statistics"""
+        stats = super().get_stats()
+        stats["http_pool"] = self.http_pool.stats()
+        return stats
 
     def get_model_type(self, model_name):
         """Determine if model is Anthropic or OpenAI based"""
-        available_models = self.get_available_models()
-
-        if model_name in available_models.get("anthropic", []):
-            return "anthropic"
-        elif model_name in available_models.get("openai", []):
-            return "openai"
+        model_type = self.model_registry.get_model_type(model_name)
+        if model_type in ("anthropic", "openai"):
+            return model_type
 
         # Default to anthropic if model starts with 'claude'
         return "anthropic" if model_name.startswith("claude") else "openai"
 
-    def get_gateway_url(self, model_name):
-        """Get the appropriate gateway URL based on model type"""
+    def get_gateway_url(self, model_name, base_url=None):
+        """
+        Get the appropriate gateway URL based on model type.
+
+        Args:
+            model_name (str): Model identifier
+            base_url (str): Gateway to use instead of the configured one
+        """
         model_type = self.get_model_type(model_name)
 
         if model_type == "openai":
             # OpenAI models use deployment-specific URLs
-            return f"{self.openai_gateway_url}/deployments/{model_name}/chat/completions?api-version=2024-02-01"
+            base_url = base_url or self.openai_gateway_url
+            return f"{base_url}/deployments/{model_name}/chat/completions?api-version=2024-02-01"
         else:
             # Anthropic models use the full gateway URL directly
-            return self.anthropic_gateway_url
+            return base_url or self.anthropic_gateway_url
+
+    def _admission_gateway(self, target):
+        """Gateway host (scheme://netloc) serving a model or (model, base URL) target"""
+        model, base_url = target if isinstance(target, tuple) else (target, None)
+        parts = urlsplit(self.get_gateway_url(model, base_url))
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _route_targets(self, model):
+        """
+        List (model, gateway base URL) pairs to try, in order.
+
+        Each model is tried on the configured gateway first, then on the
+        fallback gateways configured for its type.
+        """
+        targets = []
+        for candidate in super()._route_targets(model):
+            targets.append((candidate, None))
+            for base_url in self.routing.gateway_urls_for(self.get_model_type(candidate)):
+                targets.append((candidate, base_url))
+        return targets
+
+    def _stream_target(self, target, system_prompt, user_text):
+        """Stream from one (model, gateway base URL) routing target"""
+        model, base_url = target
+        gateway_url, headers, payload, model_type = self._prepare_request(
+            model, system_prompt, user_text, base_url
+        )
+        return self._stream_from_gateway(gateway_url, headers, payload, model_type, model)
 
-    def stream_response(self, model, system_prompt, user_text):
+    def _astream_target(self, target, system_prompt, user_text):
+        """Async counterpart of _stream_target()"""
+        if not HTTPX_AVAILABLE:
+            return self._astream_in_thread(
+                self._stream_target(target, system_prompt, user_text)
+            )
+
+        model, base_url = target
+        gateway_url, headers, payload, model_type = self._prepare_request(
+            model, system_prompt, user_text, base_url
+        )
+        return self._astream_from_gateway(gateway_url, headers, payload, model_type, model)
+
+    def _stream_response(self, model, system_prompt, user_text):
         """Stream response from LLM Gateway"""
-        gateway_url = self.get_gateway_url(model)
+        yield from self._stream_target((model, None), system_prompt, user_text)
+
+    async def _astream_response(self, model, system_prompt, user_text):
+        """Stream response from LLM Gateway without blocking the event loop"""
+        async for chunk in self._astream_target((model, None), system_prompt, user_text):
+            yield chunk
+
+    def _prepare_request(self, model, system_prompt, user_text, base_url=None):
+        """Build the gateway URL, headers and payload for a request"""
+        gateway_url = self.get_gateway_url(model, base_url)
         model_type = self.get_model_type(model)
 
-        print(f"[DEBUG] Using model: {model} (type: {model_type})")
-        print(f"[DEBUG] Gateway URL: {gateway_url}")
+        log.debug(
+            "Using model",
+            extra={"model": model, "model_type": model_type, "gateway_url": gateway_url},
+        )
 
         # Prepare headers
         headers = {"Content-Type": "application/json", "X-API-Key": self.api_key}
+        max_tokens = self.max_tokens_for(model, system_prompt, user_text)
 
         # Prepare request payload based on model type
         if model_type == "anthropic":
-            # Anthropic format
+            # Anthropic format, with the style prompt as a cacheable system block
             headers["anthropic-version"] = "2023-06-01"
             payload = {
                 "model": model,
-                "messages": [
-                    {"role": "user", "content": f"{system_prompt}\n\n{user_text}"}
-                ],
+                "system": anthropic_system(system_prompt),
+                "messages": [{"role": "user", "content": user_text}],
                 "stream": True,
-                "max_tokens": 4096,
+                "max_tokens": max_tokens,
                 "temperature": 0.7,
             }
         else:
             # OpenAI format
             # Newer models (O3, O4, GPT-5) use max_completion_tokens
-            uses_new_api = any(
-                x in model.lower() for x in ["o3", "o4", "gpt-5", "gpt-5.2"]
-            )
+            uses_new_api = is_reasoning_model(model)
 
+            # Shared prompt prefix first, so upstream prefix caching applies
             payload = {
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_text},
-                ],
+                "messages": openai_messages(system_prompt, user_text),
                 "stream": True,
             }
+            if self.openai_stream_usage:
+                payload["stream_options"] = {"include_usage": True}
 
             # GPT-5 and O-series models only support temperature=1 (default)
             if not uses_new_api:
                 payload["temperature"] = 0.7
 
             if uses_new_api:
-                # O-series and GPT-5 need more tokens for reasoning + completion
-                payload["max_completion_tokens"] = 16384
+                # O-series and GPT-5 budgets include their reasoning tokens
+                payload["max_completion_tokens"] = max_tokens
             else:
-                payload["max_tokens"] = 4096
+                payload["max_tokens"] = max_tokens
 
-        yield from self._stream_from_gateway(gateway_url, headers, payload, model_type)
+        return gateway_url, headers, payload, model_type
 
-    def _stream_from_gateway(self, gateway_url, headers, payload, model_type):
+    def _stream_from_gateway(self, gateway_url, headers, payload, model_type, model):
         """Stream responses from the gateway"""
         try:
-            # Stream from LLM Gateway
-            response = requests.post(
-                gateway_url,
-                headers=headers,
-                json=payload,
-                stream=True,
+            with self.http_pool.session(gateway_url) as session:
+                # Stream from LLM Gateway over a pooled keep-alive connection
+                response = session.post(
+                    gateway_url,
+                    headers=headers,
+                    json=payload,
+                    stream=True,
+                    timeout=60,
+                    verify=False,  # For internal corporate certificates
+                )
+                tracing.mark("connect")
+                # A consumer that stops aborts the response from its own thread
+                closing = on_close(lambda: abort_response(response))
+                try:
+                    yield from self._read_gateway_response(response, model_type, model)
+                except requests.exceptions.RequestException:
+                    if cancelled():
+                        return
+                    raise
+                finally:
+                    closing()
+                    # Fully read responses leave their connection in the pool
+                    response.close()
+
+        except requests.exceptions.Timeout:
+            error_data = {"error": "Request timed out.", "error_code": "TIMEOUT"}
+            log.error("Request timeout", extra={"gateway_url": gateway_url})
+            yield event(error_data)
+        except requests.exceptions.ConnectionError:
+            error_data = {
+                "error": "Cannot connect to gateway.",
+                "error_code": "CONNECTION_ERROR",
+            }
+            log.error("Connection error", extra={"gateway_url": gateway_url})
+            yield event(error_data)
+        except requests.exceptions.RequestException as e:
+            error_data = {
+                "error": f"Network error: {str(e)}",
+                "error_code": "NETWORK_ERROR",
+            }
+            log.error("Request exception: %s", e, extra={"gateway_url": gateway_url})
+            yield event(error_data)
+        except Exception as e:
+            error_data = {
+                "error": f"Unexpected error: {str(e)}",
+                "error_code": "UNKNOWN_ERROR",
+            }
+            log.error("Unexpected error: %s", e, extra={"gateway_url": gateway_url})
+            yield event(error_data)
+
+    def _read_gateway_response(self, response, model_type, model):
+        """Translate a gateway HTTP response into SSE events"""
+        error_data = self._status_error(response.status_code)
+        if error_data:
+            yield event(error_data)
+            return
+
+        parser = SSEParser()
+        decode = DECODERS[model_type]
+        read_usage = USAGE_READERS[model_type]
+        usage = None
+
+        # Chunked bodies are read one network chunk at a time; other bodies
+        # need a bounded read size so events are not held until EOF
+        chunk_size = None if response.raw.chunked else 512
+        chunks = response.iter_content(chunk_size=chunk_size)
+
+        stream_ended = False
+        for raw in chunks:
+            sse_events = parser.feed(raw)
+            if usage is None:
+                usage = self._find_usage(sse_events, read_usage)
+            events, stream_ended = self._decode_events(sse_events, decode)
+            yield from events
+            if stream_ended:
+                break
+        else:
+            events, stream_ended = self._decode_events(parser.flush(), decode)
+            yield from events
+
+        # Send DONE marker if not already sent
+        if not stream_ended:
+            yield DONE_EVENT
+
+        # Read the tail of the body (usually just the terminating chunk, or
+        # the OpenAI usage chunk) so the keep-alive connection can be reused
+        for raw in chunks:
+            if usage is None:
+                usage = self._find_usage(parser.feed(raw), read_usage)
+
+        if usage is not None:
+            record_usage(model, usage)
+
+    def _get_async_client(self):
+        """Return the shared async HTTP client, creating it on first use"""
+        if self._async_client is None:
+            import httpx
+            pool = self.http_pool
+            self._async_client = httpx.AsyncClient(
                 timeout=60,
                 verify=False,  # For internal corporate certificates
+                limits=httpx.Limits(
+                    max_keepalive_connections=pool.pool_size if pool.keep_alive else 0,
+                    keepalive_expiry=pool.idle_timeout,
+                ),
             )
+        return self._async_client
 
-            # Handle HTTP error responses
-            if response.status_code == 401:
-                error_data = {
-                    "error": "Authentication failed. Please check your API key.",
-                    "error_code": "AUTH_ERROR",
-                }
-                yield f"data: {json.dumps(error_data)}\n\n"
-                return
-            elif response.status_code == 429:
-                error_data = {
-                    "error": "Rate limit exceeded. Please wait and try again.",
-                    "error_code": "RATE_LIMIT",
-                }
-                yield f"data: {json.dumps(error_data)}\n\n"
-                return
-            elif response.status_code == 503:
-                error_data = {
-                    "error": "Service temporarily unavailable.",
-                    "error_code": "SERVICE_UNAVAILABLE",
-                }
-                yield f"data: {json.dumps(error_data)}\n\n"
-                return
-            elif response.status_code >= 400:
-                error_data = {
-                    "error": f"API error: {response.status_code}",
-                    "error_code": "API_ERROR",
-                }
-                yield f"data: {json.dumps(error_data)}\n\n"
-                return
-
-            # Parse streaming response
-            stream_ended = False
-            for line in response.iter_lines():
-                if line:
-                    line_text = line.decode("utf-8")
-                    if line_text.startswith("data: "):
-                        data_str = line_text[6:]
-                        if data_str.strip() == "[DONE]":
-                            yield f"data: [DONE]\n\n"
-                            stream_ended = True
-                            break
-
-                        try:
-                            chunk = json.loads(data_str)
-                            content = None
-                            finish_reason = None
-
-                            # Handle Anthropic format
-                            if "type" in chunk:
-                                if chunk["type"] == "content_block_delta":
-                                    delta = chunk.get("delta", {})
-                                    content = delta.get("text", "")
-                                elif chunk["type"] == "message_stop":
-                                    yield f"data: [DONE]\n\n"
-                                    stream_ended = True
-                                    break
-                            # Handle OpenAI format
-                            elif "choices" in chunk and len(chunk["choices"]) > 0:
-                                delta = chunk["choices"][0].get("delta", {})
-                                content = delta.get("content", "")
-                                # Check for finish_reason to detect end of stream
-                                finish_reason = chunk["choices"][0].get("finish_reason")
-                                if finish_reason:
-                                    stream_ended = True
-                                    # Send any remaining content first
-                                    if content:
-                                        yield f"data: {json.dumps({'content': content})}\n\n"
-                                    # Then send DONE
-                                    yield f"data: [DONE]\n\n"
-                                    break
-
-                            if content and not finish_reason:
-                                yield f"data: {json.dumps({'content': content})}\n\n"
-                        except json.JSONDecodeError:
-                            continue
-
-            # Send DONE marker if not already sent
-            if not stream_ended:
-                yield f"data: [DONE]\n\n"
+    async def _astream_from_gateway(self, gateway_url, headers, payload, model_type, model):
+        """Stream responses from the gateway using the async HTTP client"""
+        import httpx
 
-        except requests.exceptions.Timeout:
+        try:
+            client = self._get_async_client()
+            async with client.stream(
+                "POST", gateway_url, headers=headers, json=payload
+            ) as response:
+                tracing.mark("connect")
+                error_data = self._status_error(response.status_code)
+                if error_data:
+                    yield event(error_data)
+                    return
+
+                parser = SSEParser()
+                decode = DECODERS[model_type]
+                read_usage = USAGE_READERS[model_type]
+                usage = None
+
+                stream_ended = False
+                chunks = response.aiter_bytes()
+                async for raw in chunks:
+                    sse_events = parser.feed(raw)
+                    if usage is None:
+                        usage = self._find_usage(sse_events, read_usage)
+                    events, stream_ended = self._decode_events(sse_events, decode)
+                    for sse_event in events:
+                        yield sse_event
+                    if stream_ended:
+                        break
+                else:
+                    events, stream_ended = self._decode_events(parser.flush(), decode)
+                    for sse_event in events:
+                        yield sse_event
+
+                if not stream_ended:
+                    yield DONE_EVENT
+
+                # Drain the tail so the connection returns to the pool
+                async for raw in chunks:
+                    if usage is None:
+                        usage = self._find_usage(parser.feed(raw), read_usage)
+
+                if usage is not None:
+                    record_usage(model, usage)
+
+        except httpx.TimeoutException:
             error_data = {"error": "Request timed out.", "error_code": "TIMEOUT"}
-            print(f"[ERROR] Request timeout")
-            yield f"data: {json.dumps(error_data)}\n\n"
-        except requests.exceptions.ConnectionError:
+            log.error("Request timeout", extra={"gateway_url": gateway_url})
+            yield event(error_data)
+        except httpx.ConnectError:
             error_data = {
                 "error": "Cannot connect to gateway.",
                 "error_code": "CONNECTION_ERROR",
             }
-            print(f"[ERROR] Connection error")
-            yield f"data: {json.dumps(error_data)}\n\n"
-        except requests.exceptions.RequestException as e:
+            log.error("Connection error", extra={"gateway_url": gateway_url})
+            yield event(error_data)
+        except httpx.HTTPError as e:
             error_data = {
                 "error": f"Network error: {str(e)}",
                 "error_code": "NETWORK_ERROR",
             }
-            print(f"[ERROR] Request exception: {e}")
-            yield f"data: {json.dumps(error_data)}\n\n"
+            log.error("Request exception: %s", e, extra={"gateway_url": gateway_url})
+            yield event(error_data)
         except Exception as e:
             error_data = {
                 "error": f"Unexpected error: {str(e)}",
                 "error_code": "UNKNOWN_ERROR",
             }
-            print(f"[ERROR] Unexpected error: {e}")
-            yield f"data: {json.dumps(error_data)}\n\n"
+            log.error("Unexpected error: %s", e, extra={"gateway_url": gateway_url})
+            yield event(error_data)
+
+    @staticmethod
+    def _status_error(status_code):
+        """Map an HTTP error status to an error payload (None when OK)"""
+        if status_code == 401:
+            return {
+                "error": "Authentication failed. Please check your API key.",
+                "error_code": "AUTH_ERROR",
+            }
+        elif status_code == 429:
+            return {
+                "error": "Rate limit exceeded. Please wait and try again.",
+                "error_code": "RATE_LIMIT",
+            }
+        elif status_code == 503:
+            return {
+                "error": "Service temporarily unavailable.",
+                "error_code": "SERVICE_UNAVAILABLE",
+            }
+        elif status_code >= 400:
+            return {
+                "error": f"API error: {status_code}",
+                "error_code": "API_ERROR",
+            }
+        return None
+
+    @staticmethod
+    def _find_usage(sse_events, read_usage):
+        """Return the prompt usage carried by any of the parsed events, else None"""
+        for event_name, data in sse_events:
+            usage = read_usage(event_name, data)
+            if usage is not None:
+                return usage
+        return None
+
+    @staticmethod
+    def _decode_events(sse_events, decode):
+        """
+        Decode parsed gateway events into SSE events for the client.
+
+        Args:
+            sse_events (list): (event_name, data) tuples from SSEParser
+            decode (callable): Payload decoder for the model type
+
+        Returns:
+            tuple: (list of SSE events to forward, whether the stream ended)
+        """
+        events = []
+        for event_name, data in sse_events:
+            content, stream_ended = decode(event_name, data)
+            if content:
+                events.append(content_event(content))
+            if stream_ended:
+                events.append(DONE_EVENT)
+                return events, True
+        return events, False
@@ -0,0 +1,151 @@
+"""
+Pooled HTTP sessions for gateway access
+Keeps persistent keep-alive connections per gateway host so repeated
+requests skip the TCP/TLS handshake.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_POOL_CONFIG = {
+    "pool_size": 10,
+    "keep_alive": True,
+    "idle_timeout": 90,
+}
+
+
+class _PooledSession:
+    """A requests.Session plus the bookkeeping needed for idle eviction"""
+
+    def __init__(self, pool_size, keep_alive):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.adapter = adapter
+        self.in_flight = 0
+        self.requests = 0
+        self.last_used = time.monotonic()
+
+    def connections_opened(self):
+        """Total connections urllib3 has opened for this session"""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in list(pools.keys()))
+
+
+class HTTPSessionPool:
+    """
+    Thread-safe registry of pooled sessions, one per gateway host.
+
+    Sessions idle for longer than idle_timeout are closed and recreated on
+    the next request, so stale connections dropped by proxies are not reused.
+    """
+
+    def __init__(self, pool_size=10, keep_alive=True, idle_timeout=90):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._idle_resets = 0
+        self._retired = {"requests": 0, "connections_opened": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a pool from the "http_pool" section of the gateway config"""
+        settings = dict(DEFAULT_POOL_CONFIG)
+        settings.update(config or {})
+        return cls(
+            pool_size=int(settings["pool_size"]),
+            keep_alive=bool(settings["keep_alive"]),
+            idle_timeout=float(settings["idle_timeout"]),
+        )
+
+    @staticmethod
+    def _host_key(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _retire(self, pooled):
+        self._retired["requests"] += pooled.requests
+        self._retired["connections_opened"] += pooled.connections_opened()
+        pooled.session.close()
+
+    @contextmanager
+    def session(self, url):
+        """
+        Borrow the pooled session for a URL's host.
+
+        The session counts as in use until the block exits, so callers
+        should consume the streamed response inside the block. A response
+        read to the end returns its connection to the pool; closing one
+        early discards the connection.
+        """
+        key = self._host_key(url)
+        with self._lock:
+            pooled = self._sessions.get(key)
+            now = time.monotonic()
+            if (
+                pooled is not None
+                and pooled.in_flight == 0
+                and now - pooled.last_used > self.idle_timeout
+            ):
+                self._retire(pooled)
+                self._idle_resets += 1
+                pooled = None
+            if pooled is None:
+                pooled = _PooledSession(self.pool_size, self.keep_alive)
+                self._sessions[key] = pooled
+            pooled.in_flight += 1
+            pooled.requests += 1
+
+        try:
+            yield pooled.session
+        finally:
+            with self._lock:
+                pooled.in_flight -= 1
+                pooled.last_used = time.monotonic()
+
+    def stats(self):
+        """Return per-host and total pool statistics"""
+        with self._lock:
+            hosts = {}
+            total_requests = self._retired["requests"]
+            total_connections = self._retired["connections_opened"]
+            for key, pooled in self._sessions.items():
+                opened = pooled.connections_opened()
+                hosts[key] = {
+                    "requests": pooled.requests,
+                    "connections_opened": opened,
+                    "connections_reused": max(pooled.requests - opened, 0),
+                    "in_flight": pooled.in_flight,
+                    "idle_seconds": round(time.monotonic() - pooled.last_used, 1),
+                }
+                total_requests += pooled.requests
+                total_connections += opened
+
+            return {
+                "pool_size": self.pool_size,
+                "keep_alive": self.keep_alive,
+                "idle_timeout": self.idle_timeout,
+                "requests": total_requests,
+                "connections_opened": total_connections,
+                "connections_reused": max(total_requests - total_connections, 0),
+                "idle_resets": self._idle_resets,
+                "hosts": hosts,
+            }
+
+    def close(self):
+        """Close every pooled session"""
+        with self._lock:
+            for pooled in self._sessions.values():
+                self._retire(pooled)
+            self._sessions.clear()
@@ -0,0 +1,353 @@
+"""
+Prometheus-style metrics
+Minimal counters, gauges and histograms rendered in the Prometheus text
+exposition format, plus the per-stream timing recorded by every provider.
+
+Each worker process keeps its own values; scrape workers individually or
+run a single worker when exact totals matter.
+"""
+
+import threading
+import time
+
+from . import tracing
+from .sse import error_code
+
+
+# Latency buckets in seconds, from fast cache hits to long generations
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 30, 60)
+
+# Output throughput buckets
+CHARS_PER_SECOND_BUCKETS = (10, 25, 50, 100, 200, 300, 500, 750, 1000, 1500, 2500, 5000)
+CHUNKS_PER_SECOND_BUCKETS = (1, 2.5, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+# Output token budgets
+MAX_TOKENS_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for labelled metrics; values are keyed by label value tuples"""
+
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            )
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them for the /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter(
+    "rephraseai_requests_total",
+    "Generation requests by route, style, channel and model",
+    ("route", "style", "channel", "model"),
+)
+STREAMS_IN_FLIGHT = registry.gauge(
+    "rephraseai_llm_streams_in_flight",
+    "Provider streams currently open (including those waiting for a slot)",
+    ("model",),
+)
+STREAMS = registry.counter(
+    "rephraseai_llm_streams_total",
+    "Provider streams by outcome (completed, error, cancelled)",
+    ("model", "outcome"),
+)
+TIME_TO_FIRST_TOKEN = registry.histogram(
+    "rephraseai_llm_time_to_first_token_seconds",
+    "Time from the start of a provider stream to its first content chunk",
+    ("model",),
+)
+STREAM_DURATION = registry.histogram(
+    "rephraseai_llm_stream_duration_seconds",
+    "Total duration of provider streams",
+    ("model",),
+)
+OUTPUT_CHARS_PER_SECOND = registry.histogram(
+    "rephraseai_llm_output_chars_per_second",
+    "Output characters per second between the first and last content chunk",
+    ("model",),
+    CHARS_PER_SECOND_BUCKETS,
+)
+OUTPUT_CHUNKS_PER_SECOND = registry.histogram(
+    "rephraseai_llm_output_chunks_per_second",
+    "Output chunks per second between the first and last content chunk",
+    ("model",),
+    CHUNKS_PER_SECOND_BUCKETS,
+)
+OUTPUT_CHARS = registry.counter(
+    "rephraseai_llm_output_chars_total",
+    "Output characters streamed to clients",
+    ("model",),
+)
+ERRORS = registry.counter(
+    "rephraseai_llm_errors_total",
+    "Error events by upstream error code",
+    ("model", "error_code"),
+)
+
+
+INPUT_TOKENS = registry.counter(
+    "rephraseai_llm_input_tokens_total",
+    "Prompt tokens sent upstream, as reported in the provider usage data",
+    ("model",),
+)
+CACHED_INPUT_TOKENS = registry.counter(
+    "rephraseai_llm_cached_input_tokens_total",
+    "Prompt tokens served from the upstream prompt cache",
+    ("model",),
+)
+CACHE_WRITE_TOKENS = registry.counter(
+    "rephraseai_llm_cache_write_tokens_total",
+    "Prompt tokens written to the upstream prompt cache (Anthropic)",
+    ("model",),
+)
+
+
+ESTIMATED_INPUT_TOKENS = registry.counter(
+    "rephraseai_llm_estimated_input_tokens_total",
+    "Prompt tokens estimated locally before sending (compare with input_tokens to calibrate)",
+    ("model",),
+)
+MAX_OUTPUT_TOKENS = registry.histogram(
+    "rephraseai_llm_max_output_tokens",
+    "Output token budget (max_tokens) chosen per request",
+    ("model",),
+    buckets=MAX_TOKENS_BUCKETS,
+)
+
+
+# Decides which models get their own label value; the rest are counted as
+# "other", so arbitrary model names in requests cannot create new series
+_model_filter = None
+
+
+def set_model_filter(is_known):
+    """
+    Limit per-model labels to known models.
+
+    Args:
+        is_known (callable): Returns True for a model name that may be used
+            as a label value (None labels every model by name)
+    """
+    global _model_filter
+    _model_filter = is_known
+
+
+def model_label(model):
+    """Label value for a model (its name, or "other" if unknown)"""
+    if _model_filter is None or _model_filter(model):
+        return model
+    return "other"
+
+
+def record_usage(model, usage):
+    """
+    Record the prompt token usage reported by a provider.
+
+    Args:
+        model (str): Model identifier
+        usage (dict): input_tokens, cached_tokens and cache_write_tokens
+    """
+    model = model_label(model)
+    INPUT_TOKENS.inc(usage["input_tokens"], model=model)
+    CACHED_INPUT_TOKENS.inc(usage["cached_tokens"], model=model)
+    CACHE_WRITE_TOKENS.inc(usage["cache_write_tokens"], model=model)
+    tracing.annotate(**usage)
+
+
+def record_budget(model, estimated_tokens, max_tokens):
+    """Record the local prompt estimate and the max_tokens chosen for a request"""
+    model = model_label(model)
+    ESTIMATED_INPUT_TOKENS.inc(estimated_tokens, model=model)
+    MAX_OUTPUT_TOKENS.observe(max_tokens, model=model)
+    tracing.annotate(estimated_input_tokens=estimated_tokens, max_tokens=max_tokens)
+
+
+class StreamObserver:
+    """
+    Records the timing of one provider stream.
+
+    Created when a stream starts and fed every chunk; finish() records the
+    duration, throughput and outcome.
+    """
+
+    def __init__(self, model):
+        self.model = model_label(model)
+        self.started = time.monotonic()
+        self.first_token = None
+        self.first_chars = 0
+        self.last_token = None
+        self.chunks = 0
+        self.chars = 0
+        self.error_code = None
+        STREAMS_IN_FLIGHT.inc(model=self.model)
+
+    def observe(self, chunk, chars):
+        """
+        Record one chunk.
+
+        Args:
+            chunk (str): SSE formatted string
+            chars (int): Content characters it carries (0 for non-content)
+        """
+        if chars:
+            now = time.monotonic()
+            if self.first_token is None:
+                self.first_token = now
+                self.first_chars = chars
+                TIME_TO_FIRST_TOKEN.observe(now - self.started, model=self.model)
+            self.last_token = now
+            self.chunks += 1
+            self.chars += chars
+        elif '"error_code"' in chunk:
+            self.error_code = error_code(chunk) or "UNKNOWN_ERROR"
+            ERRORS.inc(model=self.model, error_code=self.error_code)
+
+    def finish(self, completed):
+        """
+        Record the end of the stream.
+
+        Args:
+            completed (bool): False if the consumer closed the stream early
+        """
+        STREAMS_IN_FLIGHT.dec(model=self.model)
+        STREAM_DURATION.observe(time.monotonic() - self.started, model=self.model)
+
+        if self.chars:
+            OUTPUT_CHARS.inc(self.chars, model=self.model)
+            elapsed = self.last_token - self.first_token
+            if elapsed > 0 and self.chunks > 1:
+                # Rates cover what arrived after the first chunk
+                OUTPUT_CHARS_PER_SECOND.observe(
+                    (self.chars - self.first_chars) / elapsed, model=self.model
+                )
+                OUTPUT_CHUNKS_PER_SECOND.observe((self.chunks - 1) / elapsed, model=self.model)
+
+        if not completed:
+            outcome = "cancelled"
+        elif self.error_code:
+            outcome = "error"
+        else:
+            outcome = "completed"
+        STREAMS.inc(model=self.model, outcome=outcome)
@@ -0,0 +1,181 @@
+"""
+In-memory model registry
+Parses a model config file once and answers model -> provider lookups from
+memory, reloading only when the file changes on disk. WatchedFile provides
+the same versioned hot reload for other files (prompts.json, .env).
+"""
+
+import json
+import os
+import threading
+import time
+
+
+# Minimum seconds between mtime checks of the config file
+CHECK_INTERVAL = float(
+    os.getenv("CONFIG_RELOAD_INTERVAL", os.getenv("MODEL_REGISTRY_CHECK_INTERVAL", "2"))
+)
+
+
+class WatchedFile:
+    """
+    Thread-safe, versioned cache of a parsed file.
+
+    Readers never touch the disk directly; at most one os.stat() per
+    CHECK_INTERVAL seconds decides whether the file has to be re-parsed.
+    A new version is built completely before it is swapped in, so callers
+    holding an older snapshot keep a consistent view of it. If the file
+    becomes invalid, the last good version keeps being served.
+
+    Subclasses implement _parse() and _empty().
+    """
+
+    # Name used in reload messages
+    kind = "config"
+
+    def __init__(self, path, check_interval=CHECK_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self.error = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._snapshot = self._empty()
+        self._maybe_reload()
+        with _watched_lock:
+            _watched.append(self)
+
+    def _empty(self):
+        """Snapshot (version 0) served until the file has been read"""
+        raise NotImplementedError
+
+    def _parse(self, f, version, stamp):
+        """Build a snapshot from the open file"""
+        raise NotImplementedError
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+
+            try:
+                stat = os.stat(self.path)
+            except OSError as e:
+                self.error = f"{self.path} not found ({e.strerror})"
+                return
+            # Atomic replacements change the inode even within one mtime tick
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+            snapshot = self._snapshot
+            if not force and stamp == snapshot.mtime:
+                return
+
+            try:
+                with open(self.path, "r") as f:
+                    new_snapshot = self._parse(f, snapshot.version + 1, stamp)
+            except Exception as e:
+                # Keep serving the last good version
+                self.error = f"Invalid {os.path.basename(self.path)}: {e}"
+                print(f"[WARN] Failed to reload {self.path}: {e}")
+                return
+
+            self.error = None
+            self._snapshot = new_snapshot
+            if snapshot.version:
+                print(f"[INFO] Reloaded {self.kind} from {self.path}")
+
+    def snapshot(self):
+        """Return the current snapshot, reloading it first if the file changed"""
+        self._maybe_reload()
+        return self._snapshot
+
+    def reload(self):
+        """Re-parse the file immediately"""
+        self._maybe_reload(force=True)
+
+
+class RegistrySnapshot:
+    """Immutable view of one parsed version of a config file"""
+
+    def __init__(self, version, config, mtime):
+        self.version = version
+        self.config = config
+        self.mtime = mtime
+        self.available_models = config.get("available_models", {})
+
+        # Flatten {provider: [models]} into {model: provider} for O(1) lookups
+        self.model_types = {}
+        for provider, models in self.available_models.items():
+            for model_name in models:
+                self.model_types.setdefault(model_name, provider)
+
+
+class ModelRegistry(WatchedFile):
+    """Thread-safe cache of a model config file"""
+
+    kind = "model registry"
+
+    def _empty(self):
+        return RegistrySnapshot(0, {}, None)
+
+    def _parse(self, f, version, stamp):
+        return RegistrySnapshot(version, json.load(f), stamp)
+
+    @property
+    def config(self):
+        return self.snapshot().config
+
+    def available_models(self):
+        """Return the {provider: [models]} mapping"""
+        return self.snapshot().available_models
+
+    def get_model_type(self, model_name):
+        """Return the provider a model is configured under, or None"""
+        return self.snapshot().model_types.get(model_name)
+
+    def is_known(self, model_name):
+        """Whether a model is listed in the config (available, default or preview)"""
+        snapshot = self.snapshot()
+        config = snapshot.config
+        return (
+            model_name in snapshot.model_types
+            or model_name in (config.get("default_model"), config.get("preview_model"))
+        )
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+# Every watched file, for invalidate()
+_watched = []
+_watched_lock = threading.Lock()
+
+
+def get_registry(path):
+    """Return the shared registry for a config file path"""
+    key = os.path.abspath(path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = ModelRegistry(key)
+            _registries[key] = registry
+        return registry
+
+
+def invalidate(path=None):
+    """
+    Reload watched files (model registries, prompts) after a config write.
+
+    Args:
+        path (str): File that changed; all watched files when omitted
+    """
+    with _watched_lock:
+        watched = list(_watched)
+
+    for watched_file in watched:
+        if path is None or watched_file.path == os.path.abspath(path):
+            watched_file.reload()
@@ -0,0 +1,97 @@
+"""
+Upstream prompt caching
+System prompts are split into a prefix shared by every request for the same
+style and channel, and a per-request suffix. Anthropic requests mark the
+prefix as a cacheable system block; OpenAI requests keep it first so its
+automatic prefix caching applies. Cached-token usage is normalized here.
+"""
+
+
+class SystemPrompt(str):
+    """
+    A system prompt that knows its cacheable prefix.
+
+    Behaves as the full prompt text everywhere a plain string is expected
+    (cache keys, logging); providers use .prefix and .suffix to build
+    cache-friendly requests. Precompiled prompts also carry .prefix_hash,
+    a stable hash of the prefix text, and .length_ratio, the expected
+    output length relative to the input (used to size max_tokens; None
+    when the output does not follow the input length, as in compose).
+    """
+
+    def __new__(cls, prefix, suffix="", prefix_hash=None, length_ratio=1.0):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        prompt.prefix_hash = prefix_hash
+        prompt.length_ratio = length_ratio
+        return prompt
+
+
+def split_system_prompt(system_prompt):
+    """
+    Return (prefix, suffix) of a system prompt.
+
+    Plain strings have no per-request part, so the whole prompt is the
+    prefix.
+    """
+    prefix = getattr(system_prompt, "prefix", system_prompt)
+    suffix = getattr(system_prompt, "suffix", "")
+    return prefix, suffix.strip()
+
+
+def anthropic_system(system_prompt):
+    """
+    Build the Anthropic "system" blocks, with the prefix marked cacheable.
+
+    Prefixes shorter than the model's minimum cacheable length (1024
+    tokens on most models) are simply not cached upstream.
+    """
+    prefix, suffix = split_system_prompt(system_prompt)
+    blocks = []
+    if prefix:
+        blocks.append({"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}})
+    if suffix:
+        blocks.append({"type": "text", "text": suffix})
+    return blocks
+
+
+def openai_messages(system_prompt, user_text):
+    """
+    Build OpenAI chat messages ordered from most to least shared.
+
+    The style/channel prefix comes first and is byte-identical across
+    requests, then per-request instructions, then the user's text.
+    """
+    prefix, suffix = split_system_prompt(system_prompt)
+    messages = [{"role": "system", "content": prefix}]
+    if suffix:
+        messages.append({"role": "system", "content": suffix})
+    messages.append({"role": "user", "content": user_text})
+    return messages
+
+
+def anthropic_usage(usage):
+    """
+    Normalize an Anthropic usage object.
+
+    Anthropic reports uncached, cache-read and cache-write input tokens
+    separately; input_tokens here is their total.
+    """
+    cached = usage.get("cache_read_input_tokens") or 0
+    cache_write = usage.get("cache_creation_input_tokens") or 0
+    return {
+        "input_tokens": (usage.get("input_tokens") or 0) + cached + cache_write,
+        "cached_tokens": cached,
+        "cache_write_tokens": cache_write,
+    }
+
+
+def openai_usage(usage):
+    """Normalize an OpenAI usage object"""
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "input_tokens": usage.get("prompt_tokens") or 0,
+        "cached_tokens": details.get("cached_tokens") or 0,
+        "cache_write_tokens": 0,
+    }
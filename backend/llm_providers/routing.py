@@ -0,0 +1,457 @@
+"""
+Request routing for LLM providers
+Retries failed requests with jittered backoff, fails over to fallback
+models or gateway URLs, and optionally hedges slow requests with a second
+attempt. Decisions are only made before the first token is streamed.
+"""
+
+import asyncio
+import contextvars
+import queue
+import random
+import threading
+import time
+
+from .admission import QUEUED_EVENT_PREFIX
+from .cancellation import CloseScope, cancelled
+from .sse import error_code, error_event
+from . import tracing
+
+log = tracing.get_logger(__name__)
+
+
+DEFAULT_ROUTING_CONFIG = {
+    "max_retries": 2,
+    "backoff_base": 0.25,
+    "backoff_max": 4.0,
+    "retry_on": ["RATE_LIMIT", "SERVICE_UNAVAILABLE", "TIMEOUT", "CONNECTION_ERROR"],
+    "hedge_after": 0,
+    "fallback_models": {},
+    "fallback_gateway_urls": {},
+}
+
+_END = object()
+
+
+def describe(target):
+    """Human-readable name of a routing target for log lines"""
+    if isinstance(target, tuple):
+        return " via ".join(str(part) for part in target if part)
+    return str(target)
+
+
+class RoutingPolicy:
+    """
+    Chooses which upstream attempt serves a streamed request.
+
+    Every target (a model, or a model/gateway URL pair) is tried up to
+    1 + max_retries times, in order. An attempt fails over when its first
+    event is an error whose code is in retry_on; once any other event has
+    been streamed the attempt is committed and later errors are passed
+    through unchanged, so the client never sees duplicated output. Queue
+    position events (an attempt waiting for a gateway slot) are passed
+    through without committing the attempt.
+
+    With hedge_after > 0, an attempt that has produced nothing after that
+    many seconds gets a second attempt started alongside it (the next one
+    in the plan). Whichever streams first wins and the other is closed.
+    """
+
+    def __init__(self, max_retries=2, backoff_base=0.25, backoff_max=4.0,
+                 retry_on=None, hedge_after=0, fallback_models=None,
+                 fallback_gateway_urls=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_on = set(DEFAULT_ROUTING_CONFIG["retry_on"] if retry_on is None else retry_on)
+        self.hedge_after = hedge_after
+        self.fallback_models = fallback_models or {}
+        self.fallback_gateway_urls = fallback_gateway_urls or {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failovers": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "exhausted": 0,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a policy from the "routing" section of the model config"""
+        settings = dict(DEFAULT_ROUTING_CONFIG)
+        settings.update(config or {})
+        return cls(
+            max_retries=int(settings["max_retries"]),
+            backoff_base=float(settings["backoff_base"]),
+            backoff_max=float(settings["backoff_max"]),
+            retry_on=settings["retry_on"],
+            hedge_after=float(settings["hedge_after"]),
+            fallback_models=settings["fallback_models"],
+            fallback_gateway_urls=settings["fallback_gateway_urls"],
+        )
+
+    def fallbacks_for(self, model):
+        """Return the fallback models configured for a model"""
+        fallbacks = self.fallback_models.get(model, [])
+        return [fallbacks] if isinstance(fallbacks, str) else list(fallbacks)
+
+    def gateway_urls_for(self, model_type):
+        """Return the fallback gateway base URLs configured for a model type"""
+        urls = self.fallback_gateway_urls.get(model_type, [])
+        return [urls] if isinstance(urls, str) else list(urls)
+
+    def plan(self, targets):
+        """Expand targets into the ordered list of attempts"""
+        return [target for target in targets for _ in range(1 + self.max_retries)]
+
+    def backoff(self, failures):
+        """Full-jitter exponential backoff delay after a number of failures"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (failures - 1)))
+
+    def _record(self, key, count=1):
+        with self._lock:
+            self._stats[key] += count
+
+    def _record_launch(self, plan, index, hedged):
+        """Count an attempt and classify it as first try, retry or failover"""
+        self._record("attempts")
+        if hedged:
+            self._record("hedges")
+        elif index > 0:
+            self._record("retries" if plan[index] == plan[index - 1] else "failovers")
+
+    def _retryable(self, chunk):
+        code = error_code(chunk)
+        return code is not None and code in self.retry_on, code
+
+    def stream(self, targets, open_stream):
+        """
+        Stream the first attempt that succeeds.
+
+        Args:
+            targets (list): Targets in preference order
+            open_stream (callable): Returns a new SSE generator for a target
+
+        Yields:
+            str: Server-Sent Events formatted data strings
+        """
+        plan = self.plan(targets)
+        self._record("requests")
+        if self.hedge_after > 0 and len(plan) > 1:
+            yield from self._stream_hedged(plan, open_stream)
+        else:
+            yield from self._stream_sequential(plan, open_stream)
+
+    def _stream_sequential(self, plan, open_stream):
+        failures = 0
+        for index, target in enumerate(plan):
+            if cancelled():
+                # The consumer stopped and aborted the last attempt
+                return
+            if failures:
+                delay = self.backoff(failures)
+                log.warning("Retrying %s in %.2fs (attempt %d/%d)",
+                            describe(target), delay, index + 1, len(plan))
+                time.sleep(delay)
+
+            self._record_launch(plan, index, hedged=False)
+            stream = open_stream(target)
+            committed = False
+            try:
+                for chunk in stream:
+                    if not committed:
+                        if chunk.startswith(QUEUED_EVENT_PREFIX):
+                            yield chunk
+                            continue
+                        retryable, code = self._retryable(chunk)
+                        if retryable:
+                            log.warning("%s failed with %s", describe(target), code)
+                            if index + 1 < len(plan):
+                                failures += 1
+                                break
+                            # Out of attempts: pass the last error through
+                            self._record("exhausted")
+                        committed = True
+                    yield chunk
+            finally:
+                stream.close()
+
+            if committed:
+                return
+
+    def _stream_hedged(self, plan, open_stream):
+        events = queue.Queue()
+        stops = {}
+        failed = set()
+        next_index = 0
+        winner = None
+        failures = 0
+        last_error = None
+
+        def worker(index, stream, scope):
+            try:
+                for chunk in stream:
+                    if scope.closed:
+                        break
+                    events.put((index, chunk))
+            except Exception as e:
+                events.put((index, error_event(f"Unexpected error: {str(e)}", "UNKNOWN_ERROR")))
+            finally:
+                stream.close()
+                events.put((index, _END))
+
+        def launch(hedged):
+            nonlocal next_index
+            index = next_index
+            next_index += 1
+            self._record_launch(plan, index, hedged)
+            # Closing an attempt's scope aborts its upstream at once
+            stops[index] = scope = CloseScope()
+            stream = open_stream(plan[index])
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run, args=(scope.run, worker, index, stream, scope), daemon=True
+            ).start()
+
+        launch(hedged=False)
+        hedge_at = time.monotonic() + self.hedge_after
+        try:
+            while stops:
+                timeout = None
+                if winner is None and hedge_at is not None and next_index < len(plan):
+                    timeout = max(hedge_at - time.monotonic(), 0)
+                try:
+                    index, chunk = events.get(timeout=timeout)
+                except queue.Empty:
+                    # No first event in time: start the next attempt alongside
+                    log.warning("No response from %s after %ss, hedging with %s",
+                                describe(plan[next_index - 1]), self.hedge_after,
+                                describe(plan[next_index]))
+                    launch(hedged=True)
+                    hedge_at = None
+                    continue
+
+                if chunk is _END:
+                    stops.pop(index, None)
+                    failed.discard(index)
+                    if index == winner:
+                        return
+                    if winner is None and not stops:
+                        if cancelled():
+                            return
+                        if next_index >= len(plan):
+                            break
+                        failures += 1
+                        delay = self.backoff(failures)
+                        log.warning("Retrying %s in %.2fs (attempt %d/%d)",
+                                    describe(plan[next_index]), delay, next_index + 1, len(plan))
+                        time.sleep(delay)
+                        launch(hedged=False)
+                        if next_index < len(plan):
+                            hedge_at = time.monotonic() + self.hedge_after
+                    continue
+
+                if winner is None:
+                    if index in failed:
+                        continue
+                    if chunk.startswith(QUEUED_EVENT_PREFIX):
+                        yield chunk
+                        continue
+                    retryable, code = self._retryable(chunk)
+                    if retryable:
+                        # Wait for the attempt to end, then move on
+                        log.warning("%s failed with %s", describe(plan[index]), code)
+                        last_error = chunk
+                        failed.add(index)
+                        stops[index].close()
+                        continue
+                    winner = index
+                    if index > 0 and len(stops) > 1:
+                        self._record("hedge_wins")
+                    for other, scope in stops.items():
+                        if other != index:
+                            scope.close()
+                elif index != winner:
+                    continue
+
+                yield chunk
+
+            self._record("exhausted")
+            if last_error is not None:
+                yield last_error
+        finally:
+            for scope in list(stops.values()):
+                scope.close()
+
+    async def astream(self, targets, open_stream):
+        """
+        Async counterpart of stream().
+
+        Args:
+            targets (list): Targets in preference order
+            open_stream (callable): Returns a new async SSE generator for a target
+
+        Yields:
+            str: Server-Sent Events formatted data strings
+        """
+        plan = self.plan(targets)
+        self._record("requests")
+        if self.hedge_after > 0 and len(plan) > 1:
+            stream = self._astream_hedged(plan, open_stream)
+        else:
+            stream = self._astream_sequential(plan, open_stream)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _astream_sequential(self, plan, open_stream):
+        failures = 0
+        for index, target in enumerate(plan):
+            if failures:
+                delay = self.backoff(failures)
+                log.warning("Retrying %s in %.2fs (attempt %d/%d)",
+                            describe(target), delay, index + 1, len(plan))
+                await asyncio.sleep(delay)
+
+            self._record_launch(plan, index, hedged=False)
+            stream = open_stream(target)
+            committed = False
+            try:
+                async for chunk in stream:
+                    if not committed:
+                        if chunk.startswith(QUEUED_EVENT_PREFIX):
+                            yield chunk
+                            continue
+                        retryable, code = self._retryable(chunk)
+                        if retryable:
+                            log.warning("%s failed with %s", describe(target), code)
+                            if index + 1 < len(plan):
+                                failures += 1
+                                break
+                            # Out of attempts: pass the last error through
+                            self._record("exhausted")
+                        committed = True
+                    yield chunk
+            finally:
+                await stream.aclose()
+
+            if committed:
+                return
+
+    async def _astream_hedged(self, plan, open_stream):
+        events = asyncio.Queue()
+        tasks = {}
+        next_index = 0
+        winner = None
+        failures = 0
+        last_error = None
+        loop = asyncio.get_running_loop()
+
+        async def worker(index, stream):
+            try:
+                async for chunk in stream:
+                    await events.put((index, chunk))
+            except Exception as e:
+                await events.put((index, error_event(f"Unexpected error: {str(e)}", "UNKNOWN_ERROR")))
+            finally:
+                await stream.aclose()
+                await events.put((index, _END))
+
+        def launch(hedged):
+            nonlocal next_index
+            index = next_index
+            next_index += 1
+            self._record_launch(plan, index, hedged)
+            tasks[index] = asyncio.create_task(worker(index, open_stream(plan[index])))
+
+        def stop(index):
+            task = tasks.pop(index, None)
+            if task is not None:
+                task.cancel()
+
+        launch(hedged=False)
+        hedge_at = loop.time() + self.hedge_after
+        try:
+            while tasks:
+                try:
+                    if winner is None and hedge_at is not None and next_index < len(plan):
+                        index, chunk = await asyncio.wait_for(
+                            events.get(), max(hedge_at - loop.time(), 0)
+                        )
+                    else:
+                        index, chunk = await events.get()
+                except asyncio.TimeoutError:
+                    log.warning("No response from %s after %ss, hedging with %s",
+                                describe(plan[next_index - 1]), self.hedge_after,
+                                describe(plan[next_index]))
+                    launch(hedged=True)
+                    hedge_at = None
+                    continue
+
+                if index not in tasks:
+                    # Late event from a stopped attempt
+                    continue
+
+                if chunk is _END:
+                    tasks.pop(index)
+                    if index == winner:
+                        return
+                    if winner is None and not tasks:
+                        if next_index >= len(plan):
+                            break
+                        failures += 1
+                        delay = self.backoff(failures)
+                        log.warning("Retrying %s in %.2fs (attempt %d/%d)",
+                                    describe(plan[next_index]), delay, next_index + 1, len(plan))
+                        await asyncio.sleep(delay)
+                        launch(hedged=False)
+                        if next_index < len(plan):
+                            hedge_at = loop.time() + self.hedge_after
+                    continue
+
+                if winner is None:
+                    if chunk.startswith(QUEUED_EVENT_PREFIX):
+                        yield chunk
+                        continue
+                    retryable, code = self._retryable(chunk)
+                    if retryable:
+                        log.warning("%s failed with %s", describe(plan[index]), code)
+                        last_error = chunk
+                        stop(index)
+                        if not tasks and next_index < len(plan):
+                            failures += 1
+                            delay = self.backoff(failures)
+                            log.warning("Retrying %s in %.2fs (attempt %d/%d)",
+                                        describe(plan[next_index]), delay, next_index + 1, len(plan))
+                            await asyncio.sleep(delay)
+                            launch(hedged=False)
+                            if next_index < len(plan):
+                                hedge_at = loop.time() + self.hedge_after
+                        continue
+                    winner = index
+                    if index > 0 and len(tasks) > 1:
+                        self._record("hedge_wins")
+                    for other in list(tasks):
+                        if other != index:
+                            stop(other)
+                elif index != winner:
+                    continue
+
+                yield chunk
+
+            self._record("exhausted")
+            if last_error is not None:
+                yield last_error
+        finally:
+            for index in list(tasks):
+                stop(index)
+
+    def stats(self):
+        """Return attempt counters"""
+        with self._lock:
+            return dict(self._stats, hedge_after=self.hedge_after, max_retries=self.max_retries)
@@ -0,0 +1,197 @@
+"""
+Server-Sent Events encoding
+Shared encoder for the SSE data events streamed to the frontend, plus
+optional coalescing of small events into fewer, larger writes.
+"""
+
+import asyncio
+import contextvars
+import json
+import queue
+import threading
+import time
+from json.encoder import encode_basestring_ascii
+
+from .cancellation import CloseScope
+
+
+DONE_EVENT = "data: [DONE]\n\n"
+
+CONTENT_EVENT_PREFIX = 'data: {"content": '
+CONTENT_EVENT_OVERHEAD = len('data: {"content": ""}\n\n')
+PREVIEW_EVENT_PREFIX = 'data: {"preview": '
+_END = object()
+
+
+def content_event(text):
+    """
+    Encode a content chunk as an SSE event.
+
+    Produces exactly what json.dumps({'content': text}) would, but plain
+    printable ASCII (the common case for token deltas) skips the JSON
+    encoder entirely.
+    """
+    if text.isascii() and text.isprintable() and '"' not in text and "\\" not in text:
+        return CONTENT_EVENT_PREFIX + '"' + text + '"}\n\n'
+    return CONTENT_EVENT_PREFIX + encode_basestring_ascii(text) + "}\n\n"
+
+
+def preview_event(chunk):
+    """
+    Re-encode a content event as a preview event.
+
+    Returns:
+        str: {"preview": text} event, or None if chunk is not a content event
+    """
+    if chunk.startswith(CONTENT_EVENT_PREFIX):
+        return PREVIEW_EVENT_PREFIX + chunk[len(CONTENT_EVENT_PREFIX):]
+    return None
+
+
+def event(payload):
+    """Encode an arbitrary JSON payload as an SSE event"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def error_event(message, error_code):
+    """Encode an error payload as an SSE event"""
+    return event({"error": message, "error_code": error_code})
+
+
+def error_code(chunk):
+    """Return the error_code carried by an SSE error event, or None"""
+    if '"error_code"' not in chunk:
+        return None
+    try:
+        return json.loads(chunk[6:]).get("error_code")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def coalesce(events, window=0.015, max_bytes=4096):
+    """
+    Merge SSE events that arrive in quick succession into single writes.
+
+    An event arriving after a quiet period of at least `window` seconds is
+    sent immediately, so time-to-first-token is unchanged. Events arriving
+    sooner are held until `window` seconds after the previous write, or
+    until `max_bytes` are buffered, and then written together.
+
+    Args:
+        events (iterator): SSE formatted strings
+        window (float): Coalescing window in seconds (<= 0 disables)
+        max_bytes (int): Flush once this many bytes are buffered
+
+    Yields:
+        str: One or more concatenated SSE events
+    """
+    if window <= 0:
+        yield from events
+        return
+
+    pending = queue.Queue()
+    stop = threading.Event()
+    # Lets the consumer abort the upstream the pump thread is blocked on
+    scope = CloseScope()
+
+    def pump():
+        try:
+            for item in events:
+                if stop.is_set():
+                    break
+                pending.put(item)
+        except Exception as e:
+            pending.put(error_event(f"Unexpected error: {str(e)}", "UNKNOWN_ERROR"))
+        finally:
+            events.close()
+            pending.put(_END)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(scope.run, pump), daemon=True).start()
+
+    last_flush = float("-inf")
+    try:
+        while True:
+            item = pending.get()
+            if item is _END:
+                return
+
+            batch = [item]
+            size = len(item)
+            finished = False
+            hold_until = last_flush + window
+            while size < max_bytes:
+                remaining = hold_until - time.monotonic()
+                try:
+                    item = pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _END:
+                    finished = True
+                    break
+                batch.append(item)
+                size += len(item)
+
+            yield "".join(batch)
+            last_flush = time.monotonic()
+            if finished:
+                return
+    finally:
+        stop.set()
+        scope.close()
+
+
+async def acoalesce(events, window=0.015, max_bytes=4096):
+    """Async counterpart of coalesce() for async generators"""
+    if window <= 0:
+        async for item in events:
+            yield item
+        return
+
+    pending = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in events:
+                await pending.put(item)
+        except Exception as e:
+            await pending.put(error_event(f"Unexpected error: {str(e)}", "UNKNOWN_ERROR"))
+        finally:
+            await events.aclose()
+            await pending.put(_END)
+
+    task = asyncio.create_task(pump())
+
+    loop = asyncio.get_running_loop()
+    last_flush = float("-inf")
+    try:
+        while True:
+            item = await pending.get()
+            if item is _END:
+                return
+
+            batch = [item]
+            size = len(item)
+            finished = False
+            hold_until = last_flush + window
+            while size < max_bytes:
+                remaining = hold_until - loop.time()
+                try:
+                    if remaining > 0:
+                        item = await asyncio.wait_for(pending.get(), remaining)
+                    else:
+                        item = pending.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is _END:
+                    finished = True
+                    break
+                batch.append(item)
+                size += len(item)
+
+            yield "".join(batch)
+            last_flush = loop.time()
+            if finished:
+                return
+    finally:
+        task.cancel()
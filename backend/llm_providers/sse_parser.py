@@ -0,0 +1,226 @@
+"""
+Incremental SSE parser for gateway streams
+Parses text/event-stream bodies straight from network reads and decodes
+provider payloads with a decoder picked once per stream.
+"""
+
+import json
+from json.decoder import scanstring
+
+from .prompt_cache import anthropic_usage, openai_usage
+
+
+class SSEParser:
+    """
+    Incremental text/event-stream parser working on raw byte chunks.
+
+    Events may be split across reads at any byte; multi-line data fields
+    are joined with newlines as the SSE specification requires.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._event = ""
+        self._data = []
+
+    def feed(self, chunk):
+        """
+        Consume one network read.
+
+        Args:
+            chunk (bytes): Raw bytes from the response body
+
+        Returns:
+            list: (event_name, data) tuples for every completed event
+        """
+        buffer = self._buffer + chunk if self._buffer else chunk
+
+        # Only complete lines are parsed. A trailing \r is held back in case
+        # the next read starts with the \n of a \r\n pair.
+        end = max(buffer.rfind(b"\n"), buffer.rfind(b"\r"))
+        if end == len(buffer) - 1 and buffer[end] == 0x0D:
+            end = max(buffer.rfind(b"\n", 0, end), buffer.rfind(b"\r", 0, end))
+        if end < 0:
+            self._buffer = buffer
+            return []
+
+        self._buffer = buffer[end + 1:]
+        complete = buffer[:end + 1]
+
+        # Line terminators are ASCII, so the complete lines can be decoded in
+        # one go. Bodies using plain \n (the usual case) are split directly.
+        if b"\r" in complete:
+            lines = [line.decode("utf-8") for line in complete.splitlines()]
+        else:
+            lines = complete.decode("utf-8").split("\n")
+            lines.pop()
+
+        events = []
+        data = self._data
+        for line in lines:
+            if not line:
+                # Blank line dispatches the pending event
+                if data:
+                    events.append((self._event, "\n".join(data)))
+                    data = self._data = []
+                self._event = ""
+            elif line.startswith("data:"):
+                data.append(line[6:] if line.startswith("data: ") else line[5:])
+            elif line.startswith("event:"):
+                self._event = line[6:].strip()
+            # Comments (":") and other fields (id, retry) are ignored
+
+        return events
+
+    def flush(self):
+        """Return the final event if the stream ended without a blank line"""
+        events = self.feed(b"\n\n") if (self._buffer or self._data) else []
+        self._buffer = b""
+        return events
+
+
+def _delta_string(data, key):
+    """
+    Read a string field from the "delta" object of a stream event without
+    parsing the whole payload.
+
+    Keys inside JSON strings always have their quotes escaped, so the first
+    unescaped occurrence of the key after "delta" is a key. It is only taken
+    if no brace comes between the start of the delta object and the key,
+    i.e. it is directly inside the delta and not in a nested or later object.
+
+    Returns:
+        str: The field value, or None if the payload has an unexpected shape
+    """
+    start = data.find('"delta"')
+    if start < 0:
+        return None
+    start = data.find("{", start)
+    if start < 0:
+        return None
+    key_start = data.find(key, start + 1)
+    if key_start < 0:
+        return None
+
+    # A brace before the key means it belongs to a nested or later object
+    # (or sits in a string value); such payloads are left to json.loads
+    if data.find("{", start + 1, key_start) >= 0 or data.find("}", start + 1, key_start) >= 0:
+        return None
+
+    pos = key_start + len(key)
+    while data[pos] == " ":
+        pos += 1
+    if data[pos] != ":":
+        return None
+    pos += 1
+    while data[pos] == " ":
+        pos += 1
+    if data[pos] != '"':
+        return None
+    return scanstring(data, pos + 1)[0]
+
+
+def decode_anthropic(event_name, data):
+    """
+    Decode one Anthropic Messages API stream event.
+
+    Returns:
+        tuple: (content text or None, whether the stream ended)
+    """
+    if data == "[DONE]":
+        return None, True
+
+    # The event name, when sent, identifies the payload without parsing it
+    if event_name:
+        if event_name == "message_stop":
+            return None, True
+        if event_name != "content_block_delta":
+            return None, False
+
+    if event_name or '"content_block_delta"' in data:
+        try:
+            text = _delta_string(data, '"text"')
+        except (IndexError, ValueError):
+            text = None
+        if text is not None:
+            return text or None, False
+
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return None, False
+
+    chunk_type = chunk.get("type")
+    if chunk_type == "content_block_delta":
+        return chunk.get("delta", {}).get("text") or None, False
+    if chunk_type == "message_stop":
+        return None, True
+    return None, False
+
+
+def decode_openai(event_name, data):
+    """
+    Decode one OpenAI chat completions stream event.
+
+    Returns:
+        tuple: (content text or None, whether the stream ended)
+    """
+    if data == "[DONE]":
+        return None, True
+
+    # Content deltas are by far the most common event and carry a null
+    # finish_reason, so they are read without parsing the whole payload
+    if '"finish_reason": null' in data or '"finish_reason":null' in data:
+        try:
+            text = _delta_string(data, '"content"')
+        except (IndexError, ValueError):
+            text = None
+        if text is not None:
+            return text or None, False
+
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return None, False
+
+    choices = chunk.get("choices")
+    if not choices:
+        return None, False
+
+    choice = choices[0]
+    content = choice.get("delta", {}).get("content") or None
+    # finish_reason marks the end of the stream
+    return content, bool(choice.get("finish_reason"))
+
+
+DECODERS = {
+    "anthropic": decode_anthropic,
+    "openai": decode_openai,
+}
+
+
+def read_anthropic_usage(event_name, data):
+    """Return the normalized prompt usage of a message_start event, else None"""
+    if event_name not in ("", "message_start") or '"message_start"' not in data:
+        return None
+    try:
+        return anthropic_usage(json.loads(data)["message"]["usage"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def read_openai_usage(event_name, data):
+    """Return the normalized prompt usage of the final usage chunk, else None"""
+    if '"prompt_tokens"' not in data:
+        return None
+    try:
+        return openai_usage(json.loads(data)["usage"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+# Usage arrives in the first event (Anthropic) or after the last one (OpenAI)
+USAGE_READERS = {
+    "anthropic": read_anthropic_usage,
+    "openai": read_openai_usage,
+}
@@ -0,0 +1,177 @@
+"""
+Local token estimation
+Approximates how many tokens a text costs without a tokenizer, so prompt
+sizes can be budgeted offline and on the request path (well under a
+millisecond per kilobyte of text). OutputBudget uses the estimate to size
+max_tokens per request.
+"""
+
+import math
+import re
+
+
+# Pieces a BPE tokenizer would roughly never merge across: runs of letters,
+# runs of digits, and any other single non-space character
+_PIECES = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_")
+
+# Letters per token within a long word; short common words are one token
+LETTERS_PER_TOKEN = 6
+
+# Scripts from CJK onwards are written without spaces and cost about one
+# token per character
+CJK_START = 0x2E80
+
+# Digits per token (numbers are split into groups of up to three)
+DIGITS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a text.
+
+    Counts words, numbers and punctuation the way BPE tokenizers tend to
+    split them; CJK and later scripts count one token per character.
+
+    Args:
+        text (str): Any text
+
+    Returns:
+        int: Estimated token count
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece.isdigit():
+            tokens += -(-len(piece) // DIGITS_PER_TOKEN)
+        elif ord(piece[0]) >= CJK_START:
+            tokens += len(piece)
+        else:
+            tokens += -(-len(piece) // LETTERS_PER_TOKEN)
+    return tokens
+
+
+# Provider tokens per estimated token, by model family. The estimate is
+# tuned on OpenAI-style tokenizers; Claude's splits English text finer.
+# Compare rephraseai_llm_estimated_input_tokens_total with
+# rephraseai_llm_input_tokens_total to re-tune (config: output_budget.calibration).
+FAMILY_CALIBRATION = {
+    "gpt": 1.0,
+    "o": 1.0,
+    "claude": 1.15,
+    "gemini": 1.0,
+    "other": 1.0,
+}
+
+# Models whose completion budget also covers hidden reasoning tokens
+REASONING_MODEL_MARKERS = ("o3", "o4", "gpt-5")
+
+DEFAULT_OUTPUT_BUDGET_CONFIG = {
+    "min_tokens": 512,
+    "max_tokens": 4096,
+    # Output allowed per input token, before the style's length ratio
+    "headroom": 2.0,
+    "reasoning_tokens": 8192,
+    "reasoning_max_tokens": 16384,
+    "calibration": {},
+}
+
+
+def model_family(model):
+    """Tokenizer family of a model: gpt, o, claude, gemini or other"""
+    name = model.lower().rsplit("/", 1)[-1]
+    if name.startswith("claude"):
+        return "claude"
+    if name.startswith("gemini"):
+        return "gemini"
+    if name.startswith("gpt"):
+        return "gpt"
+    if re.match(r"o\d", name):
+        return "o"
+    return "other"
+
+
+def is_reasoning_model(model):
+    """Whether a model (O-series, GPT-5) spends completion tokens on reasoning"""
+    name = model.lower()
+    return any(marker in name for marker in REASONING_MODEL_MARKERS)
+
+
+class OutputBudget:
+    """
+    Sizes max_tokens per request from the input length and style.
+
+    A three-line message reserves a few hundred output tokens instead of
+    the provider maximum, which keeps gateway scheduling and rate-limit
+    budgets honest; long inputs still get up to max_tokens.
+    """
+
+    def __init__(self, min_tokens=512, max_tokens=4096, headroom=2.0,
+                 reasoning_tokens=8192, reasoning_max_tokens=16384, calibration=None):
+        """
+        Args:
+            min_tokens (int): Smallest budget for any request
+            max_tokens (int): Largest budget for regular models
+            headroom (float): Output tokens allowed per input token
+            reasoning_tokens (int): Extra budget for reasoning models
+            reasoning_max_tokens (int): Largest budget for reasoning models
+            calibration (dict): Family -> factor, overriding FAMILY_CALIBRATION
+        """
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.headroom = headroom
+        self.reasoning_tokens = reasoning_tokens
+        self.reasoning_max_tokens = reasoning_max_tokens
+        self.calibration = dict(FAMILY_CALIBRATION, **(calibration or {}))
+
+        # Estimated tokens of each precompiled system prompt prefix
+        self._prefix_tokens = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a budget from an "output_budget" config section (may be None)"""
+        options = dict(DEFAULT_OUTPUT_BUDGET_CONFIG, **(config or {}))
+        return cls(
+            min_tokens=int(options["min_tokens"]),
+            max_tokens=int(options["max_tokens"]),
+            headroom=float(options["headroom"]),
+            reasoning_tokens=int(options["reasoning_tokens"]),
+            reasoning_max_tokens=int(options["reasoning_max_tokens"]),
+            calibration=options["calibration"],
+        )
+
+    def _system_tokens(self, system_prompt):
+        prefix_hash = getattr(system_prompt, "prefix_hash", None)
+        if not prefix_hash:
+            return estimate_tokens(system_prompt)
+
+        prefix_tokens = self._prefix_tokens.get(prefix_hash)
+        if prefix_tokens is None:
+            prefix_tokens = self._prefix_tokens[prefix_hash] = estimate_tokens(system_prompt.prefix)
+        return prefix_tokens + estimate_tokens(system_prompt.suffix)
+
+    def plan(self, model, system_prompt, text):
+        """
+        Estimate a request's prompt size and choose its output budget.
+
+        Args:
+            model (str): Model identifier
+            system_prompt (str): System prompt; a SystemPrompt's length_ratio
+                scales the budget (e.g. 0.7 for a concise style), and a
+                length_ratio of None gets max_tokens whatever the input
+            text (str): User text
+
+        Returns:
+            tuple: (max_tokens, estimated_prompt_tokens)
+        """
+        factor = self.calibration.get(model_family(model), 1.0)
+        text_tokens = estimate_tokens(text) * factor
+        prompt_tokens = round(text_tokens + self._system_tokens(system_prompt) * factor)
+
+        length_ratio = getattr(system_prompt, "length_ratio", 1.0)
+        if length_ratio is None:
+            budget = self.max_tokens
+        else:
+            budget = max(self.min_tokens, math.ceil(text_tokens * length_ratio * self.headroom))
+
+        if is_reasoning_model(model):
+            return min(budget + self.reasoning_tokens, self.reasoning_max_tokens), prompt_tokens
+        return min(budget, self.max_tokens), prompt_tokens
@@ -0,0 +1,241 @@
+"""
+Structured logging and request tracing
+Request-scoped logging (text or JSON) written by a background thread, a
+request ID carried through contextvars from the route down to the
+provider, and sampled per-phase timing of every provider stream.
+
+Configured with environment variables:
+    LOG_LEVEL          DEBUG, INFO (default), WARNING or ERROR
+    LOG_FORMAT         text (default) or json
+    TRACE_SAMPLE_RATE  Fraction of requests traced, 0 (default) to 1
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+LEVEL_NAMES = {"WARNING": "WARN"}
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "request_id"}
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+_sampled_var = contextvars.ContextVar("trace_sampled", default=False)
+
+
+class _RequestIdFilter(logging.Filter):
+    """
+    Stamp records with the current request ID.
+
+    Attached to the QueueHandler, so it runs in the thread that logs (where
+    the request's context variables are set), before the record is handed
+    to the listener thread that formats and writes it.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+def _extra_fields(record):
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RECORD_ATTRIBUTES and not key.startswith("_")
+    }
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": LEVEL_NAMES.get(record.levelname, record.levelname),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        entry.update(_extra_fields(record))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The "[LEVEL] message" format used by the rest of the backend"""
+
+    def format(self, record):
+        level = LEVEL_NAMES.get(record.levelname, record.levelname)
+        line = f"[{level}] {record.getMessage()}"
+        fields = _extra_fields(record)
+        if record.request_id:
+            fields = {"request_id": record.request_id, **fields}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+_listener = None
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Route the "rephraseai" loggers through a queue to a stdout writer thread.
+
+    Request threads only enqueue records, so they never contend on stdout.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(_RequestIdFilter())
+
+    logger = logging.getLogger("rephraseai")
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Return a logger under the "rephraseai" namespace"""
+    return logging.getLogger(f"rephraseai.{name}")
+
+
+log = get_logger("trace")
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def start_request(request_id=None):
+    """
+    Bind a request ID to the current context and decide whether to trace it.
+
+    Args:
+        request_id (str): Incoming X-Request-ID header, if any
+
+    Returns:
+        str: The request ID in use
+    """
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    _sampled_var.set(TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+    return request_id
+
+
+class _NullSpan:
+    """Shared no-op span used when the request is not sampled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mark(self, phase):
+        pass
+
+    def annotate(self, **fields):
+        pass
+
+    def end(self, **fields):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    Timing of one operation, logged as a single line when it ends.
+
+    Phases marked along the way are reported in milliseconds since the
+    span started; the first mark of each phase wins.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(error=exc_type.__name__ if exc_type else None)
+        return False
+
+    def mark(self, phase):
+        if phase not in self.phases:
+            self.phases[phase] = round((time.perf_counter() - self.started) * 1000, 2)
+
+    def annotate(self, **fields):
+        self.fields.update(fields)
+
+    def end(self, **fields):
+        duration = round((time.perf_counter() - self.started) * 1000, 2)
+        data = {"span": self.name, "duration_ms": duration, **self.fields}
+        data.update((key, value) for key, value in fields.items() if value is not None)
+        for phase, elapsed in self.phases.items():
+            data[f"{phase}_ms"] = elapsed
+        log.info(self.name, extra=data)
+
+
+def span(name, **fields):
+    """Start a span if the current request is sampled, else a no-op"""
+    if not _sampled_var.get():
+        return NULL_SPAN
+    return Span(name, fields)
+
+
+_current_span = contextvars.ContextVar("current_span", default=NULL_SPAN)
+
+
+def start_stream_span(**fields):
+    """
+    Start the span of a provider stream and make it current, so providers
+    can mark phases (connect, first byte) without passing it around.
+    """
+    stream_span = span("llm_stream", **fields)
+    _current_span.set(stream_span)
+    return stream_span
+
+
+def end_stream_span(stream_span, **fields):
+    """End a stream span and clear it from the context"""
+    stream_span.end(**fields)
+    _current_span.set(NULL_SPAN)
+
+
+def mark(phase):
+    """Mark a phase on the current stream span"""
+    _current_span.get().mark(phase)
+
+
+def annotate(**fields):
+    """Add fields (e.g. token usage) to the current stream span"""
+    _current_span.get().annotate(**fields)
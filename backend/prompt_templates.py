@@ -0,0 +1,215 @@
+"""
+Prompt templates for RePhraseAI
+Loads styles, channel tones and named message templates from prompts.json
+and precompiles every style x channel system prompt once at load time.
+Each compiled prompt carries a content hash for use as a cache/metrics key.
+PromptFile recompiles them when prompts.json changes on disk.
+"""
+
+import hashlib
+import json
+
+from llm_providers.model_registry import WatchedFile
+from llm_providers.prompt_cache import SystemPrompt
+
+
+# How rephrase prompts are assembled, unless prompts.json overrides it
+DEFAULT_REPHRASE_TEMPLATE = {
+    "channel_separator": "\n\n",
+    "instructions": "\n\nAdditional Instructions: {instructions}",
+    # Added when a long input is rephrased in parts
+    "chunk": "\n\nThis text is part {part} of {parts} of a longer document that is rephrased part by part. Rephrase only this part, keep its order and meaning, and do not add an introduction, summary or closing.",
+    "chunk_context": "\n\nFor consistency of tone and terms, the previous part ended with:\n{previous}",
+}
+
+
+def content_hash(text):
+    """Stable short hash of a prompt's text (same across processes and restarts)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class MessageTemplate:
+    """
+    A named template producing a system prompt and a user message.
+
+    The system prompt (optionally followed by a channel tone) is compiled
+    per channel up front. The user message is made of the sections whose
+    field is non-empty, followed by the first task whose "when" fields
+    are all present.
+    """
+
+    def __init__(self, name, spec, channels):
+        self.name = name
+        self.sections = spec.get("sections", [])
+        self.tasks = spec.get("tasks", [])
+        separator = spec.get("channel_separator", "\n\n")
+        # A composed reply is not sized like its (often short) input, so it
+        # gets the full output budget unless the template sets a ratio
+        ratio = spec.get("length_ratio")
+        self.length_ratio = float(ratio) if ratio is not None else None
+
+        self._system = {"": self._compile(spec["system"], self.length_ratio)}
+        for channel, tone in channels.items():
+            self._system[channel] = self._compile(spec["system"] + separator + tone, self.length_ratio)
+
+    @staticmethod
+    def _compile(text, length_ratio=1.0):
+        return SystemPrompt(text, prefix_hash=content_hash(text), length_ratio=length_ratio)
+
+    def render(self, channel="", **fields):
+        """
+        Fill in the template.
+
+        Args:
+            channel (str): Channel id; unknown channels get no tone
+            **fields: Values for the template's section fields
+
+        Returns:
+            tuple: (SystemPrompt, user_text)
+        """
+        system_prompt = self._system.get(channel, self._system[""])
+
+        parts = [
+            section["text"].format(**fields)
+            for section in self.sections
+            if fields.get(section["field"])
+        ]
+        for task in self.tasks:
+            if all(fields.get(field) for field in task.get("when", [])):
+                parts.append(task["text"])
+                break
+
+        return system_prompt, "\n\n".join(parts)
+
+
+class PromptTemplates:
+    """All prompts from prompts.json, compiled for lookup by request"""
+
+    def __init__(self, styles, channels=None, templates=None):
+        """
+        Args:
+            styles (list): Style objects ({id, label, icon, description, prompt},
+                optionally length_ratio)
+            channels (dict): Channel id -> tone instructions
+            templates (dict): Template name -> template spec; "rephrase"
+                configures how style prompts are assembled
+        """
+        self.styles = {style["id"]: style for style in styles}
+        self.channels = dict(channels or {})
+        templates = dict(templates or {})
+
+        rephrase = dict(DEFAULT_REPHRASE_TEMPLATE, **templates.pop("rephrase", {}))
+        self._instructions = rephrase["instructions"]
+        self._chunk = rephrase["chunk"]
+        self._chunk_context = rephrase["chunk_context"]
+
+        # Every style x channel combination, channel "" meaning none
+        self._rephrase = {}
+        for style_id, style in self.styles.items():
+            # Expected output length relative to the input (e.g. 0.7 for concise)
+            ratio = float(style.get("length_ratio", 1.0))
+            self._rephrase[(style_id, "")] = MessageTemplate._compile(style["prompt"], ratio)
+            for channel, tone in self.channels.items():
+                text = style["prompt"] + rephrase["channel_separator"] + tone
+                self._rephrase[(style_id, channel)] = MessageTemplate._compile(text, ratio)
+
+        self.templates = {
+            name: MessageTemplate(name, spec, self.channels) for name, spec in templates.items()
+        }
+
+    @classmethod
+    def load(cls, path="prompts.json"):
+        """
+        Load and compile prompts.json.
+
+        Raises:
+            FileNotFoundError, json.JSONDecodeError, KeyError: if the file
+            is missing, invalid, or has no "styles"
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["styles"], data.get("channels"), data.get("templates"))
+
+    def rephrase(self, style_id, channel="", additional_instructions=""):
+        """
+        Return (style_data, system_prompt) for one rephrase style.
+
+        Unknown styles fall back to "default" and unknown channels to no
+        channel tone. Additional instructions vary per request, so they go
+        in the prompt's suffix after the cacheable style/channel prefix.
+        """
+        if style_id not in self.styles:
+            style_id = "default"
+        compiled = self._rephrase.get((style_id, channel)) or self._rephrase[(style_id, "")]
+        if not additional_instructions:
+            return self.styles[style_id], compiled
+
+        suffix = self._instructions.format(instructions=additional_instructions)
+        return self.styles[style_id], SystemPrompt(
+            compiled.prefix, suffix, prefix_hash=compiled.prefix_hash,
+            length_ratio=compiled.length_ratio,
+        )
+
+    def rephrase_chunk(self, system_prompt, part, parts, previous=""):
+        """
+        Extend a rephrase prompt for one part of a chunked long input.
+
+        Args:
+            system_prompt (SystemPrompt): Prompt from rephrase()
+            part (int): 1-based index of the part
+            parts (int): Total number of parts
+            previous (str): End of the preceding part, for consistency
+
+        Returns:
+            SystemPrompt: Same cacheable prefix, with the part note appended
+            to the per-request suffix
+        """
+        suffix = system_prompt.suffix + self._chunk.format(part=part, parts=parts)
+        if previous:
+            suffix += self._chunk_context.format(previous=previous)
+        return SystemPrompt(
+            system_prompt.prefix, suffix, prefix_hash=system_prompt.prefix_hash,
+            length_ratio=system_prompt.length_ratio,
+        )
+
+    def render(self, name, channel="", **fields):
+        """Render a named template; see MessageTemplate.render()"""
+        return self.templates[name].render(channel, **fields)
+
+
+class PromptSnapshot:
+    """One parsed version of prompts.json"""
+
+    def __init__(self, version, templates, mtime):
+        self.version = version
+        self.templates = templates
+        self.mtime = mtime
+
+
+class PromptFile(WatchedFile):
+    """prompts.json, recompiled whenever it changes on disk"""
+
+    kind = "prompts"
+
+    def __init__(self, path="prompts.json", required_templates=(), **kwargs):
+        """
+        Args:
+            path (str): Path to prompts.json
+            required_templates (tuple): Template names a new version must
+                define to be accepted
+        """
+        self.required_templates = tuple(required_templates)
+        super().__init__(path, **kwargs)
+
+    def _empty(self):
+        return PromptSnapshot(0, None, None)
+
+    def _parse(self, f, version, stamp):
+        data = json.load(f)
+        templates = PromptTemplates(data["styles"], data.get("channels"), data.get("templates"))
+        if "default" not in templates.styles:
+            raise ValueError('no "default" style')
+        missing = [name for name in self.required_templates if name not in templates.templates]
+        if missing:
+            raise ValueError(f"missing template(s): {', '.join(missing)}")
+        return PromptSnapshot(version, templates, stamp)
@@ -0,0 +1,141 @@
+"""
+Response Cache for RePhraseAI
+Stores the SSE chunks of completed LLM responses so identical requests can
+be replayed without calling the provider again.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from llm_providers.admission import QUEUED_EVENT_PREFIX
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of streamed responses with TTL expiry.
+
+    Entries are keyed by a hash of the model, the final system prompt and
+    the user text. Only responses that finished cleanly are stored.
+    """
+
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def make_key(model, system_prompt, user_text):
+        """Hash the parts of a request that determine its response"""
+        # Precompiled prompts are identified by their prefix hash, so only
+        # the per-request suffix has to be hashed again
+        prefix_hash = getattr(system_prompt, "prefix_hash", None)
+        if prefix_hash:
+            parts = (model, prefix_hash, system_prompt.suffix, user_text)
+        else:
+            parts = (model, system_prompt, user_text)
+
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached chunks for a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, chunks = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return chunks
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, chunks):
+        """Store the chunks of a completed response"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tuple(chunks))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stream(self, model, system_prompt, user_text, producer):
+        """
+        Serve a response from the cache, or stream and record it.
+
+        Args:
+            model (str): Model identifier
+            system_prompt (str): Final system prompt
+            user_text (str): User input text
+            producer (callable): Returns the provider's SSE generator on a miss
+
+        Yields:
+            str: Server-Sent Events formatted data strings
+        """
+        key = self.make_key(model, system_prompt, user_text)
+        chunks = self.get(key)
+        if chunks is not None:
+            yield from chunks
+            return
+
+        recorded = []
+        completed = False
+        failed = False
+        for chunk in producer():
+            if not chunk.startswith(QUEUED_EVENT_PREFIX):
+                recorded.append(chunk)
+            if '"error_code"' in chunk:
+                failed = True
+            elif chunk.startswith("data: [DONE]"):
+                completed = True
+            yield chunk
+
+        if completed and not failed:
+            self.put(key, recorded)
+
+    async def astream(self, model, system_prompt, user_text, producer):
+        """Async counterpart of stream() for async provider generators"""
+        key = self.make_key(model, system_prompt, user_text)
+        chunks = self.get(key)
+        if chunks is not None:
+            for chunk in chunks:
+                yield chunk
+            return
+
+        recorded = []
+        completed = False
+        failed = False
+        async for chunk in producer():
+            if not chunk.startswith(QUEUED_EVENT_PREFIX):
+                recorded.append(chunk)
+            if '"error_code"' in chunk:
+                failed = True
+            elif chunk.startswith("data: [DONE]"):
+                completed = True
+            yield chunk
+
+        if completed and not failed:
+            self.put(key, recorded)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            return dict(
+                self._stats,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                ttl=self.ttl,
+            )
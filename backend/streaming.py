@@ -0,0 +1,353 @@
+"""
+Streaming helpers for RePhraseAI
+Runs several provider streams concurrently and interleaves their SSE chunks,
+or releases them in stream order (for the chunks of one long input), and
+puts a fast model's speculative preview in front of a slower stream.
+"""
+
+import asyncio
+import contextvars
+import json
+import queue
+import threading
+
+from llm_providers.cancellation import CloseScope
+from llm_providers.sse import (
+    CONTENT_EVENT_PREFIX,
+    DONE_EVENT,
+    error_code,
+    error_event,
+    event,
+    preview_event,
+)
+
+PREVIEW_END_EVENT = event({"preview_end": True})
+
+
+def tag_event(chunk, **fields):
+    """
+    Add extra fields to a single SSE data event.
+
+    Args:
+        chunk (str): SSE formatted string ("data: {...}\\n\\n")
+        **fields: Fields merged into the JSON payload (e.g. style_index=2)
+
+    Returns:
+        str: The re-encoded event, or None for the [DONE] marker
+    """
+    data_str = chunk[6:].strip() if chunk.startswith("data: ") else chunk.strip()
+    if data_str == "[DONE]":
+        return None
+
+    try:
+        payload = json.loads(data_str)
+    except json.JSONDecodeError:
+        return chunk
+
+    payload.update(fields)
+    return event(payload)
+
+
+def merge_streams(streams, max_workers=None, on_skipped=None):
+    """
+    Consume several SSE generators concurrently and interleave their chunks.
+
+    Each stream runs in its own worker thread. Chunks are yielded as soon as
+    any stream produces them, so the total wall-clock time is bounded by the
+    slowest stream instead of the sum of all of them.
+
+    If the consumer stops early, the upstream responses of running streams
+    are aborted at once (through their close scopes) and streams that were
+    never launched are skipped entirely.
+
+    Args:
+        streams (list): Generators yielding SSE formatted strings
+        max_workers (int): Maximum streams running at once (default: all)
+        on_skipped (callable): Called with the index of each stream that
+                               was never launched
+
+    Yields:
+        tuple: (index, chunk) for every chunk, then (index, None) once the
+               stream at that index is exhausted
+    """
+    streams = list(streams)
+    if not streams:
+        return
+
+    max_workers = max_workers or len(streams)
+    events = queue.Queue()
+    stop = threading.Event()
+    scopes = []
+
+    def worker(index, stream):
+        try:
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                events.put((index, chunk))
+        except Exception as e:
+            events.put((index, error_event(f"Unexpected error: {str(e)}", "UNKNOWN_ERROR")))
+        finally:
+            stream.close()
+            events.put((index, None))
+
+    def launch(index):
+        # Workers run in a copy of the request context (request ID, trace
+        # sampling), each in its own close scope
+        scopes.append(CloseScope())
+        context = contextvars.copy_context()
+        thread = threading.Thread(
+            target=context.run, args=(scopes[-1].run, worker, index, streams[index]), daemon=True
+        )
+        thread.start()
+
+    next_index = min(max_workers, len(streams))
+    for index in range(next_index):
+        launch(index)
+
+    remaining = len(streams)
+    try:
+        while remaining:
+            index, chunk = events.get()
+            if chunk is None:
+                remaining -= 1
+                if next_index < len(streams):
+                    launch(next_index)
+                    next_index += 1
+            yield index, chunk
+    finally:
+        stop.set()
+        for scope in scopes:
+            scope.close()
+        for index in range(next_index, len(streams)):
+            streams[index].close()
+            if on_skipped:
+                on_skipped(index)
+
+
+class InOrder:
+    """
+    Re-sequences interleaved (index, chunk) events into index order.
+
+    Events of the earliest unfinished stream pass straight through; those of
+    later streams are held until every stream before them has ended.
+    """
+
+    def __init__(self, count):
+        self.current = 0
+        self.buffers = [[] for _ in range(count)]
+
+    def push(self, index, chunk):
+        """
+        Accept one event from merge_streams().
+
+        Returns:
+            list: (index, chunk) events that can be released now, in order
+        """
+        if index != self.current:
+            self.buffers[index].append(chunk)
+            return []
+
+        ready = [(index, chunk)]
+        if chunk is not None:
+            return ready
+
+        # The current stream ended: release what the next ones buffered,
+        # up to the first one that is still running
+        while self.current + 1 < len(self.buffers):
+            self.current += 1
+            buffered, self.buffers[self.current] = self.buffers[self.current], []
+            ready.extend((self.current, item) for item in buffered)
+            if not buffered or buffered[-1] is not None:
+                break
+        return ready
+
+
+def ordered_streams(streams, max_workers=None, on_skipped=None):
+    """
+    Run several SSE generators concurrently but yield their chunks in order.
+
+    Stream 0 streams live; later streams run ahead in the background and
+    their buffered chunks are released the moment every stream before them
+    has ended, so the total time is bounded by the slowest stream rather
+    than the sum of all of them.
+
+    Yields:
+        tuple: (index, chunk) in index order, then (index, None) once the
+               stream at that index is exhausted
+    """
+    streams = list(streams)
+    order = InOrder(len(streams))
+    for index, chunk in merge_streams(streams, max_workers, on_skipped):
+        yield from order.push(index, chunk)
+
+
+async def amerge_streams(streams, max_workers=None, on_skipped=None):
+    """
+    Async counterpart of merge_streams() for async generators.
+
+    Each stream runs as its own task on the event loop, at most
+    max_workers of them at once (default: all). on_skipped is called with
+    the index of each stream that was never started.
+
+    Yields:
+        tuple: (index, chunk) for every chunk, then (index, None) once the
+               stream at that index is exhausted
+    """
+    streams = list(streams)
+    if not streams:
+        return
+
+    max_workers = max_workers or len(streams)
+    events = asyncio.Queue()
+
+    async def worker(index, stream):
+        try:
+            async for chunk in stream:
+                await events.put((index, chunk))
+        except Exception as e:
+            await events.put((index, error_event(f"Unexpected error: {str(e)}", "UNKNOWN_ERROR")))
+        finally:
+            await stream.aclose()
+            await events.put((index, None))
+
+    tasks = [
+        asyncio.create_task(worker(index, streams[index]))
+        for index in range(min(max_workers, len(streams)))
+    ]
+
+    remaining = len(streams)
+    try:
+        while remaining:
+            index, chunk = await events.get()
+            if chunk is None:
+                remaining -= 1
+                if len(tasks) < len(streams):
+                    tasks.append(asyncio.create_task(worker(len(tasks), streams[len(tasks)])))
+            yield index, chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Close streams that were never started, like merge_streams()
+        for index in range(len(tasks), len(streams)):
+            await streams[index].aclose()
+            if on_skipped:
+                on_skipped(index)
+
+
+async def aordered_streams(streams, max_workers=None, on_skipped=None):
+    """Async counterpart of ordered_streams()"""
+    streams = list(streams)
+    order = InOrder(len(streams))
+    async for index, chunk in amerge_streams(streams, max_workers, on_skipped):
+        for ready in order.push(index, chunk):
+            yield ready
+
+
+def _starts_output(chunk):
+    """Whether a main stream chunk replaces the preview (anything but queue updates)"""
+    return chunk.startswith(CONTENT_EVENT_PREFIX) or chunk == DONE_EVENT or bool(error_code(chunk))
+
+
+def _until(stream, scope):
+    """Pass a stream through inside scope; closing the scope aborts it at once"""
+    scope.enter()
+    try:
+        for chunk in stream:
+            if scope.closed:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
+
+def with_preview(main, preview):
+    """
+    Stream main with a speculative preview streamed in front of it.
+
+    Both streams start at once. The preview's content is sent as
+    {"preview": ...} events until main produces its first output, then a
+    single {"preview_end": true} event tells the client to drop the preview,
+    and the preview stream is closed. Preview errors and queue updates are
+    not forwarded: the preview is best effort.
+
+    Args:
+        main (iterator): SSE stream of the requested model
+        preview (iterator): SSE stream of the fast preview model
+
+    Yields:
+        str: Preview events, then every event of main
+    """
+    preview_scope = CloseScope()
+    previewing = True
+    try:
+        for index, chunk in merge_streams([main, _until(preview, preview_scope)]):
+            if index == 1:
+                output = preview_event(chunk) if previewing and chunk else None
+                if output:
+                    yield output
+                continue
+
+            if chunk is None:
+                # main is done; merge_streams closes the preview on exit
+                if previewing:
+                    yield PREVIEW_END_EVENT
+                return
+            if previewing and _starts_output(chunk):
+                previewing = False
+                preview_scope.close()
+                yield PREVIEW_END_EVENT
+            yield chunk
+    finally:
+        preview_scope.close()
+
+
+async def _auntil(stream, stop):
+    """Async counterpart of _until(): a pending read is cancelled once stop is set"""
+    stopped = asyncio.ensure_future(stop.wait())
+    try:
+        while True:
+            read = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({read, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            if not read.done():
+                read.cancel()
+                try:
+                    await read
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+                break
+            try:
+                chunk = read.result()
+            except StopAsyncIteration:
+                break
+            yield chunk
+    finally:
+        stopped.cancel()
+        await stream.aclose()
+
+
+async def awith_preview(main, preview):
+    """Async counterpart of with_preview()"""
+    stop = asyncio.Event()
+    previewing = True
+    merged = amerge_streams([main, _auntil(preview, stop)])
+    try:
+        async for index, chunk in merged:
+            if index == 1:
+                output = preview_event(chunk) if previewing and chunk else None
+                if output:
+                    yield output
+                continue
+
+            if chunk is None:
+                if previewing:
+                    yield PREVIEW_END_EVENT
+                return
+            if previewing and _starts_output(chunk):
+                previewing = False
+                stop.set()
+                yield PREVIEW_END_EVENT
+            yield chunk
+    finally:
+        # Cancel the preview now rather than when the generator is collected
+        await merged.aclose()
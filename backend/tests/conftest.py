@@ -0,0 +1,267 @@
+"""Shared fixtures: a local stand-in for the OpenAI and Anthropic APIs"""
+
+import json
+import select
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+OPENAI_MODEL = "gpt-4o"
+REASONING_MODEL = "o3-mini"
+ANTHROPIC_MODEL = "claude-3-5-sonnet-20241022"
+
+
+class FakeBatchAPI:
+    """
+    In-memory OpenAI files/batches and Anthropic message batches endpoints,
+    plus a streaming OpenAI chat completions endpoint that records request
+    bodies in `completions`. With `hold` set, completions send nothing after
+    their headers (a model still thinking) until the client disconnects,
+    which sets `disconnected`.
+
+    Every request in a batch is answered with "out: <user text>". A batch
+    reports in progress on its first retrieval and ends on the next one,
+    with the outcome set in `outcome`:
+        status: "completed", "failed" or "expired" (OpenAI);
+                "ended" with per-request "expired" results (Anthropic)
+        fail: user texts whose requests come back as errors
+        drop: user texts whose requests get no result (expired batches)
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self.outcome = {"status": "completed", "fail": set(), "drop": set()}
+        self.requests = []
+        self.completions = []
+        self.hold = False
+        self.disconnected = threading.Event()
+        self.url = None
+
+    # OpenAI
+
+    def create_file(self, content):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = content
+        return {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+            "filename": "batch.jsonl", "purpose": "batch", "status": "processed",
+        }
+
+    def create_openai_batch(self, body):
+        batch_id = f"batch_{len(self.batches) + 1}"
+        lines = [json.loads(line) for line in self.files[body["input_file_id"]].splitlines()]
+        self.batches[batch_id] = {"provider": "openai", "requests": lines, "polls": 0}
+        return self.openai_batch(batch_id)
+
+    def openai_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        requests = batch["requests"]
+        ended = batch["polls"] > 1
+        status = self.outcome["status"] if ended else "in_progress"
+        result = {
+            "id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions",
+            "input_file_id": "file-1", "completion_window": "24h", "status": status,
+            "created_at": 0, "output_file_id": None, "error_file_id": None, "errors": None,
+            "request_counts": {"total": len(requests), "completed": 0, "failed": 0},
+        }
+        if not ended:
+            return result
+        if status == "failed":
+            result["errors"] = {"object": "list", "data": [
+                {"code": "invalid_request", "message": "Input file is invalid", "line": None, "param": None},
+            ]}
+            return result
+
+        output, errors = [], []
+        for request in requests:
+            text = request["body"]["messages"][-1]["content"]
+            if text in self.outcome["drop"]:
+                continue
+            if text in self.outcome["fail"]:
+                errors.append({"id": "r", "custom_id": request["custom_id"], "error": None, "response": {
+                    "status_code": 400, "request_id": "r",
+                    "body": {"error": {"message": "Invalid request"}},
+                }})
+                continue
+            output.append({"id": "r", "custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200, "request_id": "r",
+                "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": f"out: {text}"}}]},
+            }})
+        result["output_file_id"] = self.create_file("\n".join(map(json.dumps, output)))["id"]
+        if errors:
+            result["error_file_id"] = self.create_file("\n".join(map(json.dumps, errors)))["id"]
+        result["request_counts"] = {
+            "total": len(requests), "completed": len(output), "failed": len(errors),
+        }
+        return result
+
+    def chat_completion_stream(self, body):
+        self.completions.append(body)
+        text = body["messages"][-1]["content"]
+        chunks = [
+            {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+             "choices": [{"index": 0, "delta": {"content": f"out: {text}"}, "finish_reason": None}]},
+            {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+        ]
+        return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+    # Anthropic
+
+    def create_anthropic_batch(self, body):
+        batch_id = f"msgbatch_{len(self.batches) + 1}"
+        self.batches[batch_id] = {"provider": "anthropic", "requests": body["requests"], "polls": 0}
+        return self.anthropic_batch(batch_id)
+
+    def anthropic_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        ended = batch["polls"] > 1
+        count = len(batch["requests"])
+        return {
+            "id": batch_id, "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count, "succeeded": count if ended else 0,
+                "errored": 0, "canceled": 0, "expired": 0,
+            },
+            "created_at": "2024-01-01T00:00:00Z", "expires_at": "2024-01-02T00:00:00Z",
+            "ended_at": "2024-01-01T01:00:00Z" if ended else None,
+            "cancel_initiated_at": None, "archived_at": None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def anthropic_results(self, batch_id):
+        lines = []
+        for request in self.batches[batch_id]["requests"]:
+            params = request["params"]
+            text = params["messages"][-1]["content"]
+            if text in self.outcome["drop"]:
+                result = {"type": "expired"}
+            elif text in self.outcome["fail"]:
+                result = {"type": "errored", "error": {
+                    "type": "error", "error": {"type": "invalid_request_error", "message": "Invalid request"},
+                }}
+            else:
+                result = {"type": "succeeded", "message": {
+                    "id": "msg", "type": "message", "role": "assistant", "model": params["model"],
+                    "content": [{"type": "text", "text": f"out: {text}"}],
+                    "stop_reason": "end_turn", "stop_sequence": None,
+                    "usage": {"input_tokens": 1, "output_tokens": 1},
+                }}
+            lines.append(json.dumps({"custom_id": request["custom_id"], "result": result}))
+        return "\n".join(lines)
+
+
+def _multipart_file(body, content_type):
+    """Return the uploaded file content of a multipart/form-data body"""
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        headers, _, content = part.partition(b"\r\n\r\n")
+        if b'name="file"' in headers:
+            return content[:-2].decode("utf-8") if content.endswith(b"\r\n") else content.decode("utf-8")
+    raise ValueError("no file in upload")
+
+
+def _handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, content_type="application/json"):
+            body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _hold(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+            self.close_connection = True
+            readable, _, _ = select.select([self.connection], [], [], 10)
+            if readable and not self.connection.recv(1):
+                api.disconnected.set()
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.split("?")[0]
+            api.requests.append(("POST", path))
+            if path == "/v1/files":
+                self._send(api.create_file(_multipart_file(body, self.headers["Content-Type"])))
+            elif path == "/v1/batches":
+                self._send(api.create_openai_batch(json.loads(body)))
+            elif path == "/v1/chat/completions" and api.hold:
+                api.completions.append(json.loads(body))
+                self._hold()
+            elif path == "/v1/chat/completions":
+                self._send(api.chat_completion_stream(json.loads(body)), "text/event-stream")
+            elif path == "/v1/messages/batches":
+                self._send(api.create_anthropic_batch(json.loads(body)))
+            else:
+                self.send_error(404)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            api.requests.append(("GET", path))
+            parts = path.strip("/").split("/")
+            if parts[:2] == ["v1", "files"] and parts[-1] == "content":
+                self._send(api.files[parts[2]], "application/jsonl")
+            elif parts[:2] == ["v1", "batches"]:
+                api.batches[parts[2]]["polls"] += 1
+                self._send(api.openai_batch(parts[2]))
+            elif parts[:3] == ["v1", "messages", "batches"] and parts[-1] == "results":
+                self._send(api.anthropic_results(parts[3]), "application/x-jsonl")
+            elif parts[:3] == ["v1", "messages", "batches"]:
+                api.batches[parts[3]]["polls"] += 1
+                self._send(api.anthropic_batch(parts[3]))
+            else:
+                self.send_error(404)
+
+    return Handler
+
+
+@pytest.fixture
+def batch_api():
+    """A running FakeBatchAPI; its base URL is batch_api.url"""
+    api = FakeBatchAPI()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(api))
+    api.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield api
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def provider(batch_api, tmp_path, monkeypatch):
+    """A DirectProvider whose OpenAI and Anthropic clients call batch_api"""
+    pytest.importorskip("openai")
+    pytest.importorskip("anthropic")
+    from llm_providers.batch_jobs import BatchJobStore
+    from llm_providers.direct_provider import DirectProvider
+
+    (tmp_path / "config.json").write_text(json.dumps({
+        "default_model": ANTHROPIC_MODEL,
+        "available_models": {
+            "openai": [OPENAI_MODEL, REASONING_MODEL],
+            "anthropic": [ANTHROPIC_MODEL],
+        },
+    }))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-openai")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{batch_api.url}/v1")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", batch_api.url)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    provider = DirectProvider()
+    provider.batch_jobs = BatchJobStore(str(tmp_path / "jobs"))
+    return provider
@@ -0,0 +1,43 @@
+"""Tests for per-model and per-gateway admission gates"""
+
+from llm_providers.admission import AdmissionController
+
+KNOWN = {"gpt-4o", "claude-3-5-sonnet-20241022"}
+
+
+def controller(**kwargs):
+    return AdmissionController(max_concurrent_per_model=2, is_known=KNOWN.__contains__, **kwargs)
+
+
+def test_known_models_get_their_own_gate():
+    admission = controller()
+    assert admission.admission("gpt-4o").gates[0].name == "model:gpt-4o"
+    assert admission.admission("claude-3-5-sonnet-20241022").gates[0].name == "model:claude-3-5-sonnet-20241022"
+
+
+def test_unknown_models_share_one_gate():
+    admission = controller()
+    gates = {admission.admission(f"random-{i}").gates[0] for i in range(100)}
+    assert len(gates) == 1
+    assert gates.pop().name == "model:other"
+    assert list(admission.stats()) == ["model:other"]
+
+
+def test_unknown_models_share_one_quota():
+    admission = controller()
+    held = [admission.admission(f"random-{i}") for i in range(3)]
+    for pending in held[:2]:
+        assert list(pending.acquire()) == []
+        assert pending.admitted
+    # The third unknown name queues behind the first two
+    waiting = held[2].acquire()
+    assert next(waiting).startswith('data: {"queued": ')
+    waiting.close()
+    for pending in held:
+        pending.release()
+
+
+def test_models_with_a_limit_are_gated_by_name():
+    admission = controller(models={"custom-model": 1, "other": 5})
+    assert admission.admission("custom-model").gates[0].max_concurrent == 1
+    assert admission.admission("unlisted").gates[0].max_concurrent == 5
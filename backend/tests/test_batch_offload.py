@@ -0,0 +1,134 @@
+"""Tests for batch offload against a local fake of the upstream batch APIs"""
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("anthropic")
+
+from batch import job_results, offload
+from llm_providers.batch_jobs import BatchJobStore
+from llm_providers.direct_provider import DirectProvider
+
+from conftest import ANTHROPIC_MODEL, OPENAI_MODEL, REASONING_MODEL
+
+
+def rephrase_prompts(item):
+    return item["model"], item["text"], [(style, f"Rephrase {style}") for style in item["styles"]]
+
+
+def items(model, texts):
+    return [{"id": f"item-{i}", "model": model, "text": text, "styles": ["formal", "casual"]}
+            for i, text in enumerate(texts)]
+
+
+def run(provider, batch_items, **kwargs):
+    lines = list(offload(provider, batch_items, rephrase_prompts, poll_interval=0, **kwargs))
+    return {line["id"]: line for line in lines[:-1]}, lines[-1]["summary"]
+
+
+@pytest.mark.parametrize("model", [OPENAI_MODEL, ANTHROPIC_MODEL])
+def test_offload_matches_results_to_items(provider, batch_api, model):
+    results, summary = run(provider, items(model, ["one", "two"]))
+
+    assert summary == {"ok": 2, "failed": 0, "skipped": 0}
+    assert results["item-0"]["results"] == {"formal": "out: one", "casual": "out: one"}
+    assert results["item-1"]["results"] == {"formal": "out: two", "casual": "out: two"}
+    # One job for both items, polled until it ended
+    assert len(batch_api.batches) == 1
+    assert next(iter(batch_api.batches.values()))["polls"] >= 2
+
+
+def test_offload_splits_jobs_by_model(provider, batch_api):
+    results, summary = run(provider, items(OPENAI_MODEL, ["a"]) + [
+        {"id": "other", "model": ANTHROPIC_MODEL, "text": "b", "styles": ["formal"]},
+    ])
+
+    assert summary["ok"] == 2
+    assert results["other"]["results"] == {"formal": "out: b"}
+    assert sorted(batch["provider"] for batch in batch_api.batches.values()) == ["anthropic", "openai"]
+
+
+@pytest.mark.parametrize("model", [OPENAI_MODEL, ANTHROPIC_MODEL])
+def test_submit_and_poll_update_the_job_store(provider, model):
+    job = provider.submit_batch(model, [
+        (["item-0", "formal"], "Rephrase formal", "hello"),
+    ])
+    assert job["upstream_id"]
+    assert provider.batch_jobs.load(job["id"])["status"] == "in_progress"
+
+    provider.poll_batch(job)
+    assert job["status"] == "in_progress"
+    provider.poll_batch(job)
+
+    stored = provider.batch_jobs.load(job["id"])
+    assert stored["status"] == "completed"
+    assert job_results(stored) == [
+        {"id": "item-0", "status": "ok", "results": {"formal": "out: hello"}},
+    ]
+
+
+@pytest.mark.parametrize("model", [OPENAI_MODEL, ANTHROPIC_MODEL])
+def test_resume_after_job_store_reload(provider, batch_api, tmp_path, model):
+    job = provider.submit_batch(model, [
+        (["item-0", "formal"], "Rephrase formal", "first"),
+        (["item-1", "formal"], "Rephrase formal", "second"),
+    ])
+
+    # A new process only has the job id and the store on disk
+    resumed = DirectProvider()
+    resumed.batch_jobs = BatchJobStore(str(tmp_path / "jobs"))
+    stored = resumed.batch_jobs.load(job["id"])
+    results, summary = run(resumed, [], jobs=[stored], skip_ids=["item-1"])
+
+    assert summary == {"ok": 1, "failed": 0, "skipped": 1}
+    assert results == {"item-0": {"id": "item-0", "status": "ok", "results": {"formal": "out: first"}}}
+    assert resumed.batch_jobs.load(job["id"])["status"] == "completed"
+    assert len(batch_api.batches) == 1
+
+
+@pytest.mark.parametrize("model", [OPENAI_MODEL, ANTHROPIC_MODEL])
+def test_failed_requests_are_reported_per_item(provider, batch_api, model):
+    batch_api.outcome["fail"] = {"bad"}
+    results, summary = run(provider, items(model, ["good", "bad"]))
+
+    assert summary == {"ok": 1, "failed": 1, "skipped": 0}
+    assert results["item-0"]["status"] == "ok"
+    assert results["item-1"]["status"] == "error"
+    assert results["item-1"]["errors"]["formal"]["error_code"] == "API_ERROR"
+
+
+def test_failed_openai_job_fails_every_item(provider, batch_api):
+    batch_api.outcome["status"] = "failed"
+    results, summary = run(provider, items(OPENAI_MODEL, ["one", "two"]))
+
+    assert summary == {"ok": 0, "failed": 2, "skipped": 0}
+    error = results["item-0"]["errors"]["formal"]
+    assert error == {"error": "Input file is invalid", "error_code": "BATCH_FAILED"}
+
+
+def test_expired_openai_job_keeps_finished_results(provider, batch_api):
+    batch_api.outcome.update(status="expired", drop={"late"})
+    results, summary = run(provider, items(OPENAI_MODEL, ["early", "late"]))
+
+    assert summary == {"ok": 1, "failed": 1, "skipped": 0}
+    assert results["item-0"]["results"]["formal"] == "out: early"
+    assert results["item-1"]["errors"]["formal"]["error_code"] == "BATCH_EXPIRED"
+
+
+def test_expired_anthropic_requests_are_reported(provider, batch_api):
+    batch_api.outcome["drop"] = {"late"}
+    results, summary = run(provider, items(ANTHROPIC_MODEL, ["early", "late"]))
+
+    assert summary == {"ok": 1, "failed": 1, "skipped": 0}
+    assert results["item-0"]["results"]["casual"] == "out: early"
+    assert results["item-1"]["errors"]["casual"]["error_code"] == "EXPIRED"
+
+
+def test_openai_batch_requests_for_reasoning_models(provider, batch_api):
+    provider.submit_batch(REASONING_MODEL, [(["item-0", "formal"], "Rephrase formal", "hello")])
+    provider.submit_batch(OPENAI_MODEL, [(["item-0", "formal"], "Rephrase formal", "hello")])
+    reasoning, regular = (batch["requests"][0]["body"] for batch in batch_api.batches.values())
+
+    assert "max_tokens" not in reasoning and "temperature" not in reasoning
+    assert reasoning["max_completion_tokens"] == 512 + 8192
+    assert regular["max_tokens"] == 512 and regular["temperature"] == 0.7
@@ -0,0 +1,89 @@
+"""Tests for the direct provider's requests to the OpenAI API and their cancellation"""
+
+import asyncio
+import time
+
+import pytest
+
+from conftest import OPENAI_MODEL, REASONING_MODEL
+from llm_providers.cancellation import cancellation_stats
+from llm_providers.sse import content_event
+from streaming import PREVIEW_END_EVENT, merge_streams, with_preview
+
+
+def stream_text(provider, model):
+    return "".join(provider.stream_response(model, "Rephrase formal", "hello"))
+
+
+async def astream_text(provider, model):
+    return "".join([chunk async for chunk in provider.astream_response(model, "Rephrase formal", "hello")])
+
+
+@pytest.mark.parametrize("streaming", ["sync", "async"])
+def test_reasoning_models_get_max_completion_tokens(provider, batch_api, streaming):
+    for model in (REASONING_MODEL, OPENAI_MODEL):
+        if streaming == "sync":
+            output = stream_text(provider, model)
+        else:
+            output = asyncio.run(astream_text(provider, model))
+        assert "out: hello" in output
+
+    reasoning, regular = batch_api.completions
+    assert reasoning["model"] == REASONING_MODEL
+    assert "max_tokens" not in reasoning and "temperature" not in reasoning
+    assert reasoning["max_completion_tokens"] == 512 + 8192
+    assert regular["max_tokens"] == 512 and regular["temperature"] == 0.7
+
+
+def fast_stream():
+    yield "data: fast\n\n"
+
+
+def test_stopped_consumer_aborts_an_upstream_still_thinking(provider, batch_api):
+    batch_api.hold = True
+    merged = merge_streams([fast_stream(), provider.stream_response(OPENAI_MODEL, "Rephrase formal", "hi")])
+    assert next(merged) == (0, "data: fast\n\n")
+    while not batch_api.completions:
+        time.sleep(0.01)
+
+    cancelled = cancellation_stats.stats()["cancelled_streams"]
+    started = time.monotonic()
+    merged.close()
+    assert batch_api.disconnected.wait(2)
+    assert time.monotonic() - started < 1
+
+    # The provider stream ends quietly and is counted as cancelled
+    deadline = time.monotonic() + 2
+    while cancellation_stats.stats()["cancelled_streams"] == cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cancellation_stats.stats()["cancelled_streams"] == cancelled + 1
+
+
+def test_preview_still_thinking_is_aborted_when_main_starts(provider, batch_api):
+    batch_api.hold = True
+    preview = provider.stream_response(OPENAI_MODEL, "Rephrase formal", "hi")
+
+    def main():
+        while not batch_api.completions:
+            time.sleep(0.01)
+        yield content_event("main")
+
+    events = with_preview(main(), preview)
+    assert next(events) == PREVIEW_END_EVENT
+    assert batch_api.disconnected.wait(2)
+    events.close()
+
+
+def test_cancelled_async_bridge_aborts_the_thread_upstream(provider, batch_api):
+    batch_api.hold = True
+
+    async def consume():
+        stream = provider._astream_in_thread(
+            provider.stream_response(OPENAI_MODEL, "Rephrase formal", "hi")
+        )
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(stream.__anext__(), 0.5)
+        await stream.aclose()
+
+    asyncio.run(consume())
+    assert batch_api.disconnected.wait(2)
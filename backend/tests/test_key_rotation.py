@@ -0,0 +1,93 @@
+"""Tests for the client cache and applying API keys rewritten in .env by another worker"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from llm_providers import client_cache
+from llm_providers.client_cache import ClientCache, key_generation, watch_key_file
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    path = tmp_path / ".env"
+    path.write_text("LLM_MODE=direct\nOPENAI_API_KEY=sk-old\n")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-old")
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.setattr(client_cache, "_key_file", None)
+    monkeypatch.setattr(client_cache, "_key_file_version", 0)
+    watch_key_file(str(path), check_interval=0)
+    return path
+
+
+def test_unchanged_file_keeps_keys(env_file):
+    generation = key_generation()
+    assert key_generation() == generation
+    assert os.environ["OPENAI_API_KEY"] == "sk-old"
+
+
+def test_rewritten_file_rotates_keys(env_file):
+    cache = ClientCache()
+    cache.get("client", lambda: object())
+    generation = key_generation()
+
+    # Written by another worker's Settings save
+    env_file.write_text("LLM_MODE=direct\nOPENAI_API_KEY=sk-new\nANTHROPIC_API_KEY=\n")
+    os.utime(env_file, ns=(0, 0))
+
+    assert key_generation() == generation + 1
+    assert os.environ["OPENAI_API_KEY"] == "sk-new"
+    # Empty values do not clear keys
+    assert "ANTHROPIC_API_KEY" not in os.environ
+    assert cache.stats()["entries"] == 0
+
+
+def test_environment_keeps_precedence_until_file_changes(env_file, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-from-environment")
+    key_generation()
+    assert os.environ["OPENAI_API_KEY"] == "sk-from-environment"
+
+
+def test_slow_client_build_does_not_block_other_keys():
+    cache = ClientCache()
+    cache.get("cached", lambda: "cached client")
+    building = threading.Event()
+    release = threading.Event()
+
+    def slow_factory():
+        building.set()
+        release.wait(5)
+        return "slow client"
+
+    thread = threading.Thread(target=cache.get, args=("slow", slow_factory))
+    thread.start()
+    assert building.wait(5)
+    started = time.monotonic()
+    assert cache.get("cached", lambda: "rebuilt") == "cached client"
+    assert cache.get("other", lambda: "other client") == "other client"
+    assert time.monotonic() - started < 1
+    release.set()
+    thread.join(5)
+    assert cache.get("slow", lambda: "rebuilt") == "slow client"
+
+
+def test_concurrent_builds_keep_the_first_client_stored():
+    cache = ClientCache()
+    first_built = threading.Event()
+    results = []
+
+    def first():
+        first_built.wait(5)
+        return "first"
+
+    def second():
+        return "second"
+
+    thread = threading.Thread(target=lambda: results.append(cache.get("key", first)))
+    thread.start()
+    results.append(cache.get("key", second))
+    first_built.set()
+    thread.join(5)
+    assert results == ["second", "second"]
@@ -0,0 +1,49 @@
+"""Tests for output budgets and the tokens-saved estimate"""
+
+from llm_providers.cancellation import CancellationStats
+from llm_providers.token_estimator import OutputBudget, estimate_tokens
+from prompt_templates import PromptTemplates
+
+STYLES = [
+    {"id": "default", "prompt": "Rephrase the text."},
+    {"id": "concise", "prompt": "Make it shorter.", "length_ratio": 0.7},
+]
+COMPOSE = {
+    "system": "Write a reply.",
+    "sections": [{"field": "original", "text": "Message: {original}"}],
+}
+
+
+def test_short_rephrase_gets_the_floor():
+    templates = PromptTemplates(STYLES, templates={"compose": COMPOSE})
+    _, system_prompt = templates.rephrase("concise")
+    assert OutputBudget().plan("gpt-4o", system_prompt, "Thanks, see you!")[0] == 512
+
+
+def test_compose_gets_the_full_budget():
+    templates = PromptTemplates(STYLES, {"email": "Formal."}, {"compose": COMPOSE})
+    for channel in ("", "email"):
+        system_prompt, user_text = templates.render("compose", channel, original="Lunch?")
+        assert OutputBudget().plan("gpt-4o", system_prompt, user_text)[0] == 4096
+        assert OutputBudget().plan("o3-mini", system_prompt, user_text)[0] == 4096 + 8192
+
+
+def test_compose_template_can_set_a_length_ratio():
+    templates = PromptTemplates(STYLES, templates={"compose": dict(COMPOSE, length_ratio=1.0)})
+    system_prompt, user_text = templates.render("compose", original="Lunch?")
+    assert OutputBudget().plan("gpt-4o", system_prompt, user_text)[0] == 512
+
+
+def test_tokens_saved_use_the_token_estimator():
+    text = "Please rephrase this sentence so that it sounds a little more formal."
+    stats = CancellationStats()
+    stats.record_skipped(text)
+    stats.record_cancelled(text, 0)
+    stats.record_cancelled(text, len(text) // 2)
+    stats.record_cancelled(text, len(text) * 2)
+
+    # Skipped and cancelled before any output: all of it; half streamed:
+    # the other half; more than the input streamed: nothing
+    tokens = estimate_tokens(text)
+    half = round(tokens * (len(text) - len(text) // 2) / len(text))
+    assert stats.stats()["estimated_tokens_saved"] == tokens * 2 + half
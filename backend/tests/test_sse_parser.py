@@ -0,0 +1,56 @@
+"""Tests for the gateway SSE parser and payload decoders"""
+
+import json
+
+from llm_providers.sse_parser import SSEParser, decode_anthropic, decode_openai
+
+
+def openai_chunk(delta, finish_reason=None, **choice):
+    return json.dumps({"choices": [dict(delta=delta, finish_reason=finish_reason, **choice)]})
+
+
+def test_parser_joins_events_split_across_reads():
+    parser = SSEParser()
+    body = b'event: content_block_delta\ndata: {"a": 1}\n\r\ndata: x\r\ndata: y\n\n'
+    events = []
+    for i in range(len(body)):
+        events.extend(parser.feed(body[i:i + 1]))
+    assert events == [("content_block_delta", '{"a": 1}'), ("", "x\ny")]
+
+
+def test_openai_content_delta():
+    assert decode_openai("", openai_chunk({"content": "Hello"})) == ("Hello", False)
+    assert decode_openai("", openai_chunk({"content": 'a "quoted" \\ text'})) == ('a "quoted" \\ text', False)
+
+
+def test_openai_compact_json():
+    data = '{"choices":[{"index":0,"delta":{"role":"assistant","content":"hi"},"finish_reason":null}]}'
+    assert decode_openai("", data) == ("hi", False)
+
+
+def test_openai_content_outside_delta_is_not_output():
+    # "content" appears in a sibling object, not in the delta
+    data = '{"choices":[{"delta":{"role":"assistant"},"logprobs":{"content":"X"},"finish_reason":null}]}'
+    assert decode_openai("", data) == (None, False)
+
+
+def test_openai_content_after_nested_object_in_delta():
+    data = openai_chunk({"tool_calls": [{"function": {"content": "X"}}], "content": "ok"})
+    assert decode_openai("", data) == ("ok", False)
+
+
+def test_openai_brace_in_earlier_string_falls_back_to_json():
+    data = openai_chunk({"role": "a{b}", "content": "ok"})
+    assert decode_openai("", data) == ("ok", False)
+
+
+def test_openai_finish_and_done():
+    assert decode_openai("", openai_chunk({}, finish_reason="stop")) == (None, True)
+    assert decode_openai("", "[DONE]") == (None, True)
+
+
+def test_anthropic_text_delta():
+    data = '{"type":"content_block_delta","index":0,"delta":{"type":"text_delta","text":"yo"}}'
+    assert decode_anthropic("content_block_delta", data) == ("yo", False)
+    assert decode_anthropic("", data) == ("yo", False)
+    assert decode_anthropic("message_stop", '{"type":"message_stop"}') == (None, True)
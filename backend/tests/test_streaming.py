@@ -0,0 +1,67 @@
+"""Tests for merging and ordering concurrent SSE streams"""
+
+import asyncio
+
+from llm_providers.sse import content_event
+from streaming import PREVIEW_END_EVENT, aordered_streams, awith_preview, ordered_streams
+
+
+def chunks(name, count=2):
+    for i in range(count):
+        yield f"{name}{i}"
+
+
+async def achunks(name, count=2):
+    for i in range(count):
+        yield f"{name}{i}"
+
+
+def test_ordered_streams_yield_in_stream_order():
+    events = list(ordered_streams([chunks("a"), chunks("b")]))
+    assert events == [(0, "a0"), (0, "a1"), (0, None), (1, "b0"), (1, "b1"), (1, None)]
+
+
+def test_ordered_streams_report_streams_never_started():
+    skipped = []
+    stream = ordered_streams([chunks(name) for name in "abc"], max_workers=1, on_skipped=skipped.append)
+    assert next(stream) == (0, "a0")
+    stream.close()
+    assert skipped == [1, 2]
+
+
+def test_aordered_streams_report_streams_never_started():
+    skipped = []
+
+    async def consume():
+        stream = aordered_streams([achunks(name) for name in "abc"], max_workers=1, on_skipped=skipped.append)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(consume()) == (0, "a0")
+    assert skipped == [1, 2]
+
+
+def test_async_preview_waiting_on_upstream_is_cancelled_when_main_starts():
+    closed = []
+
+    async def main():
+        await asyncio.sleep(0.1)
+        yield content_event("main")
+
+    async def preview():
+        try:
+            await asyncio.sleep(10)
+            yield content_event("preview")
+        finally:
+            closed.append(asyncio.get_running_loop().time())
+
+    async def consume():
+        events = awith_preview(main(), preview())
+        assert await events.__anext__() == PREVIEW_END_EVENT
+        started = asyncio.get_running_loop().time()
+        await asyncio.sleep(0.05)
+        assert closed and closed[0] - started < 0.05
+        await events.aclose()
+
+    asyncio.run(consume())
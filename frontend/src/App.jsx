@@ -114,7 +114,16 @@ function App() {
             if (data.trim() === '[DONE]') { streamComplete = true; break; }
             try {
               const parsed = JSON.parse(data);
-              if (parsed.content) {
+              if (parsed.queued) {
+                // Waiting for a free upstream slot
+                setMessages(prev => {
+                  const updated = [...prev];
+                  if (updated[aiMessageIndex]) {
+                    updated[aiMessageIndex] = { ...updated[aiMessageIndex], queuePosition: parsed.position };
+                  }
+                  return updated;
+                });
+              } else if (parsed.content) {
                 if (!firstTokenTime) firstTokenTime = performance.now();
                 accumulated += parsed.content;
                 setMessages(prev => {
@@ -123,6 +132,7 @@ function App() {
                     updated[aiMessageIndex] = {
                       ...updated[aiMessageIndex],
                       content: accumulated,
+                      queuePosition: null,
                       timeToFirstToken: firstTokenTime ? Math.round(firstTokenTime - startTime) : null
                     };
                   }
@@ -222,6 +232,7 @@ function App() {
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
       const accumulatedContents = stylesArray.map(() => '');
+      const previewContents = stylesArray.map(() => '');
       let currentStyleIndex = 0;
       let streamComplete = false;
 
@@ -247,23 +258,53 @@ function App() {
               if (parsed.style_start) {
                 currentStyleIndex = parsed.style_index || 0;
                 accumulatedContents[currentStyleIndex] = '';
+                previewContents[currentStyleIndex] = '';
               } else if (parsed.style_end) {
                 // Style complete, do nothing special
+              } else if (parsed.queued) {
+                // Waiting for a free upstream slot
+                const messageIndex = aiMessageStartIndex + (parsed.style_index ?? currentStyleIndex);
+                setMessages(prev => {
+                  const newMessages = [...prev];
+                  if (newMessages[messageIndex]) {
+                    newMessages[messageIndex] = { ...newMessages[messageIndex], queuePosition: parsed.position };
+                  }
+                  return newMessages;
+                });
+              } else if (parsed.preview || parsed.preview_end) {
+                // Draft from the fast preview model, shown until the final answer starts
+                const styleIndex = parsed.style_index ?? currentStyleIndex;
+                previewContents[styleIndex] = parsed.preview_end ? '' : previewContents[styleIndex] + parsed.preview;
+                setMessages(prev => {
+                  const newMessages = [...prev];
+                  const messageIndex = aiMessageStartIndex + styleIndex;
+                  if (newMessages[messageIndex]) {
+                    newMessages[messageIndex] = {
+                      ...newMessages[messageIndex],
+                      preview: previewContents[styleIndex] || null,
+                      queuePosition: null
+                    };
+                  }
+                  return newMessages;
+                });
               } else if (parsed.content) {
                 // Capture first token time
                 if (!firstTokenTime) {
                   firstTokenTime = performance.now();
                 }
 
-                accumulatedContents[currentStyleIndex] += parsed.content;
+                // Parallel mode tags every chunk with the style it belongs to
+                const styleIndex = parsed.style_index ?? currentStyleIndex;
+                accumulatedContents[styleIndex] += parsed.content;
                 setMessages(prev => {
                   const newMessages = [...prev];
-                  const messageIndex = aiMessageStartIndex + currentStyleIndex;
+                  const messageIndex = aiMessageStartIndex + styleIndex;
                   if (newMessages[messageIndex]) {
                     newMessages[messageIndex] = {
                       ...newMessages[messageIndex],
-                      content: accumulatedContents[currentStyleIndex],
+                      content: accumulatedContents[styleIndex],
                       streaming: true,
+                      queuePosition: null,
                       timeToFirstToken: firstTokenTime ? Math.round(firstTokenTime - startTime) : null
                     };
                   }
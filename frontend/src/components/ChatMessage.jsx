@@ -60,7 +60,13 @@ export default function ChatMessage({ message, onCopy, theme }) {
           }`}
         >
           {message.streaming && !message.content ? (
-            <div className="h-4"></div>
+            message.preview ? (
+              <div className="whitespace-pre-wrap opacity-60">{message.preview}</div>
+            ) : message.queuePosition ? (
+              <div className="text-sm opacity-70">Queued (position {message.queuePosition})…</div>
+            ) : (
+              <div className="h-4"></div>
+            )
           ) : (
             <>
               <div className={`prose max-w-none leading-relaxed ${